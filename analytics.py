@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Spending analytics over a columnar copy of the ledger
+
+Transactions are kept as NumPy columns: the day as int64 days since
+1970-01-01, the month as int32 months since 1970-01, the amount as int64,
+and member, type and category as small integer codes. Every figure is a few
+vectorized passes of masks and bincount, so analysing a million rows takes
+tens of milliseconds. Like the date index, the columns follow the ledger
+through get_transactions_since and only read new rows after the first load.
+
+Usage:
+    python analytics.py bench --rows 1000000    # time an analysis of generated rows
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import weakref
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from categories import categorize
+from digest import MONTH_NAMES, transaction_date
+from ledger_cache import parse_nominal
+from structured_logging import get_logger
+
+log = get_logger('analytics')
+
+# Member and category codes, far more than a family ledger has
+CODE_DTYPE = np.int32
+
+EPOCH = date(1970, 1, 1)
+
+# Longest trend analysed
+MAX_MONTHS = 120
+
+
+def month_number(day: date) -> int:
+    """Months since 1970-01, the value of the months column"""
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+def month_label(number: int) -> str:
+    """'2025-07' for a month number"""
+    year, month = divmod(int(number), 12)
+    return f"{year + 1970}-{month + 1:02d}"
+
+
+def short_month_label(number: int) -> str:
+    """'Jul 2025' for a month number, as shown in replies"""
+    year, month = divmod(int(number), 12)
+    return f"{MONTH_NAMES[month][:3]} {year + 1970}"
+
+
+def percent_change(current: int, previous: int) -> Optional[float]:
+    """Change from previous to current in percent, None when there is nothing to compare with"""
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+
+class LedgerColumns:
+    """Dated transactions as NumPy columns, grown in place as rows arrive"""
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize empty columns
+
+        Args:
+            capacity: Rows allocated up front, doubled whenever it runs out
+        """
+        self.size = 0
+        self._days = np.zeros(capacity, np.int64)
+        self._months = np.zeros(capacity, np.int32)
+        self._amounts = np.zeros(capacity, np.int64)
+        self._income = np.zeros(capacity, np.bool_)
+        self._members = np.zeros(capacity, CODE_DTYPE)
+        self._categories = np.zeros(capacity, CODE_DTYPE)
+        self.member_names: List[str] = []
+        self.category_names: List[str] = []
+        self._member_codes: Dict[str, int] = {}
+        self._category_codes: Dict[str, int] = {}
+        # Old format rows without a date, left out of every figure
+        self.undated = 0
+
+    @property
+    def days(self) -> np.ndarray:
+        return self._days[:self.size]
+
+    @property
+    def months(self) -> np.ndarray:
+        return self._months[:self.size]
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._amounts[:self.size]
+
+    @property
+    def income(self) -> np.ndarray:
+        return self._income[:self.size]
+
+    @property
+    def members(self) -> np.ndarray:
+        return self._members[:self.size]
+
+    @property
+    def categories(self) -> np.ndarray:
+        return self._categories[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _code(self, codes: Dict[str, int], names: List[str], name: str) -> int:
+        """Code of a member or category name, assigning the next one on first use"""
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def _reserve(self, size: int):
+        """Grow every column to hold at least `size` rows"""
+        capacity = len(self._days)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ('_days', '_months', '_amounts', '_income', '_members', '_categories'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, transactions: Iterable[Dict[str, str]]) -> int:
+        """
+        Append transactions to the columns
+
+        Args:
+            transactions: Transaction dictionaries as returned by the ledger
+
+        Returns:
+            Number of rows added, rows without an amount or a date are skipped
+        """
+        days, amounts, income, members, categories = [], [], [], [], []
+        for transaction in transactions:
+            nominal = parse_nominal(transaction.get('nominal'))
+            if nominal is None:
+                continue
+            tanggal = str(transaction.get('tanggal', ''))
+            try:
+                # Cells written by the bot start with an ISO day
+                day = date.fromisoformat(tanggal[:10])
+            except ValueError:
+                day = transaction_date(tanggal)
+            if day is None:
+                self.undated += 1
+                continue
+
+            tipe = 'pemasukan' if transaction.get('tipe') == 'pemasukan' else 'pengeluaran'
+            kategori = transaction.get('kategori') or categorize(transaction.get('nama', ''), tipe)
+            days.append((day - EPOCH).days)
+            amounts.append(nominal)
+            income.append(tipe == 'pemasukan')
+            members.append(self._code(self._member_codes, self.member_names, str(transaction.get('member') or 'Unknown')))
+            categories.append(self._code(self._category_codes, self.category_names, kategori))
+
+        count = len(days)
+        if not count:
+            return 0
+        self._reserve(self.size + count)
+        end = self.size + count
+        day_values = np.array(days, np.int64)
+        self._days[self.size:end] = day_values
+        self._months[self.size:end] = day_values.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        self._amounts[self.size:end] = amounts
+        self._income[self.size:end] = income
+        self._members[self.size:end] = members
+        self._categories[self.size:end] = categories
+        self.size = end
+        return count
+
+    @classmethod
+    def from_arrays(cls, days: np.ndarray, amounts: np.ndarray, income: np.ndarray, members: np.ndarray,
+                    categories: np.ndarray, member_names: List[str], category_names: List[str]) -> 'LedgerColumns':
+        """Build columns from arrays that are already encoded, for benchmarks and bulk loads"""
+        columns = cls(capacity=max(len(days), 1))
+        columns.size = len(days)
+        columns._days[:] = days
+        columns._months[:] = np.asarray(days, np.int64).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        columns._amounts[:] = amounts
+        columns._income[:] = income
+        columns._members[:] = members
+        columns._categories[:] = categories
+        columns.member_names = list(member_names)
+        columns.category_names = list(category_names)
+        columns._member_codes = {name: code for code, name in enumerate(member_names)}
+        columns._category_codes = {name: code for code, name in enumerate(category_names)}
+        return columns
+
+
+def group_totals(codes: np.ndarray, amounts: np.ndarray, size: int) -> np.ndarray:
+    """Sum of amounts per code, as int64"""
+    # bincount sums in float64, exact for totals below 2**53
+    return np.rint(np.bincount(codes, weights=amounts, minlength=size)).astype(np.int64)
+
+
+def ranked(totals: np.ndarray, names: List[str], limit: Optional[int] = None) -> List[Dict]:
+    """Names with a non-zero total, largest first, with their share of the total in percent"""
+    grand_total = int(totals.sum())
+    order = np.argsort(-totals, kind='stable')
+    rows = []
+    for code in order[:limit] if limit else order:
+        total = int(totals[code])
+        if total <= 0:
+            break
+        rows.append({'name': names[code], 'total': total, 'share': round(total / grand_total * 100, 1)})
+    return rows
+
+
+def analyze(columns: LedgerColumns, today: Optional[date] = None, months: Optional[int] = None,
+            window: Optional[int] = None, top: int = 5) -> Dict:
+    """
+    Spending trends of the months up to the current one
+
+    Args:
+        columns: Ledger columns to analyse
+        today: Day in the current month, defaults to today
+        months: Months in the trend, 2 to MAX_MONTHS, defaults to ANALYTICS_MONTHS
+        window: Months in the expense moving average, defaults to ANALYTICS_WINDOW
+        top: Members listed as top spenders
+
+    Returns:
+        Dictionary with the monthly 'trend' (income, expense, balance and
+        moving average of expenses), this month's 'top_spenders' and
+        'categories' (expense share and change from last month), and
+        'month_over_month' totals
+    """
+    today = today or date.today()
+    months = min(max(months or int(os.getenv('ANALYTICS_MONTHS', '6')), 2), MAX_MONTHS)
+    window = max(window or int(os.getenv('ANALYTICS_WINDOW', '3')), 1)
+    current = month_number(today)
+    # The moving average of the first month in the trend needs the months before it
+    first = current - months - window + 2
+    span = current - first + 1
+
+    month_values = columns.months
+    amounts = columns.amounts
+    income = columns.income
+    in_span = (month_values >= first) & (month_values <= current)
+    offsets = month_values[in_span] - first
+    span_amounts = amounts[in_span]
+    span_income = income[in_span]
+
+    income_totals = group_totals(offsets[span_income], span_amounts[span_income], span)
+    expense_totals = group_totals(offsets[~span_income], span_amounts[~span_income], span)
+    moving_average = np.convolve(expense_totals, np.ones(window) / window, mode='valid')
+
+    trend = []
+    for index in range(span - months, span):
+        trend.append({
+            'month': month_label(first + index),
+            'label': short_month_label(first + index),
+            'pemasukan': int(income_totals[index]),
+            'pengeluaran': int(expense_totals[index]),
+            'saldo': int(income_totals[index] - expense_totals[index]),
+            'pengeluaran_rata_rata': int(round(moving_average[index - window + 1]))
+        })
+
+    expenses = ~income
+    this_month = expenses & (month_values == current)
+    last_month = expenses & (month_values == current - 1)
+    member_totals = group_totals(columns.members[this_month], amounts[this_month], len(columns.member_names))
+    category_totals = group_totals(columns.categories[this_month], amounts[this_month], len(columns.category_names))
+    previous_categories = group_totals(columns.categories[last_month], amounts[last_month], len(columns.category_names))
+
+    categories = []
+    for row in ranked(category_totals, columns.category_names):
+        previous = int(previous_categories[columns._category_codes[row['name']]])
+        categories.append({'kategori': row['name'], 'pengeluaran': row['total'], 'share': row['share'],
+                           'bulan_lalu': previous, 'change': percent_change(row['total'], previous)})
+
+    month_over_month = {}
+    for key, totals in (('pemasukan', income_totals), ('pengeluaran', expense_totals), ('saldo', income_totals - expense_totals)):
+        now_total, previous = int(totals[-1]), int(totals[-2])
+        month_over_month[key] = {'current': now_total, 'previous': previous, 'delta': now_total - previous,
+                                 'change': percent_change(now_total, previous)}
+
+    return {
+        'month': month_label(current),
+        'window': window,
+        'transactions': len(columns),
+        'trend': trend,
+        'top_spenders': [{'member': row['name'], 'pengeluaran': row['total'], 'share': row['share']}
+                         for row in ranked(member_totals, columns.member_names, top)],
+        'categories': categories,
+        'month_over_month': month_over_month
+    }
+
+
+class LedgerAnalytics:
+    """Columns of one ledger, kept up to date with the rows added since the last analysis"""
+
+    def __init__(self, ledger, batch_size: int = 5000):
+        """
+        Initialize analytics
+
+        Args:
+            ledger: LedgerStorage read with get_transactions_since
+            batch_size: Transactions read per call
+        """
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.cursor: Dict[str, int] = {}
+        self.columns = LedgerColumns()
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Add the transactions recorded since the last call to the columns
+
+        Returns:
+            Number of new transactions
+        """
+        with self._lock:
+            count = 0
+            while True:
+                transactions, cursor = self.ledger.get_transactions_since(self.cursor, self.batch_size)
+                self.columns.add(transactions)
+                count += len(transactions)
+                moved = cursor != self.cursor
+                self.cursor = cursor
+                if not moved or len(transactions) < self.batch_size:
+                    return count
+
+    def reset(self):
+        """Drop the columns, so the next refresh reads the ledger again from the start"""
+        with self._lock:
+            self.cursor = {}
+            self.columns = LedgerColumns()
+
+    def report(self, today: Optional[date] = None, months: Optional[int] = None) -> Dict:
+        """Analyse the ledger as it is now, see analyze"""
+        self.refresh()
+        started = time.perf_counter()
+        with self._lock:
+            analysis = analyze(self.columns, today, months)
+        log.debug("Ledger analysed", extra={'rows': len(self.columns), 'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
+        return analysis
+
+
+_analytics: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_analytics_lock = threading.Lock()
+
+
+def get_analytics(ledger) -> LedgerAnalytics:
+    """The analytics following a ledger, created on first use and dropped with the ledger"""
+    with _analytics_lock:
+        analytics = _analytics.get(ledger)
+        if analytics is None:
+            # A proxy, so the analytics don't keep their own key alive
+            analytics = _analytics[ledger] = LedgerAnalytics(weakref.proxy(ledger))
+            # Rows edited in the sheet by hand can't be followed with a cursor
+            if hasattr(ledger, 'on_invalidate'):
+                ledger.on_invalidate.append(analytics.reset)
+        return analytics
+
+
+def generate_columns(rows: int, seed: int = 42, today: Optional[date] = None) -> LedgerColumns:
+    """Random columns spread over the two years up to today, for benchmarks"""
+    from family_config import FAMILY_CONFIG
+
+    today = today or date.today()
+    generator = np.random.default_rng(seed)
+    last_day = (today - EPOCH).days
+    members = sorted(set(FAMILY_CONFIG['family_members'].values()))
+    categories = FAMILY_CONFIG['expense_categories'] + FAMILY_CONFIG['income_categories']
+    return LedgerColumns.from_arrays(
+        np.sort(generator.integers(last_day - 730, last_day + 1, rows)),
+        generator.integers(1, 500, rows) * 1000,
+        generator.random(rows) < 0.1,
+        generator.integers(0, len(members), rows),
+        generator.integers(0, len(categories), rows),
+        members,
+        categories
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Spending analytics')
+    subcommands = arg_parser.add_subparsers(dest='command', required=True)
+    bench = subcommands.add_parser('bench', help='Time an analysis of generated rows')
+    bench.add_argument('--rows', type=int, default=1000000)
+    bench.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    columns = generate_columns(args.rows)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        analysis = analyze(columns)
+        timings.append(time.perf_counter() - started)
+    print(json.dumps(analysis['month_over_month'], indent=2))
+    print(f"[INFO] {args.rows:,} rows analysed in {min(timings) * 1000:.1f}ms (best of {args.repeat})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+import metrics
+from structured_logging import get_logger
+from write_queue import backoff_delay
+
+log = get_logger('scheduler')
+
+# Statuses worth retrying on reads, rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+REQUEST_SECONDS = metrics.histogram(
+    'finance_bot_sheets_request_seconds',
+    'Latency of each Google Sheets API call, retries counted separately',
+    ['operation']
+)
+
+
+def operation_name(request) -> str:
+    """Short API method name like 'append' or 'batchGet'"""
+    method_id = getattr(request, 'methodId', None) or ''
+    return method_id.rsplit('.', 1)[-1] or 'unknown'
+
+
+class TokenBucket:
+    """Token bucket refilled at a steady rate, sized to an API quota"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize token bucket
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens held, the largest burst allowed
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens earned since the last refill, caller holds the lock"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is free
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one will be free
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class _Call:
+    """A read in flight that other callers can wait on instead of repeating it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class ApiScheduler:
+    """Central gate for Google Sheets API calls
+
+    Every call takes a token from the read or write bucket, sized to the
+    per-minute quota, so bursts queue up here instead of failing with 429.
+    Failed calls are retried with exponential backoff and jitter: reads on
+    rate limiting and transient errors, writes only on 429, which Google
+    guarantees was not applied. Identical reads issued while one is already
+    in flight share its response, unless a write finished in between.
+    """
+
+    def __init__(self, read_per_minute: Optional[float] = None, write_per_minute: Optional[float] = None,
+                 max_retries: Optional[int] = None, max_backoff: Optional[float] = None):
+        """
+        Initialize scheduler
+
+        Args:
+            read_per_minute: Read requests allowed per minute
+            write_per_minute: Write requests allowed per minute
+            max_retries: Retries after the first attempt before giving up
+            max_backoff: Maximum seconds between retries
+        """
+        read_per_minute = read_per_minute or float(os.getenv('SHEETS_READ_QUOTA_PER_MINUTE', '60'))
+        write_per_minute = write_per_minute or float(os.getenv('SHEETS_WRITE_QUOTA_PER_MINUTE', '60'))
+        self.buckets = {
+            'read': TokenBucket(read_per_minute / 60, read_per_minute),
+            'write': TokenBucket(write_per_minute / 60, write_per_minute)
+        }
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHEETS_MAX_RETRIES', '4'))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('SHEETS_MAX_BACKOFF', '16'))
+
+        self.lock = threading.Lock()
+        self.in_flight: Dict[Tuple[str, int], _Call] = {}
+        # Bumped after every write so later reads don't share a response from before it
+        self.generation = 0
+        self.stats = {
+            'requests': 0,
+            'calls': 0,
+            'coalesced': 0,
+            'throttled': 0,
+            'throttle_wait_seconds': 0.0,
+            'rate_limited': 0,
+            'retries': 0,
+            'failures': 0
+        }
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def execute(self, request, operation: str = 'read') -> Any:
+        """
+        Run an API request through the scheduler
+
+        Args:
+            request: googleapiclient HttpRequest, not yet executed
+            operation: 'read' or 'write', picks the quota bucket
+
+        Returns:
+            The response, as returned by request.execute()
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+
+        if operation != 'read':
+            try:
+                return self._run(request, operation)
+            finally:
+                with self.lock:
+                    self.generation += 1
+
+        with self.lock:
+            key = (f"{request.method} {request.uri}", self.generation)
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.in_flight[key] = call
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(request, operation)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            call.done.set()
+
+    def _throttle(self, operation: str):
+        """Wait for a token from the operation's bucket"""
+        bucket = self.buckets['write' if operation == 'write' else 'read']
+        wait = bucket.try_acquire()
+        if not wait:
+            return
+
+        started = time.monotonic()
+        with self.lock:
+            self.stats['throttled'] += 1
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            while wait:
+                time.sleep(wait)
+                wait = bucket.try_acquire()
+        finally:
+            with self.lock:
+                self.queue_depth -= 1
+                self.stats['throttle_wait_seconds'] += time.monotonic() - started
+
+    def _run(self, request, operation: str):
+        """Execute with throttling and retries"""
+        attempt = 0
+        while True:
+            self._throttle(operation)
+            with self.lock:
+                self.stats['calls'] += 1
+            try:
+                with REQUEST_SECONDS.time(operation=operation_name(request)):
+                    return request.execute()
+            except HttpError as e:
+                status = e.resp.status if e.resp is not None else None
+                if status == 429:
+                    with self.lock:
+                        self.stats['rate_limited'] += 1
+                retryable = status == 429 or (operation == 'read' and status in RETRYABLE_STATUSES)
+                error = e
+            except (socket.timeout, ConnectionError) as e:
+                retryable = operation == 'read'
+                error = e
+
+            attempt += 1
+            if not retryable or attempt > self.max_retries:
+                with self.lock:
+                    self.stats['failures'] += 1
+                raise error
+
+            delay = backoff_delay(attempt, cap=self.max_backoff)
+            log.warning("Sheets call failed, retrying", extra={
+                'operation': operation, 'error': str(error)[:200], 'attempt': attempt, 'delay_s': round(delay, 2)
+            })
+            with self.lock:
+                self.stats['retries'] += 1
+            time.sleep(delay)
+
+    def snapshot(self) -> Dict:
+        """Counters and queue depth as a JSON-friendly dictionary"""
+        with self.lock:
+            snapshot = dict(self.stats)
+            snapshot['throttle_wait_seconds'] = round(snapshot['throttle_wait_seconds'], 3)
+            snapshot['queue_depth'] = self.queue_depth
+            snapshot['max_queue_depth'] = self.max_queue_depth
+            snapshot['in_flight_reads'] = len(self.in_flight)
+        for name, bucket in self.buckets.items():
+            with bucket.lock:
+                bucket._refill()
+                snapshot[f'{name}_tokens'] = round(bucket.tokens, 2)
+        return snapshot
+
+
+_scheduler: Optional[ApiScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ApiScheduler:
+    """Get the process-wide scheduler, creating it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ApiScheduler()
+        return _scheduler
+
+
+def _scheduler_stat(name: str):
+    """Read one scheduler figure at scrape time, nothing before the first API call"""
+    return lambda: _scheduler.snapshot()[name] if _scheduler else None
+
+
+metrics.callback('finance_bot_sheets_queue_depth', 'Sheets calls waiting for a quota token', _scheduler_stat('queue_depth'))
+metrics.callback('finance_bot_sheets_throttled_total', 'Sheets calls that had to wait for a quota token', _scheduler_stat('throttled'), 'counter')
+metrics.callback('finance_bot_sheets_rate_limited_total', 'Sheets calls answered with 429', _scheduler_stat('rate_limited'), 'counter')
+metrics.callback('finance_bot_sheets_retries_total', 'Sheets calls retried after a failure', _scheduler_stat('retries'), 'counter')
+metrics.callback('finance_bot_sheets_coalesced_total', 'Sheets reads answered by an identical read in flight', _scheduler_stat('coalesced'), 'counter')
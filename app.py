@@ -1,9 +1,24 @@
 import os
-from flask import Flask, request
+import time
+import atexit
+import threading
+from flask import Flask, Response, g, request
 from dotenv import load_dotenv
+import metrics
+from digest import DigestScheduler
+from ledger_export import EXPORT_FORMATS, export_authorized, export_chunks, page_limit
+from ledger_query import QueryParser, answer_query
+from message_dedupe import MessageDeduplicator
+from message_dispatcher import OutboundDispatcher
 from message_parser import MessageParser
-from google_sheets_manager import GoogleSheetsManager
-from whatsapp_bot import WhatsAppBot
+from structured_logging import dropped_records, get_logger, mask_phone, new_request_id, request_id_var
+from startup import StartupState
+from write_queue import WriteBehindQueue, backoff_delay
+from sqlite_ledger import SQLiteLedger, SheetsMirror, bootstrap_from_sheets
+from tenants import TenantManagerCache, TenantRegistry, sheets_manager_factory
+
+# Startup timings count from here
+startup = StartupState()
 
 # Load environment variables
 load_dotenv()
@@ -11,150 +26,477 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
+# background: bind immediately and initialize in a worker thread
+# lazy: initialize on the first request that needs Google Sheets or Twilio
+# eager: initialize before serving, like older versions
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background').lower()
+# Seconds a webhook waits for background startup before giving up
+STARTUP_WAIT_TIMEOUT = float(os.getenv('STARTUP_WAIT_TIMEOUT', '10'))
+# sqlite: local ledger is the system of record and Google Sheets a mirror
+# sheets: read and write Google Sheets directly
+LEDGER_BACKEND = os.getenv('LEDGER_BACKEND', 'sqlite').lower()
+# JSON file of the families served from their own sheets, see tenants.py
+TENANTS_CONFIG = os.getenv('TENANTS_CONFIG')
+
 # Initialize components
 parser = MessageParser()
+query_parser = QueryParser(parser)
 sheets_manager = None
 whatsapp_bot = None
+dispatcher = None
+digests = None
+write_queue = None
+ledger = None
+ledger_mirror = None
+tenants = None
+tenant_managers = None
+init_lock = threading.Lock()
+init_thread = None
+deduplicator = None
+dedupe_lock = threading.Lock()
 
-def initialize_components():
-    """Initialize Google Sheets and WhatsApp bot components"""
-    global sheets_manager, whatsapp_bot
+# Request threads only queue records, a background thread writes them out
+log = get_logger('webhook')
+# Routes polled too often to log each request
+QUIET_ROUTES = {'/health', '/ready', '/metrics'}
+
+# Hot path instrumentation, exposed on /metrics
+REQUEST_SECONDS = metrics.histogram('finance_bot_http_request_seconds', 'Latency of each HTTP request, by route', ['route'])
+PARSE_SECONDS = metrics.histogram('finance_bot_parse_seconds', 'Time to parse an incoming message')
+PARSE_FAILURES = metrics.counter('finance_bot_parse_failures_total', 'Message lines that could not be parsed, by reason', ['reason'])
+COMMANDS = metrics.counter('finance_bot_commands_total', 'Webhook messages handled, by command', ['command'])
+TRANSACTIONS = metrics.counter('finance_bot_transactions_total', 'Transactions recorded, by family member', ['member'])
+DUPLICATES = metrics.counter('finance_bot_webhook_duplicates_total', 'Webhook retries answered from the dedupe cache, by where the response was found', ['source'])
+metrics.callback('finance_bot_write_queue_pending', 'Rows waiting in the write-behind queue', lambda: write_queue.pending_count() if write_queue else None)
+metrics.callback('finance_bot_log_records_dropped_total', 'Log records dropped because the log queue was full', dropped_records, 'counter')
+metrics.callback('finance_bot_outbound_pending', 'Outbound WhatsApp messages queued or being sent', lambda: dispatcher.pending_count() if dispatcher else None)
+metrics.callback('finance_bot_tenant_managers', 'Google Sheets managers of families kept in memory', lambda: len(tenant_managers) if tenant_managers else None)
+metrics.callback('finance_bot_ledger_unmirrored', 'Local ledger rows not yet copied to Google Sheets', lambda: ledger_mirror.pending_count() if ledger_mirror else None)
+
+def get_deduplicator():
+    """Open the MessageSid dedupe store on first use, None if disabled or unavailable"""
+    global deduplicator
+    
+    if deduplicator or os.getenv('DEDUPE_ENABLED', 'true').lower() != 'true':
+        return deduplicator
+    
+    with dedupe_lock:
+        if not deduplicator:
+            try:
+                deduplicator = MessageDeduplicator()
+            except Exception as e:
+                log.warning("Message dedupe unavailable, retries will be handled again", extra={'error': str(e)})
+                return None
+    return deduplicator
+
+def initialize_write_queue():
+    """Start the write-behind queue, falling back to direct writes if it can't be opened"""
+    global write_queue
+    
+    if write_queue:
+        write_queue.stop()
+        write_queue = None
+    
+    if os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() != 'true':
+        return
     
     try:
-        # Initialize Google Sheets manager
-        sheets_manager = GoogleSheetsManager()
-        sheets_manager.setup_sheet_headers()
+        write_queue = WriteBehindQueue(sheets_manager)
+        write_queue.start()
+        print(f"[INFO] Write-behind queue started ({write_queue.pending_count()} pending rows)")
+    except Exception as e:
+        write_queue = None
+        print(f"[WARNING] Write-behind queue unavailable, writing directly to Google Sheets: {str(e)}")
+
+def initialize_ledger():
+    """Open the local ledger and start its Google Sheets mirror, or use the sheet directly"""
+    global ledger, ledger_mirror
+    
+    if LEDGER_BACKEND != 'sqlite':
+        initialize_write_queue()
+        ledger = sheets_manager
+        return
+    
+    local_ledger = SQLiteLedger()
+    bootstrap_from_sheets(local_ledger, sheets_manager)
+    
+    if os.getenv('LEDGER_MIRROR_ENABLED', 'true').lower() == 'true':
+        ledger_mirror = SheetsMirror(local_ledger, sheets_manager)
+        ledger_mirror.start()
+        print(f"[INFO] Google Sheets mirror started ({ledger_mirror.pending_count()} rows waiting)")
+    
+    ledger = local_ledger
+
+def single_family_enabled() -> bool:
+    """Whether GOOGLE_SHEET_ID and FAMILY_CONFIG serve a family, optional once tenants are configured"""
+    return not TENANTS_CONFIG or bool(os.getenv('GOOGLE_SHEET_ID'))
+
+def initialize_tenants():
+    """Load the tenants file and the cache of their Google Sheets managers"""
+    global tenants, tenant_managers
+    
+    registry = TenantRegistry.load(TENANTS_CONFIG)
+    tenant_managers = TenantManagerCache(sheets_manager_factory())
+    tenants = registry
+    print(f"[INFO] Serving {len(registry)} families from {TENANTS_CONFIG}, up to {tenant_managers.capacity} kept in memory")
+
+def family_components(to_number: str, from_number: str):
+    """
+    Find who serves a message
+    
+    Args:
+        to_number: Twilio number the message was sent to
+        from_number: Sender's WhatsApp number
         
-        # Initialize WhatsApp bot
-        whatsapp_bot = WhatsAppBot()
+    Returns:
+        Tuple of (bot, ledger, write queue) of the sender's family, the ledger
+        is None if no family uses the number
+    """
+    tenant = tenants.resolve(to_number, from_number) if tenants else None
+    if tenant:
+        bot = whatsapp_bot.for_family(tenant.family_name, tenant.members, tenant.bot_name, tenant.whatsapp_number)
+        return bot, tenant_managers.get(tenant), None
+    return whatsapp_bot, ledger, write_queue
+
+def initialize_components():
+    """Initialize Google Sheets and WhatsApp bot components"""
+    global sheets_manager, whatsapp_bot, dispatcher, digests
+    
+    # Several request threads may try to initialize at the same time
+    with init_lock:
+        if whatsapp_bot and (ledger or not single_family_enabled()) and (tenants or not TENANTS_CONFIG):
+            return True
         
-        print("[SUCCESS] All components initialized successfully")
+        startup.begin_attempt()
+        try:
+            # Google and Twilio clients are slow to import, so they load after the port is bound
+            with startup.phase('imports'):
+                from google_sheets_manager import GoogleSheetsManager
+                from whatsapp_bot import WhatsAppBot
+            
+            if TENANTS_CONFIG and not tenants:
+                with startup.phase('tenants'):
+                    initialize_tenants()
+            
+            # Initialize Google Sheets manager, keeping it if only a later step failed
+            if not sheets_manager and single_family_enabled():
+                with startup.phase('sheets_client'):
+                    manager = GoogleSheetsManager()
+                with startup.phase('sheet_headers'):
+                    manager.ensure_sheet_headers()
+                sheets_manager = manager
+            
+            if not ledger and sheets_manager:
+                with startup.phase('ledger'):
+                    initialize_ledger()
+            
+            # Initialize WhatsApp bot
+            with startup.phase('whatsapp_bot'):
+                whatsapp_bot = WhatsAppBot()
+            
+            # Proactive messages go out from worker threads, never from a request
+            if not dispatcher:
+                dispatcher = OutboundDispatcher(whatsapp_bot.create_message)
+                dispatcher.start()
+            
+            # Every worker runs one, only the lock holder sends
+            if not digests and ledger and os.getenv('DIGEST_ENABLED', 'false').lower() == 'true':
+                digests = DigestScheduler(ledger, whatsapp_bot, dispatcher)
+                digests.start()
+            
+            startup.mark_ready()
+            print(f"[SUCCESS] All components initialized successfully, {startup.summary()}")
+            return True
+            
+        except Exception as e:
+            startup.mark_failed(str(e))
+            print(f"[ERROR] Error initializing components: {str(e)}")
+            return False
+
+def _initialize_until_ready():
+    """Background startup loop, retrying with backoff until initialization succeeds"""
+    attempt = 0
+    while not initialize_components():
+        attempt += 1
+        delay = backoff_delay(attempt, base=1.0, cap=60.0)
+        print(f"[WARNING] Retrying initialization in {delay:.1f}s (attempt {attempt})")
+        time.sleep(delay)
+
+def start_background_initialization():
+    """Start initializing components in a worker thread unless one is already running"""
+    global init_thread
+    
+    if startup.ready or (init_thread and init_thread.is_alive()):
+        return
+    init_thread = threading.Thread(target=_initialize_until_ready, name='startup', daemon=True)
+    init_thread.start()
+
+def ensure_components() -> bool:
+    """
+    Make sure components are ready before handling a request
+    
+    Returns:
+        True if Google Sheets and the WhatsApp bot can be used
+    """
+    if startup.ready:
         return True
-        
-    except Exception as e:
-        print(f"[ERROR] Error initializing components: {str(e)}")
-        return False
+    
+    if STARTUP_MODE == 'lazy':
+        return initialize_components()
+    
+    # A worker forked after startup began (gunicorn --preload) has no startup thread yet
+    start_background_initialization()
+    return startup.wait_ready(STARTUP_WAIT_TIMEOUT)
 
-# Initialize components immediately when module loads (for production)
-print("[INFO] Initializing WhatsApp Finance Tracker Bot components...")
-if not initialize_components():
-    print("[WARNING] Some components failed to initialize")
+def shutdown_components():
+    """Flush queued transactions and messages before the process exits"""
+    if digests:
+        digests.stop()
+    if dispatcher:
+        dispatcher.stop()
+    if write_queue:
+        write_queue.stop()
+    if ledger_mirror:
+        ledger_mirror.stop()
+
+print(f"[INFO] Initializing WhatsApp Finance Tracker Bot components ({STARTUP_MODE} startup)...")
+if STARTUP_MODE == 'eager':
+    if not initialize_components():
+        print("[WARNING] Some components failed to initialize, retrying in the background")
+        start_background_initialization()
+elif STARTUP_MODE != 'lazy':
+    start_background_initialization()
+atexit.register(shutdown_components)
 
 @app.route('/')
 def home():
     """Home endpoint"""
     return "WhatsApp Finance Tracker Bot is running!"
 
+@app.before_request
+def start_timer():
+    """Note when the request started and which request ID its log records carry"""
+    g.started = time.perf_counter()
+    # Twilio's MessageSid ties our records to the message in Twilio's logs
+    request_id = request.headers.get('X-Request-Id') or request.values.get('MessageSid') or new_request_id()
+    g.request_id_token = request_id_var.set(request_id)
+
+@app.after_request
+def record_latency(response):
+    """Record the request's latency under its route"""
+    if hasattr(g, 'started'):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        duration = time.perf_counter() - g.started
+        REQUEST_SECONDS.observe(duration, route=route)
+        if route not in QUIET_ROUTES:
+            log.info("Request completed", extra={'route': route, 'status': response.status_code, 'duration_ms': round(duration * 1000, 2)})
+        response.headers['X-Request-Id'] = request_id_var.get()
+    return response
+
+@app.teardown_request
+def clear_request_id(error=None):
+    """Stop stamping this thread's log records with the finished request's ID"""
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route('/health')
 def health():
-    """Health check endpoint for Railway"""
+    """Liveness check for Railway, answered without calling any external API"""
     try:
         status = {
             "status": "healthy",
-            "timestamp": "2025-07-25",
+            "ready": startup.ready,
+            "startup_mode": STARTUP_MODE,
+            "startup": startup.snapshot(),
             "components": {
                 "parser": parser is not None,
                 "sheets_manager": sheets_manager is not None,
+                "ledger": ledger is not None,
                 "whatsapp_bot": whatsapp_bot is not None
             }
         }
         
-        # If components aren't initialized, try to initialize them
-        if not all(status["components"].values()):
-            print("[INFO] Some components not initialized, attempting initialization...")
-            if initialize_components():
-                status["components"]["sheets_manager"] = sheets_manager is not None
-                status["components"]["whatsapp_bot"] = whatsapp_bot is not None
-                status["initialization"] = "success"
-            else:
-                status["initialization"] = "failed"
+        if tenants:
+            status["tenants"] = {"configured": len(tenants), "in_memory": len(tenant_managers)}
+        
+        if write_queue:
+            status["write_queue_pending"] = write_queue.pending_count()
+        if ledger_mirror:
+            status["ledger_unmirrored"] = ledger_mirror.pending_count()
+        if sheets_manager:
+            status["sheets_scheduler"] = sheets_manager.scheduler.snapshot()
+        if dispatcher:
+            status["outbound"] = dispatcher.snapshot()
+        if digests:
+            status["digest_leader"] = digests.leader
         
         return status, 200
         
     except Exception as e:
         return {"status": "error", "error": str(e)}, 500
 
+@app.route('/ready')
+def ready():
+    """Readiness check, 503 until Google Sheets and the WhatsApp bot are initialized"""
+    state = startup.snapshot()
+    return state, 200 if state['ready'] else 503
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    """Handle incoming WhatsApp messages"""
+    """Handle incoming WhatsApp messages, answering Twilio retries with the response already given"""
+    message_sid = request.values.get('MessageSid', '')
+    dedupe = get_deduplicator() if message_sid else None
+    if not dedupe:
+        return handle_message()
+    
+    outcome, cached = dedupe.claim(message_sid)
+    if cached:
+        DUPLICATES.inc(source=outcome)
+        log.info("Duplicate message answered from cache", extra={'source': outcome})
+        body, status, mimetype = cached
+        return Response(body, status=status, mimetype=mimetype)
+    
+    try:
+        response = app.make_response(handle_message())
+    except Exception:
+        dedupe.release(message_sid)
+        raise
+    
+    # Nothing was saved, so a retry should try again
+    if response.status_code >= 500 or g.get('retry_allowed'):
+        dedupe.release(message_sid)
+    else:
+        dedupe.complete(message_sid, (response.get_data(as_text=True), response.status_code, response.mimetype))
+    return response
+
+def handle_message():
+    """Parse an incoming WhatsApp message and reply to it"""
     try:
-        # Check if components are initialized
-        if not whatsapp_bot or not sheets_manager:
-            print("[ERROR] Components not initialized, attempting to initialize...")
-            if not initialize_components():
-                print("[ERROR] Components initialization failed")
-                return "Components initialization failed", 500
+        # Wait for startup, or initialize now in lazy mode
+        if not ensure_components():
+            log.error("Components not ready", extra={'startup_status': startup.status, 'error': startup.error})
+            return "Components initialization failed", 503
         
         # Get message data from Twilio
         incoming_msg = request.values.get('Body', '').strip()
         from_number = request.values.get('From', '')
         
+        # Bot, ledger and write queue of the sender's family
+        bot, family_ledger, family_queue = family_components(request.values.get('To', ''), from_number)
+        if not family_ledger:
+            COMMANDS.inc(command='unknown_family')
+            log.info("Message from a number no family uses", extra={'from': mask_phone(from_number)})
+            return whatsapp_bot.create_response("Nomor ini belum terdaftar di keluarga mana pun.")
+        
         # Get family member name (with safety check)
         family_member = "Unknown"
-        if whatsapp_bot:
+        if bot:
             try:
-                family_member = whatsapp_bot.get_family_member(from_number)
+                family_member = bot.get_family_member(from_number)
             except Exception as e:
-                print(f"Error getting family member: {str(e)}")
+                log.warning("Error getting family member", extra={'error': str(e)})
                 family_member = "Unknown"
         
-        print(f"Received message from {family_member} ({from_number}): {incoming_msg}")
+        log.info("Received message", extra={'member': family_member, 'from': mask_phone(from_number), 'chars': len(incoming_msg)})
+        # Message text holds amounts and names, only a sample of it is logged at DEBUG
+        log.debug("Message body", extra={'body': incoming_msg})
         
         # Handle help command
         if incoming_msg.lower() in ['help', 'bantuan', 'panduan']:
-            if whatsapp_bot:
-                response_msg = whatsapp_bot.format_help_message()
-                return whatsapp_bot.create_response(response_msg)
+            COMMANDS.inc(command='help')
+            if bot:
+                response_msg = bot.format_help_message()
+                return bot.create_response(response_msg)
             else:
                 return "Bot tidak tersedia saat ini", 500
         
         # Handle report command
         elif incoming_msg.lower() in ['laporan', 'report', 'ringkasan']:
-            if sheets_manager and whatsapp_bot:
-                summary = sheets_manager.get_monthly_summary()
-                response_msg = whatsapp_bot.format_report_message(summary)
-                return whatsapp_bot.create_response(response_msg)
+            COMMANDS.inc(command='laporan')
+            if family_ledger and bot:
+                summary = family_ledger.get_monthly_summary()
+                response_msg = bot.format_report_message(summary)
+                return bot.create_response(response_msg)
             else:
                 return "Layanan tidak tersedia saat ini", 500
         
         # Handle balance command
         elif incoming_msg.lower() in ['saldo', 'balance']:
-            if sheets_manager and whatsapp_bot:
-                balance = sheets_manager.get_current_balance()
-                response_msg = f"[BALANCE] *{whatsapp_bot.bot_name}*\n\nSaldo {whatsapp_bot.family_name}: Rp {balance:,}"
-                return whatsapp_bot.create_response(response_msg)
+            COMMANDS.inc(command='saldo')
+            if family_ledger and bot:
+                balance = family_ledger.get_current_balance()
+                response_msg = f"[BALANCE] *{bot.bot_name}*\n\nSaldo {bot.family_name}: Rp {balance:,}"
+                return bot.create_response(response_msg)
+            else:
+                return "Layanan tidak tersedia saat ini", 500
+        
+        # Handle analysis command, NumPy loads on its first use
+        elif incoming_msg.lower() in ['analisis', 'analysis', 'analitik']:
+            COMMANDS.inc(command='analisis')
+            if family_ledger and bot:
+                from analytics import get_analytics
+                analysis = get_analytics(family_ledger).report()
+                return bot.create_response(bot.format_analysis_message(analysis))
             else:
                 return "Layanan tidak tersedia saat ini", 500
         
-        # Parse the message
-        transaction = parser.parse_message(incoming_msg)
+        # Reports for a period or a member, e.g. 'laporan juli' or 'pengeluaran 01/07-15/07'
+        if bot and query_parser.is_query(incoming_msg):
+            answer = answer_query(query_parser, incoming_msg, family_ledger, bot.family_members.values())
+            if answer:
+                COMMANDS.inc(command='query')
+                query, summary = answer
+                return bot.create_response(bot.format_query_message(summary, query.title, query.tipe))
+        
+        # Parse the message, which may hold several transactions
+        with PARSE_SECONDS.time():
+            transactions, rejected_lines = parser.parse_transactions(incoming_msg)
+        for line in rejected_lines:
+            PARSE_FAILURES.inc(reason=parser.rejection_reason(line))
+        if not transactions and not rejected_lines:
+            PARSE_FAILURES.inc(reason='empty')
+        COMMANDS.inc(command='transaksi' if transactions else 'invalid')
         
-        if not transaction or not parser.validate_transaction(transaction):
-            if whatsapp_bot:
-                response_msg = whatsapp_bot.format_error_message("parsing")
-                return whatsapp_bot.create_response(response_msg)
+        if not transactions:
+            if bot:
+                response_msg = bot.format_error_message("parsing")
+                return bot.create_response(response_msg)
             else:
                 return "Format pesan tidak valid", 400
         
-        # Add family member to transaction
-        transaction['member'] = family_member
+        # Add family member to transactions
+        for transaction in transactions:
+            transaction['member'] = family_member
         
-        # Add transaction to Google Sheets
-        if sheets_manager and sheets_manager.add_transaction(transaction):
-            if whatsapp_bot:
-                response_msg = whatsapp_bot.format_success_message(transaction)
-                return whatsapp_bot.create_response(response_msg)
+        # Queue the transactions for Google Sheets, or write them to the ledger in one call
+        if family_queue:
+            saved = family_queue.enqueue_many(transactions)
+        else:
+            saved = family_ledger and family_ledger.add_transactions(transactions)
+        
+        if saved:
+            TRANSACTIONS.inc(len(transactions), member=family_member)
+            if bot:
+                response_msg = bot.format_success_message(transactions, skipped=len(rejected_lines))
+                return bot.create_response(response_msg)
             else:
                 return "Transaksi berhasil disimpan", 200
         else:
-            if whatsapp_bot:
-                response_msg = whatsapp_bot.format_error_message("sheets")
-                return whatsapp_bot.create_response(response_msg)
+            g.retry_allowed = True
+            if bot:
+                response_msg = bot.format_error_message("sheets")
+                return bot.create_response(response_msg)
             else:
                 return "Gagal menyimpan transaksi", 500
         
-    except Exception as e:
-        print(f"Error in webhook: {str(e)}")
+    except Exception:
+        log.exception("Error in webhook")
         error_msg = whatsapp_bot.format_error_message("general") if whatsapp_bot else "Terjadi kesalahan sistem."
         return whatsapp_bot.create_response(error_msg) if whatsapp_bot else error_msg
 
@@ -164,7 +506,7 @@ def test_connections():
     results = {}
     
     # Test Google Sheets connection
-    if sheets_manager:
+    if ensure_components() and sheets_manager:
         results['google_sheets'] = sheets_manager.test_connection()
     else:
         results['google_sheets'] = False
@@ -194,14 +536,95 @@ def test_connections():
 
 @app.route('/recent')
 def recent_transactions():
-    """Get recent transactions from Google Sheets"""
-    if not sheets_manager:
+    """Get a page of transactions from the ledger, newest first, e.g. /recent?limit=50&cursor=..."""
+    if not ensure_components() or not ledger:
         return {'error': 'Google Sheets not initialized'}
     
-    transactions = sheets_manager.get_recent_transactions(10)
+    try:
+        limit = page_limit(request.args.get('limit'))
+        transactions, next_cursor = ledger.get_transactions_page(limit, request.args.get('cursor') or None)
+    except ValueError as e:
+        return {'error': str(e)}, 400
     return {
         'count': len(transactions),
-        'transactions': transactions
+        'transactions': transactions,
+        'next_cursor': next_cursor
+    }
+
+@app.route('/analytics')
+def analytics_endpoint():
+    """Spending trends of the ledger as JSON, e.g. /analytics?months=12"""
+    # Per-member totals are as private as the ledger itself
+    if not export_authorized(request.headers.get('Authorization'), request.args.get('token')):
+        return {'error': 'Unauthorized'}, 401
+    
+    if not ensure_components() or not ledger:
+        return {'error': 'Google Sheets not initialized'}, 503
+    
+    try:
+        months = int(request.args['months']) if request.args.get('months') else None
+    except ValueError:
+        return {'error': 'months must be a whole number'}, 400
+    
+    from analytics import get_analytics
+    return get_analytics(ledger).report(months=months)
+
+@app.route('/export')
+def export_ledger():
+    """Stream the whole ledger as CSV or JSON Lines, e.g. /export?format=jsonl"""
+    if not export_authorized(request.headers.get('Authorization'), request.args.get('token')):
+        return {'error': 'Unauthorized'}, 401
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return {'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}, 400
+    if not ensure_components() or not ledger:
+        return {'error': 'Google Sheets not initialized'}, 503
+    
+    # The generator runs as the body is sent, reading one batch at a time
+    filename = f"ledger-{time.strftime('%Y%m%d')}.{export_format}"
+    return Response(
+        export_chunks(ledger, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def sheets_cache_error():
+    """Error response if the cache endpoints can't be used, None if they can"""
+    if not export_authorized(request.headers.get('Authorization'), request.args.get('token')):
+        return {'error': 'Unauthorized'}, 401
+    if not ledger:
+        return {'error': 'Google Sheets not initialized'}, 503
+    if ledger is not sheets_manager:
+        # Reports come from the local ledger, which edits made in the sheet never reach
+        return {'error': 'Reports are read from the local ledger, not Google Sheets'}, 409
+    return None
+
+@app.route('/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Drop the Google Sheets caches after editing the sheet manually"""
+    error = sheets_cache_error()
+    if error:
+        return error
+
+    ledger.invalidate_cache()
+    return {'status': 'invalidated'}
+
+@app.route('/cache/verify')
+def verify_cache():
+    """Compare the aggregate index against a full scan of the sheet"""
+    error = sheets_cache_error()
+    if error:
+        return error
+
+    try:
+        mismatches = ledger.verify_aggregates()
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+    return {
+        'status': 'OK' if not mismatches else 'REBUILT',
+        'mismatches': mismatches
     }
 
 if __name__ == '__main__':
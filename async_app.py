@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+Async variant of app.py on aiohttp, for many webhooks waiting on Google at once
+
+The routes, replies, LEDGER_BACKEND and TENANTS_CONFIG behave as in app.py,
+and messages go through the same MessageParser and WhatsAppBot. Google Sheets
+appends of the default family use an aiohttp client, so a slow API call
+holds a coroutine instead of a worker thread. Work that stays synchronous
+(local SQLite queries, GoogleSheetsManager reports, other families' sheets,
+startup) runs in a thread pool. Replies go back to Twilio as TwiML, so no
+Twilio API call is made.
+
+Differences from app.py:
+- No write-behind queue. With LEDGER_BACKEND=sheets, a failed append is
+  reported to the sender and left for Twilio's retry instead of queued.
+- No digests or outbound dispatcher. Run them from app.py.
+- No /cache endpoints.
+
+Usage:
+    python async_app.py
+    gunicorn async_app:create_app --worker-class aiohttp.GunicornWebWorker
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+import metrics
+from async_sheets import AsyncSheetsClient
+from ledger_cache import transaction_to_row
+from ledger_export import EXPORT_FORMATS, export_authorized, export_chunks, page_limit
+from ledger_query import QueryParser, answer_query
+from message_dedupe import MessageDeduplicator
+from message_parser import MessageParser
+from sheets_client import get_sheets_client
+from startup import StartupState
+from structured_logging import get_logger, mask_phone, new_request_id, request_id_var
+from tenants import TenantManagerCache, TenantRegistry, sheets_manager_factory
+from write_queue import backoff_delay
+
+log = get_logger('async_webhook')
+
+# Routes polled too often to log each request
+QUIET_ROUTES = {'/health', '/ready', '/metrics'}
+
+# Same metrics as app.py, registering a name twice returns the existing metric
+REQUEST_SECONDS = metrics.histogram('finance_bot_http_request_seconds', 'Latency of each HTTP request, by route', ['route'])
+PARSE_SECONDS = metrics.histogram('finance_bot_parse_seconds', 'Time to parse an incoming message')
+PARSE_FAILURES = metrics.counter('finance_bot_parse_failures_total', 'Message lines that could not be parsed, by reason', ['reason'])
+COMMANDS = metrics.counter('finance_bot_commands_total', 'Webhook messages handled, by command', ['command'])
+TRANSACTIONS = metrics.counter('finance_bot_transactions_total', 'Transactions recorded, by family member', ['member'])
+DUPLICATES = metrics.counter('finance_bot_webhook_duplicates_total', 'Webhook retries answered from the dedupe cache, by where the response was found', ['source'])
+
+TWIML_CONTENT_TYPE = 'text/xml'
+
+
+async def run_blocking(func: Callable, *args):
+    """Run a blocking call in the default thread pool, keeping the request ID for its log records"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, func, *args))
+
+
+class BotComponents:
+    """Everything the handlers need, created once per process after the server is listening"""
+
+    def __init__(self, credentials_file: str = 'credentials.json'):
+        """
+        Initialize components, nothing is created until initialize_until_ready runs
+
+        Args:
+            credentials_file: Path to Google service account credentials JSON file
+        """
+        self.credentials_file = credentials_file
+        self.startup = StartupState()
+        self.ready = asyncio.Event()
+        self.backend = os.getenv('LEDGER_BACKEND', 'sqlite').lower()
+        self.tenants_config = os.getenv('TENANTS_CONFIG')
+        self.wait_timeout = float(os.getenv('STARTUP_WAIT_TIMEOUT', '10'))
+        self.parser = MessageParser()
+        self.query_parser = QueryParser(self.parser)
+        self.sheets_manager = None
+        self.whatsapp_bot = None
+        self.ledger = None
+        self.ledger_mirror = None
+        self.tenants: Optional[TenantRegistry] = None
+        self.tenant_managers: Optional[TenantManagerCache] = None
+        self.deduplicator: Optional[MessageDeduplicator] = None
+        # Needed before startup finishes, retries can arrive while it is still running
+        if os.getenv('DEDUPE_ENABLED', 'true').lower() == 'true':
+            try:
+                self.deduplicator = MessageDeduplicator()
+            except Exception as e:
+                log.warning("Message dedupe unavailable, retries will be handled again", extra={'error': str(e)})
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.sheets: Optional[AsyncSheetsClient] = None
+        self.init_task: Optional[asyncio.Task] = None
+
+    def _initialize_blocking(self):
+        """Create the synchronous components, the same steps as app.initialize_components"""
+        # Google and Twilio clients are slow to import, so they load after the port is bound
+        with self.startup.phase('imports'):
+            from google_sheets_manager import GoogleSheetsManager
+            from whatsapp_bot import WhatsAppBot
+
+        if self.tenants_config and not self.tenants:
+            with self.startup.phase('tenants'):
+                registry = TenantRegistry.load(self.tenants_config)
+                self.tenant_managers = TenantManagerCache(sheets_manager_factory(self.credentials_file))
+                self.tenants = registry
+                print(f"[INFO] Serving {len(registry)} families from {self.tenants_config}, up to {self.tenant_managers.capacity} kept in memory")
+
+        # GOOGLE_SHEET_ID is optional once tenants are configured, as in app.py
+        single_family = not self.tenants_config or bool(os.getenv('GOOGLE_SHEET_ID'))
+        if not self.sheets_manager and single_family:
+            with self.startup.phase('sheets_client'):
+                manager = GoogleSheetsManager(self.credentials_file)
+            with self.startup.phase('sheet_headers'):
+                manager.ensure_sheet_headers()
+            self.sheets_manager = manager
+
+        if not self.ledger and self.sheets_manager:
+            with self.startup.phase('ledger'):
+                self._initialize_ledger()
+
+        with self.startup.phase('whatsapp_bot'):
+            self.whatsapp_bot = WhatsAppBot()
+
+    def _initialize_ledger(self):
+        """Open the local ledger and its mirror, or use the sheet directly"""
+        if self.backend != 'sqlite':
+            # Appends don't block the event loop, so there is no write-behind queue here
+            self.ledger = self.sheets_manager
+            return
+
+        from sqlite_ledger import SQLiteLedger, SheetsMirror
+
+        local_ledger = SQLiteLedger()
+        if local_ledger.needs_bootstrap():
+            copied = local_ledger.bootstrap(self.sheets_manager.get_all_rows())
+            print(f"[INFO] Local ledger filled with {copied} rows from Google Sheets")
+
+        if os.getenv('LEDGER_MIRROR_ENABLED', 'true').lower() == 'true':
+            self.ledger_mirror = SheetsMirror(local_ledger, self.sheets_manager)
+            self.ledger_mirror.start()
+            print(f"[INFO] Google Sheets mirror started ({self.ledger_mirror.pending_count()} rows waiting)")
+
+        self.ledger = local_ledger
+
+    async def initialize_until_ready(self):
+        """Initialize in the thread pool, retrying with backoff until it succeeds"""
+        attempt = 0
+        while True:
+            self.startup.begin_attempt()
+            try:
+                await run_blocking(self._initialize_blocking)
+                break
+            except Exception as e:
+                self.startup.mark_failed(str(e))
+                attempt += 1
+                delay = backoff_delay(attempt, base=1.0, cap=60.0)
+                print(f"[WARNING] Error initializing components: {str(e)}, retrying in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+
+        # Async clients belong to this event loop
+        self.session = aiohttp.ClientSession()
+        credentials = get_sheets_client(self.credentials_file).credentials
+        if self.sheets_manager:
+            self.sheets = AsyncSheetsClient(credentials, self.sheets_manager.sheet_id, self.session)
+
+        self.startup.mark_ready()
+        self.ready.set()
+        print(f"[SUCCESS] All components initialized successfully, {self.startup.summary()}")
+
+    async def wait_ready(self) -> bool:
+        """True once the components are ready, waiting up to STARTUP_WAIT_TIMEOUT"""
+        if self.ready.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self.ready.wait(), self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def family_components(self, to_number: str, from_number: str):
+        """
+        Find who serves a message, like app.family_components
+
+        Args:
+            to_number: Twilio number the message was sent to
+            from_number: Sender's WhatsApp number
+
+        Returns:
+            Tuple of (bot, tenant) of the sender's family, tenant is None for
+            the default family and bot is None if no family uses the number
+        """
+        tenant = self.tenants.resolve(to_number, from_number) if self.tenants else None
+        if tenant:
+            return self.whatsapp_bot.for_family(tenant.family_name, tenant.members, tenant.bot_name, tenant.whatsapp_number), tenant
+        if not self.ledger:
+            return None, None
+        return self.whatsapp_bot, None
+
+    async def add_transactions(self, transactions: List[Dict[str, str]], ledger=None) -> bool:
+        """Save transactions, appending to Google Sheets without blocking when it is the default family's ledger"""
+        ledger = ledger or self.ledger
+        if ledger is not self.sheets_manager or self.sheets_manager.partitioning:
+            return await run_blocking(ledger.add_transactions, transactions)
+
+        manager = self.sheets_manager
+        rows = [transaction_to_row(transaction) for transaction in transactions]
+        try:
+            result = await self.sheets.append(f'{manager.sheet_name}!A:F', rows)
+        except Exception as e:
+            log.error("Error adding transaction", extra={'error': str(e)})
+            return False
+
+        # Keep the manager's local copy in step, as GoogleSheetsManager.append_rows does
+        updated_range = result.get('updates', {}).get('updatedRange', '')
+        manager.cache.apply_append(rows, updated_range)
+        manager.row_index.apply_append(rows, updated_range)
+        log.info("Transactions added", extra={'count': len(rows)})
+        return True
+
+    async def close(self):
+        """Stop the mirror and close the async clients"""
+        if self.init_task:
+            self.init_task.cancel()
+        if self.ledger_mirror:
+            await run_blocking(self.ledger_mirror.stop)
+        if self.session:
+            await self.session.close()
+        if self.deduplicator:
+            self.deduplicator.close()
+
+
+COMPONENTS = web.AppKey('components', BotComponents)
+
+
+def twiml(message: str, components: BotComponents) -> web.Response:
+    """TwiML reply to Twilio"""
+    return web.Response(text=components.whatsapp_bot.create_response(message), content_type=TWIML_CONTENT_TYPE)
+
+
+@web.middleware
+async def request_context(request: web.Request, handler):
+    """Tag log records with a request ID and record each request's latency under its route"""
+    started = time.perf_counter()
+    request_id = request.headers.get('X-Request-Id')
+    if not request_id and request.method == 'POST' and request.content_type == 'application/x-www-form-urlencoded':
+        # Twilio's MessageSid ties our records to the message in Twilio's logs
+        request_id = (await request.post()).get('MessageSid')
+    token = request_id_var.set(request_id or new_request_id())
+    try:
+        response = await handler(request)
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else 'unmatched'
+        duration = time.perf_counter() - started
+        REQUEST_SECONDS.observe(duration, route=route)
+        if route not in QUIET_ROUTES:
+            log.info("Request completed", extra={'route': route, 'status': response.status, 'duration_ms': round(duration * 1000, 2)})
+        response.headers['X-Request-Id'] = request_id_var.get()
+        return response
+    finally:
+        request_id_var.reset(token)
+
+
+async def home(request: web.Request) -> web.Response:
+    """Home endpoint"""
+    return web.Response(text="WhatsApp Finance Tracker Bot is running!")
+
+
+async def health(request: web.Request) -> web.Response:
+    """Liveness check, answered without calling any external API"""
+    components = request.app[COMPONENTS]
+    status = {
+        "status": "healthy",
+        "ready": components.startup.ready,
+        "server": "async",
+        "startup": components.startup.snapshot(),
+        "components": {
+            "parser": components.parser is not None,
+            "sheets_manager": components.sheets_manager is not None,
+            "ledger": components.ledger is not None,
+            "whatsapp_bot": components.whatsapp_bot is not None
+        }
+    }
+    if components.tenants:
+        status["tenants"] = {"configured": len(components.tenants), "in_memory": len(components.tenant_managers)}
+    if components.ledger_mirror:
+        status["ledger_unmirrored"] = components.ledger_mirror.pending_count()
+    if components.sheets_manager:
+        status["sheets_scheduler"] = components.sheets_manager.scheduler.snapshot()
+    return web.json_response(status)
+
+
+async def ready(request: web.Request) -> web.Response:
+    """Readiness check, 503 until every component is initialized"""
+    state = request.app[COMPONENTS].startup.snapshot()
+    return web.json_response(state, status=200 if state['ready'] else 503)
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    """Prometheus metrics for this worker process"""
+    return web.Response(text=metrics.REGISTRY.render(), headers={'Content-Type': metrics.CONTENT_TYPE + '; charset=utf-8'})
+
+
+async def webhook(request: web.Request) -> web.Response:
+    """Handle incoming WhatsApp messages, answering Twilio retries with the response already given"""
+    components = request.app[COMPONENTS]
+    form = await request.post()
+
+    message_sid = form.get('MessageSid', '')
+    dedupe = components.deduplicator if message_sid else None
+    if not dedupe:
+        return await handle_message(components, form)
+
+    # A retry may wait here for the first delivery, so keep it off the event loop
+    outcome, cached = await run_blocking(dedupe.claim, message_sid)
+    if cached:
+        DUPLICATES.inc(source=outcome)
+        log.info("Duplicate message answered from cache", extra={'source': outcome})
+        body, status, content_type = cached
+        return web.Response(text=body, status=status, content_type=content_type)
+
+    try:
+        response = await handle_message(components, form)
+    except Exception:
+        await run_blocking(dedupe.release, message_sid)
+        raise
+
+    # Nothing was saved, so a retry should try again
+    if response.status >= 500 or response.get('retry_allowed'):
+        await run_blocking(dedupe.release, message_sid)
+    else:
+        await run_blocking(dedupe.complete, message_sid, (response.text, response.status, response.content_type))
+    return response
+
+
+async def handle_message(components: BotComponents, form) -> web.Response:
+    """Parse an incoming WhatsApp message and reply to it, like app.handle_message"""
+    try:
+        if not await components.wait_ready():
+            log.error("Components not ready", extra={'startup_status': components.startup.status, 'error': components.startup.error})
+            return web.Response(text="Components initialization failed", status=503)
+
+        incoming_msg = form.get('Body', '').strip()
+        from_number = form.get('From', '')
+
+        # Bot and ledger of the sender's family
+        bot, tenant = components.family_components(form.get('To', ''), from_number)
+        if not bot:
+            COMMANDS.inc(command='unknown_family')
+            log.info("Message from a number no family uses", extra={'from': mask_phone(from_number)})
+            return twiml("Nomor ini belum terdaftar di keluarga mana pun.", components)
+        # Creating a family's manager reads its sheet, so it happens off the event loop
+        ledger = await run_blocking(components.tenant_managers.get, tenant) if tenant else components.ledger
+
+        try:
+            family_member = bot.get_family_member(from_number)
+        except Exception as e:
+            log.warning("Error getting family member", extra={'error': str(e)})
+            family_member = "Unknown"
+
+        log.info("Received message", extra={'member': family_member, 'from': mask_phone(from_number), 'chars': len(incoming_msg)})
+        # Message text holds amounts and names, only a sample of it is logged at DEBUG
+        log.debug("Message body", extra={'body': incoming_msg})
+
+        command = incoming_msg.lower()
+        if command in ['help', 'bantuan', 'panduan']:
+            COMMANDS.inc(command='help')
+            return twiml(bot.format_help_message(), components)
+
+        if command in ['laporan', 'report', 'ringkasan']:
+            COMMANDS.inc(command='laporan')
+            summary = await run_blocking(ledger.get_monthly_summary)
+            return twiml(bot.format_report_message(summary), components)
+
+        if command in ['saldo', 'balance']:
+            COMMANDS.inc(command='saldo')
+            balance = await run_blocking(ledger.get_current_balance)
+            return twiml(f"[BALANCE] *{bot.bot_name}*\n\nSaldo {bot.family_name}: Rp {balance:,}", components)
+
+        if command in ['analisis', 'analysis', 'analitik']:
+            COMMANDS.inc(command='analisis')
+            from analytics import get_analytics
+            analysis = await run_blocking(get_analytics(ledger).report)
+            return twiml(bot.format_analysis_message(analysis), components)
+
+        if components.query_parser.is_query(incoming_msg):
+            answer = await run_blocking(answer_query, components.query_parser, incoming_msg, ledger, bot.family_members.values())
+            if answer:
+                COMMANDS.inc(command='query')
+                query, summary = answer
+                return twiml(bot.format_query_message(summary, query.title, query.tipe), components)
+
+        # Parsing is pure Python and fast, it runs on the event loop
+        with PARSE_SECONDS.time():
+            transactions, rejected_lines = components.parser.parse_transactions(incoming_msg)
+        for line in rejected_lines:
+            PARSE_FAILURES.inc(reason=components.parser.rejection_reason(line))
+        if not transactions and not rejected_lines:
+            PARSE_FAILURES.inc(reason='empty')
+        COMMANDS.inc(command='transaksi' if transactions else 'invalid')
+
+        if not transactions:
+            return twiml(bot.format_error_message("parsing"), components)
+
+        for transaction in transactions:
+            transaction['member'] = family_member
+
+        if await components.add_transactions(transactions, ledger):
+            TRANSACTIONS.inc(len(transactions), member=family_member)
+            return twiml(bot.format_success_message(transactions, skipped=len(rejected_lines)), components)
+
+        response = twiml(bot.format_error_message("sheets"), components)
+        response['retry_allowed'] = True
+        return response
+
+    except Exception:
+        log.exception("Error in webhook")
+        if components.whatsapp_bot:
+            return twiml(components.whatsapp_bot.format_error_message("general"), components)
+        return web.Response(text="Terjadi kesalahan sistem.")
+
+
+async def test_connections(request: web.Request) -> web.Response:
+    """Test endpoint to check all connections"""
+    components = request.app[COMPONENTS]
+    results = {}
+
+    results['google_sheets'] = False
+    if await components.wait_ready() and components.sheets:
+        try:
+            await components.sheets.get_metadata()
+            results['google_sheets'] = True
+        except Exception as e:
+            log.warning("Google Sheets connection failed", extra={'error': str(e)})
+
+    test_messages = [
+        "makan siang pengeluaran 20ribu",
+        "gaji pemasukan 5juta",
+        "transport pengeluaran 15k"
+    ]
+
+    parsing_results = []
+    for msg in test_messages:
+        parsed = components.parser.parse_message(msg)
+        parsing_results.append({
+            'message': msg,
+            'parsed': parsed,
+            'valid': components.parser.validate_transaction(parsed) if parsed else False
+        })
+
+    results['message_parsing'] = parsing_results
+
+    return web.json_response({
+        'status': 'OK' if results['google_sheets'] else 'ERROR',
+        'results': results
+    })
+
+
+async def recent_transactions(request: web.Request) -> web.Response:
+    """Get a page of transactions from the ledger, newest first, like app.recent_transactions"""
+    components = request.app[COMPONENTS]
+    if not await components.wait_ready() or not components.ledger:
+        return web.json_response({'error': 'Google Sheets not initialized'})
+
+    try:
+        limit = page_limit(request.query.get('limit'))
+        transactions, next_cursor = await run_blocking(components.ledger.get_transactions_page, limit, request.query.get('cursor') or None)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    return web.json_response({
+        'count': len(transactions),
+        'transactions': transactions,
+        'next_cursor': next_cursor
+    })
+
+
+async def analytics_endpoint(request: web.Request) -> web.Response:
+    """Spending trends of the ledger as JSON, like app.analytics_endpoint"""
+    if not export_authorized(request.headers.get('Authorization'), request.query.get('token')):
+        return web.json_response({'error': 'Unauthorized'}, status=401)
+
+    components = request.app[COMPONENTS]
+    if not await components.wait_ready() or not components.ledger:
+        return web.json_response({'error': 'Google Sheets not initialized'}, status=503)
+
+    try:
+        months = int(request.query['months']) if request.query.get('months') else None
+    except ValueError:
+        return web.json_response({'error': 'months must be a whole number'}, status=400)
+
+    from analytics import get_analytics
+    return web.json_response(await run_blocking(get_analytics(components.ledger).report, None, months))
+
+
+async def export_ledger(request: web.Request) -> web.StreamResponse:
+    """Stream the whole ledger as CSV or JSON Lines, reading each batch in the thread pool"""
+    if not export_authorized(request.headers.get('Authorization'), request.query.get('token')):
+        return web.json_response({'error': 'Unauthorized'}, status=401)
+
+    export_format = request.query.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return web.json_response({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    components = request.app[COMPONENTS]
+    if not await components.wait_ready() or not components.ledger:
+        return web.json_response({'error': 'Google Sheets not initialized'}, status=503)
+
+    filename = f"ledger-{time.strftime('%Y%m%d')}.{export_format}"
+    response = web.StreamResponse(headers={
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        # Headers can't change once streaming starts, so the middleware's is set here
+        'X-Request-Id': request_id_var.get()
+    })
+    await response.prepare(request)
+
+    chunks = export_chunks(components.ledger, export_format)
+    while True:
+        chunk = await run_blocking(next, chunks, None)
+        if chunk is None:
+            break
+        await response.write(chunk.encode('utf-8'))
+    await response.write_eof()
+    return response
+
+
+async def components_context(app: web.Application):
+    """Start initializing once the server is up, and shut the components down with it"""
+    components = app[COMPONENTS]
+    components.init_task = asyncio.get_running_loop().create_task(components.initialize_until_ready())
+    yield
+    await components.close()
+
+
+async def create_app(credentials_file: str = 'credentials.json') -> web.Application:
+    """
+    Build the aiohttp application
+
+    Args:
+        credentials_file: Path to Google service account credentials JSON file
+
+    Returns:
+        Application with the same routes as app.py
+    """
+    load_dotenv()
+
+    app = web.Application(middlewares=[request_context])
+    app[COMPONENTS] = BotComponents(credentials_file)
+    app.cleanup_ctx.append(components_context)
+
+    app.router.add_get('/', home)
+    app.router.add_get('/health', health)
+    app.router.add_get('/ready', ready)
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_post('/webhook', webhook)
+    app.router.add_get('/test', test_connections)
+    app.router.add_get('/recent', recent_transactions)
+    app.router.add_get('/analytics', analytics_endpoint)
+    app.router.add_get('/export', export_ledger)
+    return app
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5000))
+    print(f"[INFO] Starting async WhatsApp Finance Tracker Bot on port {port}")
+    web.run_app(create_app(), host='0.0.0.0', port=port, access_log=None)
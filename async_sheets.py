@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import aiohttp
+import google_auth_httplib2
+import httplib2
+from yarl import URL
+
+from api_scheduler import REQUEST_SECONDS, RETRYABLE_STATUSES, get_scheduler
+from structured_logging import get_logger
+from write_queue import backoff_delay
+
+log = get_logger('async_sheets')
+
+SHEETS_API_URL = 'https://sheets.googleapis.com'
+
+
+class SheetsApiError(Exception):
+    """Error response from the Google Sheets API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Google Sheets API returned {status}: {message}")
+        self.status = status
+
+
+class AsyncSheetsClient:
+    """Google Sheets API v4 over aiohttp, so waiting on Google doesn't hold a thread
+
+    Covers the calls made while answering a webhook. Setup, partitioning and
+    the formula summary stay with GoogleSheetsManager. Calls draw from the
+    same quota buckets as the process's ApiScheduler.
+    """
+
+    def __init__(self, credentials, sheet_id: str, session: aiohttp.ClientSession, max_retries: Optional[int] = None):
+        """
+        Initialize async Sheets client
+
+        Args:
+            credentials: Google credentials used for every request
+            sheet_id: Spreadsheet ID
+            session: aiohttp session owned by the caller, created inside the running event loop
+            max_retries: Retries after a rate limit or, for reads, a server error
+        """
+        self.credentials = credentials
+        self.sheet_id = sheet_id
+        self.session = session
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHEETS_MAX_RETRIES', '4'))
+        self.max_backoff = float(os.getenv('SHEETS_MAX_BACKOFF', '16'))
+        self.base_url = os.getenv('GOOGLE_SHEETS_API_ENDPOINT', SHEETS_API_URL).rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=float(os.getenv('GOOGLE_API_TIMEOUT', '30')))
+        self.scheduler = get_scheduler()
+        self._refresh_lock = asyncio.Lock()
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Authorization header, refreshing the access token in a worker thread when it has expired"""
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    request = google_auth_httplib2.Request(httplib2.Http())
+                    await asyncio.get_running_loop().run_in_executor(None, self.credentials.refresh, request)
+        headers: Dict[str, str] = {}
+        self.credentials.apply(headers)
+        return headers
+
+    async def _request(self, method: str, path: str, operation: str, writes: bool = False, **kwargs) -> Dict:
+        """
+        Send one API call, retrying like ApiScheduler does
+
+        Args:
+            method: HTTP method
+            path: Path below /v4/spreadsheets/{id}
+            operation: API method name for the latency metric, e.g. 'append'
+            writes: True for calls that change the sheet, which are only retried when rate limited
+            **kwargs: Passed to aiohttp, e.g. params or json
+
+        Returns:
+            Decoded JSON response
+        """
+        # Ranges are already quoted, don't let the ':' in 'A:E' be unquoted again
+        url = URL(f"{self.base_url}/v4/spreadsheets/{self.sheet_id}{path}", encoded=True)
+        bucket = self.scheduler.buckets['write' if writes else 'read']
+        attempt = 0
+        while True:
+            wait = bucket.try_acquire()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = bucket.try_acquire()
+
+            started = time.perf_counter()
+            try:
+                async with self.session.request(method, url, headers=await self._auth_headers(), timeout=self.timeout, **kwargs) as response:
+                    if response.status < 400:
+                        return await response.json(content_type=None)
+                    error = SheetsApiError(response.status, await response.text())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if writes:
+                    raise
+                error = e
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+                if writes:
+                    # Like ApiScheduler.execute, so later reads don't join a read from before this write
+                    with self.scheduler.lock:
+                        self.scheduler.generation += 1
+
+            status = getattr(error, 'status', None)
+            retryable = status == 429 or (not writes and (status is None or status in RETRYABLE_STATUSES))
+            if not retryable or attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            delay = backoff_delay(attempt, base=1.0, cap=self.max_backoff)
+            log.warning("Sheets API call failed, retrying", extra={'operation': operation, 'status': status, 'retry_in': round(delay, 1), 'attempt': attempt})
+            await asyncio.sleep(delay)
+
+    async def get_metadata(self) -> Dict:
+        """Spreadsheet title and tabs"""
+        return await self._request('GET', '', 'get')
+
+    async def append(self, a1_range: str, rows: List[List[str]]) -> Dict:
+        """
+        Append rows below the table in a range, values stored as entered
+
+        Args:
+            a1_range: Range like 'Sheet1!A:E'
+            rows: Row values in column order
+
+        Returns:
+            The append response, with the written range under 'updates'
+        """
+        return await self._request(
+            'POST', f"/values/{quote(a1_range, safe='')}:append", 'append', writes=True,
+            params={'valueInputOption': 'RAW'}, json={'values': rows}
+        )
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark for MessageParser.parse_message over a synthetic message corpus
+
+Compares the single-pass tokenizer against the previous regex-per-pattern
+parser, read from git, and checks both against the transaction each message
+was built from.
+
+Usage:
+    python bench_parser.py [--count 100000] [--seed 42] [--baseline fd14255]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import time
+import types
+from typing import Dict, List, Optional, Tuple
+
+from message_parser import MessageParser
+
+NAMES = ['makan siang', 'kopi', 'bensin', 'belanja bulanan', 'gaji', 'bonus', 'freelance',
+         'transport', 'pulsa', 'listrik', 'arisan', 'jajan anak', 'parkir', 'obat']
+AMOUNTS = ['20ribu', '15k', '50rb', '5juta', '2.5juta', '1.2m', '100k', '500000', '75000', '3jt']
+DATES = ['', '', '', 'kemarin', 'besok', '15/07/2025', '20-7', '3 hari lalu', '2 hari lagi', 'yesterday']
+INVALID = ['halo', 'makan siang 20ribu', 'pengeluaran 20ribu', 'makan siang pengeluaran', 'laporan']
+
+# Commit whose regex-per-pattern parser is the baseline
+LEGACY_REVISION = 'fd14255'
+
+
+def load_legacy_parser(revision: str = LEGACY_REVISION):
+    """
+    Load the regex-per-pattern parser from an older commit, kept as the baseline
+
+    Args:
+        revision: Git revision whose message_parser.py is loaded
+
+    Returns:
+        MessageParser instance of that revision
+
+    Raises:
+        RuntimeError: If git can't read the file, e.g. outside a clone
+    """
+    try:
+        source = subprocess.run(['git', 'show', f'{revision}:message_parser.py'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(f"Could not read message_parser.py at {revision}: {e}") from e
+
+    module = types.ModuleType(f'message_parser_{revision}')
+    exec(compile(source, f'{revision}:message_parser.py', 'exec'), module.__dict__)
+    return module.MessageParser()
+
+
+AMOUNT_VALUES = {'20ribu': '20000', '15k': '15000', '50rb': '50000', '5juta': '5000000', '2.5juta': '2500000',
+                 '1.2m': '1200000', '100k': '100000', '500000': '500000', '75000': '75000', '3jt': '3000000'}
+
+
+def generate_corpus(count: int, seed: int = 42) -> List[Tuple[str, Optional[Dict[str, str]]]]:
+    """
+    Build a reproducible list of realistic messages, about 1 in 10 invalid
+
+    Returns:
+        List of (message, expected) pairs, expected holds 'nama', 'tipe' and 'nominal' or None
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            corpus.append((rng.choice(INVALID), None))
+            continue
+        nama = rng.choice(NAMES)
+        tipe = 'pemasukan' if rng.random() < 0.2 else 'pengeluaran'
+        amount = rng.choice(AMOUNTS)
+        parts = [nama, tipe, amount, rng.choice(DATES)]
+        expected = {'nama': nama, 'tipe': tipe, 'nominal': AMOUNT_VALUES[amount]}
+        corpus.append((' '.join(part for part in parts if part), expected))
+    return corpus
+
+
+def is_correct(result: Optional[Dict[str, str]], expected: Optional[Dict[str, str]]) -> bool:
+    """Whether a parse result matches the expected transaction, ignoring the date"""
+    if not result or not expected:
+        return result == expected
+    return all(result[key] == value for key, value in expected.items())
+
+
+def time_parser(parse, corpus: List[str]) -> float:
+    """Seconds taken to parse the whole corpus"""
+    start = time.perf_counter()
+    for message in corpus:
+        parse(message)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--count', type=int, default=100000, help='Number of messages in the corpus')
+    arg_parser.add_argument('--seed', type=int, default=42, help='Random seed for the corpus')
+    arg_parser.add_argument('--baseline', default=LEGACY_REVISION, help='Git revision of the parser to compare against')
+    args = arg_parser.parse_args()
+
+    corpus = generate_corpus(args.count, args.seed)
+    messages = [message for message, _ in corpus]
+    legacy = load_legacy_parser(args.baseline)
+    parser = MessageParser()
+
+    print(f"[BENCH] Parsing {len(messages):,} messages")
+    print("=" * 50)
+
+    legacy_seconds = time_parser(legacy.parse_message, messages)
+    parser_seconds = time_parser(parser.parse_message, messages)
+
+    print(f"Legacy parser:    {legacy_seconds:.3f}s ({len(messages) / legacy_seconds:,.0f} msg/s)")
+    print(f"Tokenizer parser: {parser_seconds:.3f}s ({len(messages) / parser_seconds:,.0f} msg/s)")
+    print(f"Speedup:          {legacy_seconds / parser_seconds:.1f}x")
+
+    # The legacy parser reads digits inside dates ("3 hari lalu") and the k of
+    # "kemarin" as part of the amount, the tokenizer gives each character to one token
+    legacy_wrong = [message for message, expected in corpus if not is_correct(legacy.parse_message(message), expected)]
+    parser_wrong = [message for message, expected in corpus if not is_correct(parser.parse_message(message), expected)]
+
+    print(f"Wrong results:    legacy {len(legacy_wrong):,}, tokenizer {len(parser_wrong):,}")
+    for message in parser_wrong[:10]:
+        print(f"    '{message}'")
+
+
+if __name__ == "__main__":
+    main()
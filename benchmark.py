@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the parser, the WhatsApp reply renderers, the
+/webhook route end to end and the analytics engine, plus the sync and
+async servers under concurrent load
+
+Google Sheets and Twilio are replaced by the local servers in
+fake_services.py, with configurable latency. Each scenario reports
+throughput, latency percentiles and memory allocated per call, and the
+results are saved as JSON so runs can be compared between versions.
+
+Usage:
+    python benchmark.py                                   # every suite, saved to benchmark-results.json
+    python benchmark.py --suite parser,formatter --iterations 20000
+    python benchmark.py --latency 0.15 --jitter 0.05 --backend sheets
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --suite concurrency --backend sheets --direct-writes --concurrency 200
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from bench_parser import generate_corpus
+from fake_services import FakeSheetsServer, FakeTwilioServer
+
+SUITES = ('parser', 'formatter', 'webhook', 'twilio', 'analytics', 'concurrency')
+
+# Every message is parsed as if it arrived at this moment, so runs are comparable
+FIXED_NOW = datetime(2025, 7, 15, 12, 0, 0)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def measure(func: Callable, inputs: List, iterations: int, warmup: int, alloc_samples: int) -> Dict:
+    """
+    Time a function over a cycle of inputs, then sample its allocations
+
+    Args:
+        func: Function called with one input per iteration
+        inputs: Inputs used in turn
+        iterations: Timed calls
+        warmup: Untimed calls made first
+        alloc_samples: Calls traced with tracemalloc after timing
+
+    Returns:
+        Throughput, latency percentiles in milliseconds and peak KiB allocated per call
+    """
+    count = len(inputs)
+    for i in range(warmup):
+        func(inputs[i % count])
+
+    durations = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for i in range(iterations):
+        call_started = clock()
+        func(inputs[i % count])
+        durations.append(clock() - call_started)
+    elapsed = (clock() - started) / 1e9
+
+    # Tracing slows every allocation, so it runs apart from the timed loop
+    peaks = []
+    tracemalloc.start()
+    for i in range(alloc_samples):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(inputs[i % count])
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    durations_ms = sorted(duration / 1e6 for duration in durations)
+    return {
+        'iterations': iterations,
+        'throughput_per_s': round(iterations / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(durations_ms) / len(durations_ms), 4),
+        'p50_ms': round(percentile(durations_ms, 0.50), 4),
+        'p95_ms': round(percentile(durations_ms, 0.95), 4),
+        'p99_ms': round(percentile(durations_ms, 0.99), 4),
+        'max_ms': round(durations_ms[-1], 4),
+        'alloc_peak_kib': round(sum(peaks) / len(peaks) / 1024, 2) if peaks else None
+    }
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without werkzeug's access log"""
+
+    def log(self, *args):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handling requests on a fixed pool of threads, like one gunicorn gthread worker"""
+
+    def __init__(self, host: str, port: int, app, threads: int):
+        super().__init__(host, port, app, handler=QuietRequestHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_sync_server(flask_app, threads: int) -> Tuple[str, Callable[[], None]]:
+    """Serve the Flask app on a local port, returning its URL and a function that stops it"""
+    server = PooledWSGIServer('127.0.0.1', 0, flask_app, threads)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.pool.shutdown()
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def start_async_server() -> Tuple[str, Callable[[], None]]:
+    """Serve async_app on a local port from its own event loop thread, once its components are ready"""
+    from aiohttp import web
+    import async_app
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def start():
+        application = await async_app.create_app()
+        runner = web.AppRunner(application, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        await application[async_app.COMPONENTS].ready.wait()
+        return runner, runner.addresses[0][1]
+
+    runner, port = asyncio.run_coroutine_threadsafe(start(), loop).result(timeout=60)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=60)
+        loop.call_soon_threadsafe(loop.stop)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+async def load_test(url: str, bodies: List[str], total: int, concurrency: int) -> Dict:
+    """
+    Post webhooks with a fixed number in flight at once
+
+    Args:
+        url: Server base URL
+        bodies: Message bodies used in turn
+        total: Requests sent
+        concurrency: Requests in flight at once
+
+    Returns:
+        Throughput and latency percentiles in milliseconds
+    """
+    durations = []
+    counter = iter(range(total))
+
+    async def client(session: aiohttp.ClientSession):
+        for index in counter:
+            data = {'Body': bodies[index % len(bodies)], 'From': 'whatsapp:+6281234567890'}
+            started = time.perf_counter()
+            async with session.post(url + '/webhook', data=data) as response:
+                await response.read()
+                assert response.status == 200, response.status
+            durations.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    durations_ms = sorted(duration * 1000 for duration in durations)
+    return {
+        'iterations': total,
+        'concurrency': concurrency,
+        'throughput_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(durations_ms) / len(durations_ms), 4),
+        'p50_ms': round(percentile(durations_ms, 0.50), 4),
+        'p95_ms': round(percentile(durations_ms, 0.95), 4),
+        'p99_ms': round(percentile(durations_ms, 0.99), 4),
+        'max_ms': round(durations_ms[-1], 4),
+        'alloc_peak_kib': None
+    }
+
+
+def run_concurrency(args, flask_app, corpus: List[str], sheets: FakeSheetsServer, quiet: io.StringIO) -> Dict[str, Dict]:
+    """Compare the sync server with a gthread-sized pool against the async server under the same load"""
+    results = {}
+    servers = [
+        (f'concurrency.sync_{args.threads}_threads', lambda: start_sync_server(flask_app, args.threads)),
+        ('concurrency.async', start_async_server),
+    ]
+    total = args.iterations * 2
+    for name, start in servers:
+        with redirect_stdout(quiet):
+            url, stop = start()
+            # Warm up connections and caches before timing
+            asyncio.run(load_test(url, corpus, min(args.concurrency, total), args.concurrency))
+            requests_before, bytes_before = sheets.request_count, sheets.bytes_sent
+            result = asyncio.run(load_test(url, corpus, total, args.concurrency))
+            stop()
+        quiet.seek(0)
+        quiet.truncate()
+
+        result['sheets_requests_per_op'] = round((sheets.request_count - requests_before) / total, 3)
+        result['sheets_kib_per_op'] = round((sheets.bytes_sent - bytes_before) / total / 1024, 2)
+        results[name] = result
+        print(f"{name:<28} {result['throughput_per_s']:>10.1f}/s  p50 {result['p50_ms']:>8.3f}ms  "
+              f"p95 {result['p95_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms  {args.concurrency} in flight  "
+              f"sheets {result['sheets_requests_per_op']:.2f} req {result['sheets_kib_per_op']:.1f}KiB")
+    return results
+
+
+def sample_rows(count: int) -> List[List[str]]:
+    """Ledger rows for pre-filling the fake sheet"""
+    rows = []
+    for index, (_, expected) in enumerate(generate_corpus(count, seed=7)):
+        if not expected:
+            continue
+        day = index % 28 + 1
+        rows.append([f"2025-07-{day:02d} 08:00:00", 'Mama', expected['nama'], expected['tipe'], str(expected['nominal'])])
+    return rows
+
+
+def configure_environment(args, data_dir: str, sheets: FakeSheetsServer, twilio: FakeTwilioServer):
+    """Point the app at the fake services and a throwaway data directory before it is imported"""
+    os.environ.update({
+        'STARTUP_MODE': 'eager',
+        'GOOGLE_SHEET_ID': 'benchmark',
+        'GOOGLE_SHEET_NAME': 'Sheet1',
+        'GOOGLE_SHEETS_API_ENDPOINT': sheets.url,
+        'TWILIO_API_BASE_URL': twilio.url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'benchmark',
+        'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886',
+        'LEDGER_BACKEND': args.backend,
+        'WRITE_BEHIND_ENABLED': 'false' if args.direct_writes else 'true',
+        'LEDGER_DB_PATH': os.path.join(data_dir, 'ledger.db'),
+        'WRITE_QUEUE_PATH': os.path.join(data_dir, 'write_queue.db'),
+        'DEDUPE_DB_PATH': os.path.join(data_dir, 'dedupe.db'),
+        # Log records are written by a background thread, after stdout is restored
+        'LOG_LEVEL': 'WARNING',
+        'SHEET_HEADERS_MARKER': os.path.join(data_dir, 'sheet_headers.json'),
+        # Measure the bot, not the quota throttle
+        'SHEETS_READ_QUOTA_PER_MINUTE': '1000000',
+        'SHEETS_WRITE_QUOTA_PER_MINUTE': '1000000',
+    })
+    os.environ.pop('GOOGLE_APPLICATION_CREDENTIALS_JSON', None)
+
+    # The fake server doesn't check tokens, so skip loading a service account
+    import sheets_client
+    from google.auth.credentials import AnonymousCredentials
+    sheets_client.load_credentials = lambda credentials_file='credentials.json': AnonymousCredentials()
+
+
+def run_suites(args) -> Dict[str, Dict]:
+    """Run the selected suites and return results keyed by scenario name"""
+    suites = [suite.strip() for suite in args.suite.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"[ERROR] Unknown suite: {', '.join(sorted(unknown))}")
+
+    options = {'latency': args.latency, 'jitter': args.jitter}
+    sheets = FakeSheetsServer(**options).start()
+    twilio = FakeTwilioServer(**options).start()
+    sheets.sheets['Sheet1'] = [['Tanggal', 'Member', 'Nama', 'Tipe', 'Nominal']] + sample_rows(args.rows)
+
+    data_dir = tempfile.mkdtemp(prefix='finance-bot-bench-')
+    configure_environment(args, data_dir, sheets, twilio)
+
+    quiet = io.StringIO()
+    with redirect_stdout(quiet):
+        import app
+        from whatsapp_bot import WhatsAppBot
+    if not app.startup.ready:
+        raise SystemExit(f"[ERROR] App failed to start against the fake services: {app.startup.error}")
+
+    corpus = [message for message, _ in generate_corpus(1000, seed=args.seed)]
+    transactions = [tx for tx in (app.parser.parse_message(message, now=FIXED_NOW) for message in corpus) if tx]
+    for transaction in transactions:
+        transaction['member'] = 'Mama'
+
+    bot = WhatsAppBot()
+    summary = {
+        'total_pemasukan': 5000000,
+        'total_pengeluaran': 1250000,
+        'saldo': 3750000,
+        'recent': transactions[:5]
+    }
+
+    scenarios = []
+    if 'parser' in suites:
+        scenarios += [
+            ('parser.parse_message', lambda message: app.parser.parse_message(message, now=FIXED_NOW), corpus, args.iterations * 10),
+            ('parser.parse_transactions', lambda message: app.parser.parse_transactions(message, now=FIXED_NOW), [
+                '\n'.join(corpus[i:i + 3]) for i in range(0, 300, 3)
+            ], args.iterations * 5),
+        ]
+    if 'formatter' in suites:
+        scenarios += [
+            ('formatter.success_single', bot.format_success_message, transactions, args.iterations * 10),
+            ('formatter.success_batch', lambda batch: bot.format_success_message(batch, skipped=1), [
+                transactions[i:i + 3] for i in range(0, 60, 3)
+            ], args.iterations * 10),
+            ('formatter.report', bot.format_report_message, [summary], args.iterations * 10),
+            ('formatter.help', lambda _: bot.format_help_message(), [None], args.iterations * 10),
+            ('formatter.create_response', bot.create_response, [bot.format_report_message(summary)], args.iterations * 10),
+        ]
+    if 'webhook' in suites:
+        client = app.app.test_client()
+
+        def post(body):
+            response = client.post('/webhook', data={'Body': body, 'From': 'whatsapp:+6281234567890'})
+            assert response.status_code == 200, response.status_code
+            return response
+
+        scenarios += [
+            ('webhook.transaction', post, corpus, args.iterations),
+            ('webhook.multi_transaction', post, ['\n'.join(corpus[i:i + 3]) for i in range(0, 300, 3)], args.iterations),
+            ('webhook.laporan', post, ['laporan'], args.iterations),
+            ('webhook.saldo', post, ['saldo'], args.iterations),
+            ('webhook.help', post, ['help'], args.iterations),
+        ]
+    if 'twilio' in suites:
+        family = [f'whatsapp:+62812000000{index:02d}' for index in range(8)]
+        scenarios += [
+            ('twilio.send_message', lambda text: bot.send_message('whatsapp:+6281234567890', text), ['Pengingat: catat pengeluaran hari ini'], args.iterations),
+            # One message to each of 8 recipients through the dispatcher's worker pool
+            ('twilio.dispatch_broadcast', lambda text: all(message.wait(60) for message in app.dispatcher.broadcast(family, text)),
+             ['Pengingat: catat pengeluaran hari ini'], args.iterations // 4),
+        ]
+
+    if 'analytics' in suites:
+        from analytics import analyze, generate_columns
+        ledger_columns = generate_columns(1000000, seed=args.seed, today=FIXED_NOW.date())
+        scenarios += [
+            ('analytics.analyze_1m', lambda columns: analyze(columns, FIXED_NOW.date()), [ledger_columns], max(args.iterations // 10, 10)),
+        ]
+
+    results = {}
+    for name, func, inputs, iterations in scenarios:
+        warmup = min(iterations // 10, 100)
+        alloc_samples = min(iterations, 200)
+        requests_before, bytes_before = sheets.request_count, sheets.bytes_sent
+        with redirect_stdout(quiet):
+            result = measure(func, inputs, iterations, warmup=warmup, alloc_samples=alloc_samples)
+        quiet.seek(0)
+        quiet.truncate()
+
+        # Includes calls made by background workers such as the Sheets mirror
+        calls = warmup + iterations + alloc_samples
+        result['sheets_requests_per_op'] = round((sheets.request_count - requests_before) / calls, 3)
+        result['sheets_kib_per_op'] = round((sheets.bytes_sent - bytes_before) / calls / 1024, 2)
+        results[name] = result
+        print(f"{name:<28} {result['throughput_per_s']:>10.1f}/s  p50 {result['p50_ms']:>8.3f}ms  "
+              f"p95 {result['p95_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms  alloc {result['alloc_peak_kib']:>7.1f}KiB  "
+              f"sheets {result['sheets_requests_per_op']:.2f} req {result['sheets_kib_per_op']:.1f}KiB")
+
+    if 'concurrency' in suites:
+        results.update(run_concurrency(args, app.app, corpus, sheets, quiet))
+
+    with redirect_stdout(quiet):
+        app.shutdown_components()
+    sheets.stop()
+    twilio.stop()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """Current commit, None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict], baseline_path: str):
+    """Print the change of every scenario against an earlier results file"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('git_revision') or 'unknown revision'}):")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            print(f"{name:<28} new scenario")
+            continue
+        changes = []
+        for key in ('throughput_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'alloc_peak_kib', 'sheets_kib_per_op'):
+            if before.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"{name:<28} {'  '.join(changes)}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the parser, formatters and webhook against local fake services')
+    arg_parser.add_argument('--suite', default=','.join(SUITES), help=f"Comma separated suites from {', '.join(SUITES)}")
+    arg_parser.add_argument('--iterations', type=int, default=300, help='Timed webhook calls, the fast suites run more')
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every fake API response')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds per fake API response')
+    arg_parser.add_argument('--rows', type=int, default=2000, help='Rows in the fake sheet before the run')
+    arg_parser.add_argument('--backend', choices=['sqlite', 'sheets'], default='sqlite', help='LEDGER_BACKEND for the app')
+    arg_parser.add_argument('--direct-writes', action='store_true', help='Disable the write-behind queue with the sheets backend')
+    arg_parser.add_argument('--concurrency', type=int, default=100, help='Webhooks in flight at once in the concurrency suite')
+    arg_parser.add_argument('--threads', type=int, default=8, help='Request threads of the sync server in the concurrency suite, like GUNICORN_THREADS')
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--output', default='benchmark-results.json')
+    arg_parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = arg_parser.parse_args()
+
+    print(f"[INFO] Benchmarking with {args.latency * 1000:.0f}ms fake API latency, {args.backend} backend")
+    results = run_suites(args)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'options': vars(args)
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"[SUCCESS] Results saved to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
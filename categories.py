@@ -0,0 +1,157 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from family_config import FAMILY_CONFIG
+
+# Category of transactions whose name holds none of the keywords
+OTHER = 'lainnya'
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton finding every keyword in a text in one pass
+
+    The keywords are compiled into a trie with failure links once, so a search
+    costs the length of the text plus the matches found, however many
+    keywords there are.
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        """
+        Compile the automaton
+
+        Args:
+            keywords: Keyword to the value reported when it is found
+        """
+        # State 0 is the root, each state is a node of the keyword trie
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # (keyword length, value) of every keyword ending at a state
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+        for keyword, value in keywords.items():
+            if keyword:
+                self._insert(keyword, value)
+        self._link()
+
+    def _insert(self, keyword: str, value: str):
+        """Add one keyword to the trie"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(keyword), value))
+
+    def _link(self):
+        """Set the failure links breadth first, so each state also reports the keywords ending in its suffixes"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+                queue.append(next_state)
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        Find every keyword in a text, overlapping ones included
+
+        Args:
+            text: Text to search
+
+        Yields:
+            Start and end offsets of each keyword found, and its value
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield end - length, end, value
+
+
+class CategoryClassifier:
+    """Tags transactions with a category from keywords in their name"""
+
+    def __init__(self, categories: Dict[str, List[str]], aliases: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize classifier
+
+        Args:
+            categories: Category names for 'pengeluaran' and 'pemasukan'
+            aliases: Other words meaning a category, each category's name is always one of its keywords
+        """
+        aliases = aliases or {}
+        self.categories = {tipe: list(names) for tipe, names in categories.items()}
+        self.matchers: Dict[str, KeywordMatcher] = {}
+        for tipe, names in self.categories.items():
+            keywords: Dict[str, str] = {}
+            for name in names:
+                for keyword in [name] + list(aliases.get(name, [])):
+                    # A keyword listed under two categories keeps the first one
+                    keywords.setdefault(normalize(keyword), name)
+            self.matchers[tipe] = KeywordMatcher(keywords)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict] = None) -> 'CategoryClassifier':
+        """Build the classifier from the categories and aliases in FAMILY_CONFIG"""
+        config = config or FAMILY_CONFIG
+        return cls(
+            {'pengeluaran': config.get('expense_categories', []), 'pemasukan': config.get('income_categories', [])},
+            config.get('category_aliases', {})
+        )
+
+    def classify(self, nama: str, tipe: str) -> str:
+        """
+        Pick the category of a transaction
+
+        Args:
+            nama: Transaction name, e.g. 'bensin motor'
+            tipe: 'pemasukan', anything else is classified as an expense
+
+        Returns:
+            The category of the longest whole-word keyword in the name, the
+            first one on a tie, or OTHER if there is none
+        """
+        matcher = self.matchers.get('pemasukan' if tipe == 'pemasukan' else 'pengeluaran')
+        if matcher is None:
+            return OTHER
+
+        text = normalize(nama)
+        best = None
+        for start, end, category in matcher.find(text):
+            # 'tol' is a keyword, 'tolak' is not a match
+            if (start and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                continue
+            if best is None or end - start > best[1] - best[0] or (end - start == best[1] - best[0] and start < best[0]):
+                best = (start, end, category)
+        return best[2] if best else OTHER
+
+
+def normalize(text: str) -> str:
+    """Lowercase text with single spaces, how keywords and names are compared"""
+    return ' '.join(str(text or '').lower().split())
+
+
+_classifier: Optional[CategoryClassifier] = None
+
+
+def get_classifier() -> CategoryClassifier:
+    """Classifier built from FAMILY_CONFIG, shared by the process"""
+    global _classifier
+    if _classifier is None:
+        _classifier = CategoryClassifier.from_config()
+    return _classifier
+
+
+def categorize(nama: str, tipe: str) -> str:
+    """Category of a transaction by its name and type, see CategoryClassifier.classify"""
+    return get_classifier().classify(nama, tipe)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Daily, weekly and monthly summaries pushed to every family member
+
+The scheduler keeps running totals per day, ISO week and month, fed only by
+transactions recorded since its last look at the ledger, and saves them with
+its ledger cursor so a restart picks up where it stopped. Every worker runs a
+scheduler, and the one holding the lock file is the only one that reads the
+ledger and sends.
+
+Usage:
+    python digest.py preview daily     # print yesterday's digest without sending it
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from categories import categorize
+from ledger_cache import month_key, parse_nominal
+from structured_logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows, where every process acts as leader
+    fcntl = None
+
+log = get_logger('digest')
+
+PERIODS = ('daily', 'weekly', 'monthly')
+
+DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+MONTH_NAMES = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni', 'Juli',
+               'Agustus', 'September', 'Oktober', 'November', 'Desember']
+
+# Transactions listed under each digest
+RECENT_LIMIT = 5
+
+
+def transaction_date(tanggal: str) -> Optional[date]:
+    """Day of a date cell like '2025-07-15 12:00:00', None if it has no recognizable date"""
+    match = DATE_PATTERN.search(str(tanggal))
+    if not match:
+        return None
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+
+def period_key(kind: str, day: date) -> str:
+    """Key of the period holding a day: '2025-07-15', '2025-W29' or '2025-07'"""
+    if kind == 'daily':
+        return day.isoformat()
+    if kind == 'weekly':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.strftime('%Y-%m')
+
+
+def closed_period(kind: str, today: date) -> Optional[Tuple[str, str]]:
+    """
+    The period that ended just before today, if today is the first day after it
+
+    Args:
+        kind: 'daily', 'weekly' or 'monthly'
+        today: Current day
+
+    Returns:
+        Period key and the digest title, None if no period of this kind ended yesterday
+    """
+    yesterday = today - timedelta(days=1)
+    if kind == 'daily':
+        return period_key(kind, yesterday), f"Ringkasan Harian {yesterday.strftime('%d/%m/%Y')}"
+    if kind == 'weekly':
+        if today.weekday() != 0:
+            return None
+        monday = yesterday - timedelta(days=6)
+        return period_key(kind, yesterday), f"Ringkasan Mingguan {monday.strftime('%d/%m')} - {yesterday.strftime('%d/%m/%Y')}"
+    if today.day != 1:
+        return None
+    return period_key(kind, yesterday), f"Ringkasan Bulanan {MONTH_NAMES[yesterday.month - 1]} {yesterday.year}"
+
+
+def add_category(categories: Dict[str, Dict[str, int]], tipe: str, kategori: str, nominal: int):
+    """Add an amount to a category total, creating it on first use"""
+    totals = categories.setdefault(tipe, {})
+    totals[kategori] = totals.get(kategori, 0) + nominal
+
+
+class DigestAccumulator:
+    """Income, expense and latest transactions per day, week and month, updated one transaction at a time"""
+
+    def __init__(self, state: Optional[Dict] = None):
+        """
+        Initialize accumulator
+
+        Args:
+            state: Output of to_state() to continue from
+        """
+        state = state or {}
+        self.totals: Dict[str, Dict] = state.get('totals', {})
+        # Old format rows have no date and count in every month, like laporan
+        self.undated: Dict[str, int] = state.get('undated', {'pemasukan': 0, 'pengeluaran': 0})
+        self.undated_categories: Dict[str, Dict[str, int]] = state.get('undated_categories', {'pemasukan': {}, 'pengeluaran': {}})
+
+    def add(self, transaction: Dict[str, str]):
+        """Count one transaction in its day, week and month"""
+        nominal = parse_nominal(transaction.get('nominal'))
+        if nominal is None:
+            return
+        tipe = 'pemasukan' if transaction.get('tipe') == 'pemasukan' else 'pengeluaran'
+        kategori = transaction.get('kategori') or categorize(transaction.get('nama', ''), tipe)
+        entry = dict(transaction, nominal=nominal)
+
+        day = transaction_date(transaction.get('tanggal', ''))
+        if day:
+            keys = [f"{kind}:{period_key(kind, day)}" for kind in PERIODS]
+        else:
+            month = month_key(str(transaction.get('tanggal', '')))
+            if not month:
+                self.undated[tipe] += nominal
+                add_category(self.undated_categories, tipe, kategori, nominal)
+                return
+            keys = [f"monthly:{month}"]
+
+        for key in keys:
+            totals = self.totals.setdefault(key, {'pemasukan': 0, 'pengeluaran': 0, 'recent': []})
+            totals[tipe] += nominal
+            add_category(totals.setdefault('categories', {'pemasukan': {}, 'pengeluaran': {}}), tipe, kategori, nominal)
+            totals['recent'] = (totals['recent'] + [entry])[-RECENT_LIMIT:]
+
+    def summary(self, kind: str, period: str) -> Dict:
+        """
+        Totals of one period in the shape format_report_message expects
+
+        Args:
+            kind: 'daily', 'weekly' or 'monthly'
+            period: Period key from period_key()
+
+        Returns:
+            Dictionary with 'total_pemasukan', 'total_pengeluaran', 'saldo', 'categories' and 'recent'
+        """
+        totals = self.totals.get(f"{kind}:{period}", {'pemasukan': 0, 'pengeluaran': 0, 'recent': []})
+        pemasukan, pengeluaran = totals['pemasukan'], totals['pengeluaran']
+        categories = {tipe: dict(values) for tipe, values in totals.get('categories', {'pemasukan': {}, 'pengeluaran': {}}).items()}
+        if kind == 'monthly':
+            pemasukan += self.undated['pemasukan']
+            pengeluaran += self.undated['pengeluaran']
+            for tipe, values in self.undated_categories.items():
+                for kategori, nominal in values.items():
+                    add_category(categories, tipe, kategori, nominal)
+        return {
+            'total_pemasukan': pemasukan,
+            'total_pengeluaran': pengeluaran,
+            'saldo': pemasukan - pengeluaran,
+            'categories': categories,
+            'recent': list(totals['recent'])
+        }
+
+    def prune(self, before: date):
+        """Forget periods that ended before a day, they will not be sent any more"""
+        keep = {f"{kind}:{period_key(kind, before)}" for kind in PERIODS}
+        for key in list(self.totals):
+            kind, period = key.split(':', 1)
+            if key not in keep and period < period_key(kind, before):
+                del self.totals[key]
+
+    def to_state(self) -> Dict:
+        """JSON-serializable state"""
+        return {'totals': self.totals, 'undated': self.undated, 'undated_categories': self.undated_categories}
+
+
+class DigestScheduler:
+    """Sends each closed period's digest to every family member once, from a single leader process"""
+
+    def __init__(self, ledger, bot, dispatcher, recipients: Optional[List[str]] = None, periods: Optional[List[str]] = None,
+                 send_at: Optional[str] = None, state_path: Optional[str] = None, lock_path: Optional[str] = None,
+                 poll_interval: Optional[float] = None):
+        """
+        Initialize digest scheduler
+
+        Args:
+            ledger: LedgerStorage read with get_transactions_since
+            bot: WhatsAppBot used to format the digest
+            dispatcher: OutboundDispatcher used to send it
+            recipients: WhatsApp numbers, defaults to every number in FAMILY_CONFIG
+            periods: Digests to send, from 'daily', 'weekly' and 'monthly'
+            send_at: Time of day 'HH:MM' from which a closed period's digest is sent
+            state_path: JSON file holding the totals, the ledger cursor and what was sent
+            lock_path: Lock file deciding which process is the leader
+            poll_interval: Seconds between checks
+        """
+        self.ledger = ledger
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.recipients = recipients if recipients is not None else list(bot.family_members)
+        periods = periods or os.getenv('DIGEST_PERIODS', 'daily,weekly,monthly').split(',')
+        self.periods = [period.strip() for period in periods if period.strip() in PERIODS]
+        hour, minute = (send_at or os.getenv('DIGEST_SEND_AT', '07:00')).split(':')
+        self.send_at = (int(hour), int(minute))
+        self.state_path = state_path or os.getenv('DIGEST_STATE_PATH', os.path.join('data', 'digest_state.json'))
+        self.lock_path = lock_path or os.getenv('DIGEST_LOCK_PATH', os.path.join('data', 'digest.lock'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('DIGEST_POLL_INTERVAL', '60'))
+
+        for path in (self.state_path, self.lock_path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.accumulator = DigestAccumulator()
+        self.cursor: Dict[str, int] = {}
+        self.sent: Dict[str, str] = {}
+        self._lock_file = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def leader(self) -> bool:
+        """True while this process holds the lock file"""
+        return self._lock_file is not None
+
+    def acquire_leadership(self) -> bool:
+        """
+        Try to become the process that sends digests
+
+        Returns:
+            True if this process is the leader
+        """
+        if self._lock_file is not None:
+            return True
+
+        lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+
+        self._lock_file = lock_file
+        # The previous leader may have moved on since this process last looked
+        self._load_state()
+        log.info("Digest leader elected", extra={'pid': os.getpid()})
+        return True
+
+    def release_leadership(self):
+        """Give up the lock file so another process can take over"""
+        if self._lock_file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _load_state(self):
+        """Read totals, cursor and sent periods saved by the last leader"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except (OSError, ValueError) as e:
+            log.warning("Digest state unreadable, rebuilding from the ledger", extra={'error': str(e)})
+            state = {}
+        self.accumulator = DigestAccumulator(state.get('accumulator'))
+        self.cursor = state.get('cursor', {})
+        self.sent = state.get('sent', {})
+
+    def _save_state(self):
+        """Write the state atomically, a crash leaves the previous file in place"""
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'accumulator': self.accumulator.to_state(), 'cursor': self.cursor, 'sent': self.sent}, f)
+        os.replace(temporary, self.state_path)
+
+    def ingest(self, batch_size: int = 500) -> int:
+        """
+        Add the transactions recorded since the last call to the totals
+
+        Returns:
+            Number of new transactions
+        """
+        count = 0
+        while True:
+            transactions, cursor = self.ledger.get_transactions_since(self.cursor, batch_size)
+            for transaction in transactions:
+                self.accumulator.add(transaction)
+            count += len(transactions)
+            moved = cursor != self.cursor
+            self.cursor = cursor
+            if not moved or len(transactions) < batch_size:
+                return count
+
+    def due(self, now: datetime) -> List[Tuple[str, str, str]]:
+        """Digests to send now, as (kind, period, title)"""
+        if (now.hour, now.minute) < self.send_at:
+            return []
+        digests = []
+        for kind in self.periods:
+            closed = closed_period(kind, now.date())
+            if closed and self.sent.get(kind, '') < closed[0]:
+                digests.append((kind,) + closed)
+        return digests
+
+    def tick(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Bring the totals up to date and send any digest that is due, if this process is the leader
+
+        Args:
+            now: Current time, for tests
+
+        Returns:
+            Keys like 'daily:2025-07-14' of the digests sent
+        """
+        if not self.acquire_leadership():
+            return []
+
+        now = now or datetime.now()
+        self.ingest()
+
+        sent = []
+        for kind, period, title in self.due(now):
+            message = self.bot.format_report_message(self.accumulator.summary(kind, period), title=title)
+            self.dispatcher.broadcast(self.recipients, message)
+            self.sent[kind] = period
+            sent.append(f"{kind}:{period}")
+            log.info("Digest queued", extra={'digest': kind, 'period': period, 'recipients': len(self.recipients)})
+
+        # Totals are only needed until their period's digest has gone out
+        self.accumulator.prune(now.date() - timedelta(days=1))
+        # Saved before the messages go out, so a crash never sends a digest twice
+        self._save_state()
+        return sent
+
+    def start(self):
+        """Check for due digests in a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='digest', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop checking and release leadership"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(5.0)
+            self._thread = None
+        self.release_leadership()
+
+    def _run(self):
+        """Background loop"""
+        while not self._stopping.is_set():
+            try:
+                self.tick()
+            except Exception:
+                log.exception("Error sending digests")
+            self._stopping.wait(self.poll_interval)
+
+
+def main():
+    from dotenv import load_dotenv
+    from sqlite_ledger import SQLiteLedger
+    from whatsapp_bot import WhatsAppBot
+
+    arg_parser = argparse.ArgumentParser(description='Preview the family digests')
+    subcommands = arg_parser.add_subparsers(dest='command', required=True)
+    preview = subcommands.add_parser('preview', help='Print the digest for the period that ended most recently')
+    preview.add_argument('period', choices=PERIODS)
+    args = arg_parser.parse_args()
+
+    load_dotenv()
+    accumulator = DigestAccumulator()
+    cursor: Dict[str, int] = {}
+    ledger = SQLiteLedger()
+    while True:
+        transactions, cursor = ledger.get_transactions_since(cursor)
+        if not transactions:
+            break
+        for transaction in transactions:
+            accumulator.add(transaction)
+
+    # The most recent closed period, even if today isn't the first day after it
+    today = date.today()
+    while closed_period(args.period, today) is None:
+        today -= timedelta(days=1)
+    period, title = closed_period(args.period, today)
+    print(WhatsAppBot().format_report_message(accumulator.summary(args.period, period), title=title))
+
+
+if __name__ == '__main__':
+    main()
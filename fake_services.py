@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Google Sheets and Twilio APIs
+
+Both servers keep their data in memory and can add latency and errors to
+every request, so benchmarks and load tests run without touching the real
+services. Point the bot at them with:
+
+    GOOGLE_SHEETS_API_ENDPOINT=http://127.0.0.1:<sheets port>
+    TWILIO_API_BASE_URL=http://127.0.0.1:<twilio port>
+
+Usage:
+    python fake_services.py --sheets-port 8081 --twilio-port 8082 --latency 0.08
+"""
+
+import argparse
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+A1_PATTERN = re.compile(r"^([A-Z]+)?(\d+)?(?::([A-Z]+)?(\d+)?)?$")
+
+
+def column_index(letters: str) -> int:
+    """Convert column letters like 'A' or 'AB' to a zero-based index"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def column_letters(index: int) -> str:
+    """Convert a zero-based column index to letters"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def split_range(a1_range: str, default_sheet: str) -> Tuple[str, str]:
+    """Split 'Sheet1!A1:E' into the sheet name and the cell part"""
+    if '!' not in a1_range:
+        return default_sheet, a1_range
+    sheet, cells = a1_range.rsplit('!', 1)
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet, cells
+
+
+class FakeServer(ABC):
+    """Threaded HTTP server with configurable latency and error rate"""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        """
+        Initialize fake server
+
+        Args:
+            port: Port to listen on, 0 picks a free one
+            latency: Seconds added to every response
+            jitter: Random extra seconds, up to this much, added to the latency
+            error_rate: Fraction of requests answered with 429 Too Many Requests
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes, don't let Nagle delay the body
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def do_PUT(self):
+                server._handle(self, 'PUT')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeServer':
+        """Serve requests in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        """Apply latency and errors, then dispatch to route()"""
+        with self.lock:
+            self.request_count += 1
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+
+        if self.error_rate and random.random() < self.error_rate:
+            status, payload = 429, {'error': {'code': 429, 'message': 'Rate limit exceeded (simulated)', 'status': 'RESOURCE_EXHAUSTED'}}
+        else:
+            try:
+                status, payload = self.route(method, handler.path, body, handler.headers.get('Content-Type', ''))
+            except Exception as e:
+                status, payload = 400, {'error': {'code': 400, 'message': str(e), 'status': 'INVALID_ARGUMENT'}}
+
+        data = json.dumps(payload).encode('utf-8')
+        with self.lock:
+            self.bytes_sent += len(data)
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json; charset=UTF-8')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    @abstractmethod
+    def route(self, method: str, path: str, body: bytes, content_type: str) -> Tuple[int, Dict]:
+        """Answer one request, returning the status code and JSON payload"""
+
+
+class FakeSheetsServer(FakeServer):
+    """In-memory Google Sheets API v4 covering the calls the bot makes"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sheets: Dict[str, List[List[str]]] = {'Sheet1': []}
+        self.sheet_ids: Dict[str, int] = {'Sheet1': 0}
+
+    def _rows(self, sheet: str) -> List[List[str]]:
+        if sheet not in self.sheets:
+            raise ValueError(f"Unable to parse range: {sheet}")
+        return self.sheets[sheet]
+
+    def _bounds(self, sheet: str, cells: str) -> Tuple[int, int, int, Optional[int]]:
+        """Zero-based first row, first column, last column and exclusive end row of an A1 range"""
+        match = A1_PATTERN.match(cells)
+        if not match:
+            raise ValueError(f"Unable to parse range: {sheet}!{cells}")
+        start_col, start_row, end_col, end_row = match.groups()
+        first_col = column_index(start_col) if start_col else 0
+        last_col = column_index(end_col) if end_col else (first_col if start_col and ':' not in cells else 25)
+        first_row = int(start_row) - 1 if start_row else 0
+        if end_row:
+            stop_row = int(end_row)
+        elif start_row and ':' not in cells:
+            stop_row = first_row + 1
+        else:
+            stop_row = None
+        return first_row, first_col, last_col, stop_row
+
+    def read_range(self, a1_range: str) -> Dict:
+        """Values of a range, trailing empty rows removed like the real API"""
+        sheet, cells = split_range(a1_range, 'Sheet1')
+        rows = self._rows(sheet)
+        first_row, first_col, last_col, stop_row = self._bounds(sheet, cells)
+
+        with self.lock:
+            selected = rows[first_row:stop_row]
+            values = [[str(cell) for cell in row[first_col:last_col + 1]] for row in selected]
+        while values and not values[-1]:
+            values.pop()
+
+        result = {'range': a1_range, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def append(self, a1_range: str, values: List[List]) -> Dict:
+        """Append rows after the last non-empty row"""
+        sheet, _ = split_range(a1_range, 'Sheet1')
+        rows = self._rows(sheet)
+        with self.lock:
+            while rows and not rows[-1]:
+                rows.pop()
+            start = len(rows) + 1
+            rows.extend([list(row) for row in values])
+            end = len(rows)
+        width = max((len(row) for row in values), default=1)
+        updated_range = f"{sheet}!A{start}:{column_letters(width - 1)}{end}"
+        return {'updates': {'updatedRange': updated_range, 'updatedRows': len(values)}}
+
+    def update(self, a1_range: str, values: List[List]) -> Dict:
+        """Overwrite cells starting at the top-left corner of the range"""
+        sheet, cells = split_range(a1_range, 'Sheet1')
+        rows = self._rows(sheet)
+        first_row, first_col, _, _ = self._bounds(sheet, cells)
+        with self.lock:
+            for offset, row_values in enumerate(values):
+                index = first_row + offset
+                while len(rows) <= index:
+                    rows.append([])
+                row = rows[index]
+                while len(row) < first_col + len(row_values):
+                    row.append('')
+                row[first_col:first_col + len(row_values)] = row_values
+        return {'updatedRange': a1_range, 'updatedRows': len(values)}
+
+    def batch_update(self, requests: List[Dict]) -> Dict:
+        """Apply addSheet, updateCells and appendCells requests, all or nothing"""
+        with self.lock:
+            # Check every request before changing anything
+            titles = {sheet_id: title for title, sheet_id in self.sheet_ids.items()}
+            added = {}
+            for index, request in enumerate(requests):
+                if 'addSheet' in request:
+                    properties = request['addSheet']['properties']
+                    title = properties['title']
+                    sheet_id = properties.get('sheetId', max(titles, default=-1) + 1)
+                    if title in self.sheets or title in added:
+                        raise ValueError(f'Invalid requests[{index}].addSheet: A sheet with the name "{title}" already exists. Please enter another name.')
+                    if sheet_id in titles:
+                        raise ValueError(f"Invalid requests[{index}].addSheet: Sheet with id {sheet_id} already exists.")
+                    titles[sheet_id] = title
+                    added[title] = sheet_id
+                elif 'updateCells' in request or 'appendCells' in request:
+                    spec = request.get('updateCells') or request.get('appendCells')
+                    sheet_id = spec['start']['sheetId'] if 'start' in spec else spec['sheetId']
+                    if sheet_id not in titles:
+                        raise ValueError(f"Invalid requests[{index}]: No grid with id: {sheet_id}")
+
+            replies = []
+            for request in requests:
+                if 'addSheet' in request:
+                    title = request['addSheet']['properties']['title']
+                    self.sheets[title] = []
+                    self.sheet_ids[title] = added[title]
+                    replies.append({'addSheet': {'properties': {'sheetId': added[title], 'title': title}}})
+                    continue
+
+                spec = request.get('updateCells') or request.get('appendCells')
+                if spec:
+                    rows = self.sheets[titles[spec['start']['sheetId'] if 'start' in spec else spec['sheetId']]]
+                    values = [[next(iter(cell['userEnteredValue'].values())) for cell in row.get('values', [])] for row in spec.get('rows', [])]
+                    if 'start' in spec:
+                        first_row = spec['start'].get('rowIndex', 0)
+                    else:
+                        while rows and not rows[-1]:
+                            rows.pop()
+                        first_row = len(rows)
+                    for offset, row_values in enumerate(values):
+                        while len(rows) <= first_row + offset:
+                            rows.append([])
+                        row = rows[first_row + offset]
+                        row[:len(row_values)] = row_values
+                replies.append({})
+        return {'replies': replies}
+
+    def route(self, method: str, path: str, body: bytes, content_type: str) -> Tuple[int, Dict]:
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        payload = json.loads(body) if body else {}
+        segments = parts.path.strip('/').split('/')
+
+        # v4/spreadsheets/{id}[:batchUpdate]
+        if len(segments) == 3 and segments[1] == 'spreadsheets':
+            if method == 'POST' and segments[2].endswith(':batchUpdate'):
+                return 200, self.batch_update(payload.get('requests', []))
+            with self.lock:
+                sheet_ids = dict(self.sheet_ids)
+            return 200, {'sheets': [{'properties': {'sheetId': sheet_id, 'title': title}} for title, sheet_id in sheet_ids.items()]}
+
+        # v4/spreadsheets/{id}/values:batchGet
+        if len(segments) == 4 and segments[3] == 'values:batchGet':
+            return 200, {'valueRanges': [self.read_range(a1_range) for a1_range in query.get('ranges', [])]}
+
+        # v4/spreadsheets/{id}/values:batchUpdate
+        if len(segments) == 4 and segments[3] == 'values:batchUpdate' and method == 'POST':
+            updates = [self.update(data['range'], data.get('values', [])) for data in payload.get('data', [])]
+            return 200, {'totalUpdatedRows': sum(update['updatedRows'] for update in updates)}
+
+        # v4/spreadsheets/{id}/values/{range}[:append]
+        if len(segments) == 5 and segments[3] == 'values':
+            encoded_range, _, verb = segments[4].partition(':')
+            a1_range = unquote(encoded_range)
+            if method == 'POST' and verb == 'append':
+                return 200, self.append(a1_range, payload.get('values', []))
+            if method == 'PUT':
+                return 200, self.update(a1_range, payload.get('values', []))
+            return 200, self.read_range(a1_range)
+
+        return 404, {'error': {'code': 404, 'message': f"Unknown path {parts.path}", 'status': 'NOT_FOUND'}}
+
+
+class FakeTwilioServer(FakeServer):
+    """In-memory Twilio Messages API that records every message sent"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages: List[Dict[str, str]] = []
+        # Statuses to answer the next messages to a number with, e.g. {'whatsapp:+62...': [429, 503]}
+        self.failures: Dict[str, List[int]] = {}
+
+    def fail(self, to_number: str, *statuses: int):
+        """Answer the next messages to a number with these error statuses, in order"""
+        with self.lock:
+            self.failures.setdefault(to_number, []).extend(statuses)
+
+    def route(self, method: str, path: str, body: bytes, content_type: str) -> Tuple[int, Dict]:
+        parts = urlsplit(path)
+        match = re.match(r'^/2010-04-01/Accounts/([^/]+)/Messages\.json$', parts.path)
+        if not match or method != 'POST':
+            return 404, {'code': 20404, 'message': f"Unknown path {parts.path}", 'status': 404}
+
+        form = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+        with self.lock:
+            pending = self.failures.get(form.get('To'))
+            status = pending.pop(0) if pending else None
+        if status:
+            return status, {'code': 20429 if status == 429 else 20500, 'message': f"Simulated {status}", 'status': status}
+
+        message = {
+            'sid': f"SM{uuid.uuid4().hex}",
+            'account_sid': match.group(1),
+            'from': form.get('From'),
+            'to': form.get('To'),
+            'body': form.get('Body'),
+            'status': 'queued',
+            'num_segments': '1'
+        }
+        with self.lock:
+            self.messages.append(message)
+        return 201, message
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run local Google Sheets and Twilio stand-ins')
+    arg_parser.add_argument('--sheets-port', type=int, default=8081)
+    arg_parser.add_argument('--twilio-port', type=int, default=8082)
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds per response')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    args = arg_parser.parse_args()
+
+    options = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate}
+    sheets = FakeSheetsServer(args.sheets_port, **options).start()
+    twilio = FakeTwilioServer(args.twilio_port, **options).start()
+
+    print(f"[INFO] Fake Google Sheets API: GOOGLE_SHEETS_API_ENDPOINT={sheets.url}")
+    print(f"[INFO] Fake Twilio API: TWILIO_API_BASE_URL={twilio.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sheets.stop()
+        twilio.stop()
+
+
+if __name__ == '__main__':
+    main()
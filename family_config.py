@@ -32,9 +32,24 @@ FAMILY_CONFIG = {
     'error_emoji': '[ERROR]',
     'currency_symbol': 'Rp',
     
-    # Transaction categories (optional for future features)
+    # Transaction categories, each transaction is tagged with one from its name
     'expense_categories': ['makan', 'transport', 'belanja', 'tagihan', 'hiburan', 'kesehatan'],
-    'income_categories': ['gaji', 'bonus', 'freelance', 'bisnis', 'hadiah']
+    'income_categories': ['gaji', 'bonus', 'freelance', 'bisnis', 'hadiah'],
+    
+    # Other words that mean a category, add your own (whole words, lowercase)
+    'category_aliases': {
+        'makan': ['makanan', 'minum', 'sarapan', 'jajan', 'kopi', 'nasi', 'bakso', 'snack', 'restoran', 'gofood', 'grabfood'],
+        'transport': ['bensin', 'parkir', 'tol', 'ojek', 'ojol', 'gojek', 'grab', 'taksi', 'kereta', 'krl', 'busway', 'tiket pesawat'],
+        'belanja': ['sayur', 'buah', 'beras', 'sabun', 'baju', 'sepatu', 'supermarket', 'indomaret', 'alfamart', 'shopee', 'tokopedia'],
+        'tagihan': ['listrik', 'pln', 'air', 'pdam', 'internet', 'wifi', 'pulsa', 'kuota', 'bpjs', 'cicilan', 'kontrakan', 'sewa', 'iuran'],
+        'hiburan': ['nonton', 'bioskop', 'netflix', 'spotify', 'game', 'liburan', 'jalan jalan', 'karaoke'],
+        'kesehatan': ['obat', 'dokter', 'apotek', 'rumah sakit', 'klinik', 'vitamin', 'periksa'],
+        'gaji': ['gajian', 'thr', 'upah'],
+        'bonus': ['insentif', 'komisi'],
+        'freelance': ['proyek', 'project', 'honor', 'fee'],
+        'bisnis': ['jualan', 'dagang', 'usaha', 'toko', 'omzet'],
+        'hadiah': ['kado', 'angpao', 'arisan', 'hibah']
+    }
 }
 
 def get_family_member(phone_number: str) -> str:
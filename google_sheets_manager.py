@@ -1,23 +1,158 @@
+import json
 import os
-from typing import List, Dict, Optional
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import re
+import threading
+import zlib
+from typing import Callable, List, Dict, Optional, Set, Tuple
 from googleapiclient.errors import HttpError
+from api_scheduler import get_scheduler
+from categories import OTHER
+from ledger_cache import (
+    HEADER_ROWS, UNDATED, AggregateIndex, LedgerCache, RowIndex, month_key, parse_nominal,
+    recent_valid_transactions, row_to_transaction, transaction_to_row
+)
+from sheets_client import get_sheets_client
+from storage import LedgerStorage
+from structured_logging import get_logger
 
-class GoogleSheetsManager:
+SHEET_HEADERS = ['Tanggal', 'Member', 'Nama', 'Tipe', 'Nominal', 'Kategori']
+
+log = get_logger('sheets')
+
+# One row per month when transactions are partitioned into monthly tabs. The
+# "Lama" columns hold the part of the totals that stayed in the original sheet.
+SUMMARY_HEADERS = [
+    'Bulan', 'Pemasukan', 'Pengeluaran', 'Saldo', 'Transaksi',
+    'Pemasukan Lama', 'Pengeluaran Lama', 'Transaksi Lama'
+]
+# Summary row of old format rows without a date, which count in every month
+UNDATED_LABEL = 'Tanpa Tanggal'
+
+PARTITION_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+# Formula rows computed by Google Sheets, keyed by month and member
+FORMULA_SUMMARY_HEADERS = ['Bulan', 'Member', 'Pemasukan', 'Pengeluaran']
+# Bulan or Member value meaning every month or every member
+ALL = 'Semua'
+
+
+def sheet_range(sheet_name: str, cells: str) -> str:
+    """A1 range with the sheet name quoted, required for names like '2026-10'"""
+    escaped = sheet_name.replace("'", "''")
+    return f"'{escaped}'!{cells}"
+
+
+def cell_data(value) -> Dict:
+    """Cell value for batchUpdate requests"""
+    if isinstance(value, int):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def add_sheet_requests(title: str, rows: List[List]) -> List[Dict]:
+    """
+    batchUpdate requests creating a tab already holding its first rows
+
+    Creating the tab and writing its headers in one atomic call means no other
+    worker can append to the tab before the header row is in place.
+
+    Args:
+        title: Tab name
+        rows: Header row followed by any initial rows
+
+    Returns:
+        Requests for spreadsheets.batchUpdate
+    """
+    # Derive the id from the title so the header write can refer to it
+    sheet_id = zlib.crc32(title.encode('utf-8')) & 0x7FFFFFFF
+    return [
+        {'addSheet': {'properties': {'sheetId': sheet_id, 'title': title, 'gridProperties': {'frozenRowCount': 1}}}},
+        {'updateCells': {
+            'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+            'rows': [{'values': [cell_data(value) for value in row]} for row in rows],
+            'fields': 'userEnteredValue'
+        }}
+    ]
+
+
+def summary_formula(sheet_name: str, tipe: str, month: Optional[str] = None, member: Optional[str] = None) -> str:
+    """
+    Formula totalling the ledger the same way AggregateIndex does
+
+    Nominal cells hold text, which SUMIFS skips, so each row is converted with
+    VALUE inside SUMPRODUCT instead. Old format rows without a date count in
+    every month and belong to member 'Unknown'.
+
+    Args:
+        sheet_name: Ledger tab
+        tipe: 'pemasukan', anything else totals expenses
+        month: Month in 'YYYY-MM' format, all time if None
+        member: Family member display name, all members if None
+
+    Returns:
+        Formula for a USER_ENTERED write
+    """
+    def column(letter: str) -> str:
+        return sheet_range(sheet_name, f'{letter}{HEADER_ROWS + 1}:{letter}')
+
+    operator = '=' if tipe == 'pemasukan' else '<>'
+    conditions = [f'({column("E")}<>"")', f'({column("D")}{operator}"pemasukan")']
+    if month:
+        conditions.append(f'(IFERROR(REGEXEXTRACT({column("A")},"\\d{{4}}-\\d{{2}}"),"")="{month}")')
+    if member:
+        escaped = member.replace('"', '""')
+        conditions.append(f'({column("B")}="{escaped}")')
+    terms = [f'SUMPRODUCT({"*".join(conditions)}*IFERROR(VALUE({column("E")}),0))']
+
+    if member in (None, 'Unknown'):
+        terms.append(f'SUMPRODUCT(({column("E")}="")*({column("B")}{operator}"pemasukan")*IFERROR(VALUE({column("C")}),0))')
+    return f'=ARRAYFORMULA({"+".join(terms)})'
+
+
+def summary_int(row: List, column: int) -> int:
+    """Numeric summary cell, 0 if it is missing or not a number"""
+    return (parse_nominal(row[column]) if column < len(row) else None) or 0
+
+class GoogleSheetsManager(LedgerStorage):
     """Manage Google Sheets operations for finance tracking"""
     
-    def __init__(self, credentials_file: str = 'credentials.json'):
+    def __init__(self, credentials_file: str = 'credentials.json', sheet_id: Optional[str] = None, sheet_name: Optional[str] = None):
         """
         Initialize Google Sheets manager
         
         Args:
             credentials_file: Path to Google service account credentials JSON file
+            sheet_id: Spreadsheet ID, defaults to GOOGLE_SHEET_ID
+            sheet_name: Ledger tab, defaults to GOOGLE_SHEET_NAME
         """
         self.credentials_file = credentials_file
-        self.sheet_id = os.getenv('GOOGLE_SHEET_ID')
-        self.sheet_name = os.getenv('GOOGLE_SHEET_NAME', 'Sheet1')
+        self.sheet_id = sheet_id or os.getenv('GOOGLE_SHEET_ID')
+        self.sheet_name = sheet_name or os.getenv('GOOGLE_SHEET_NAME', 'Sheet1')
         self.service = None
+        self.spreadsheets = None
+        self.values = None
+        self.scheduler = None
+        
+        # Local copy of the ledger so reads don't fetch the whole sheet
+        self.cache_enabled = os.getenv('LEDGER_CACHE_ENABLED', 'true').lower() == 'true'
+        self.cache = LedgerCache()
+        # Where each month's rows are, so queries can read just those rows
+        self.row_index = RowIndex()
+        # Called by invalidate_cache, e.g. to drop an index built from the old rows
+        self.on_invalidate: List[Callable[[], None]] = []
+        
+        # Monthly tabs instead of one ever-growing sheet, off unless configured
+        self.partitioning = os.getenv('SHEET_PARTITIONING', 'off').lower() == 'monthly'
+        self.summary_sheet_name = os.getenv('SHEET_SUMMARY_NAME', 'Ringkasan')
+        self.partition_lock = threading.Lock()
+        self._sheet_ids: Optional[Dict[str, int]] = None
+        self._summary_months: Optional[Set[str]] = None
+        
+        # Totals computed by formulas in the spreadsheet, so reads fetch a few cells
+        self.formula_summary = os.getenv('SHEET_FORMULA_SUMMARY', 'false').lower() == 'true' and not self.partitioning
+        self.formula_sheet_name = os.getenv('SHEET_FORMULA_SUMMARY_NAME', 'Rekap')
+        self._formula_ready = False
+        self._formula_repaired: Set[Tuple[str, str]] = set()
         
         if not self.sheet_id:
             raise ValueError("GOOGLE_SHEET_ID environment variable is required")
@@ -27,77 +162,368 @@ class GoogleSheetsManager:
     def _authenticate(self):
         """Authenticate with Google Sheets API"""
         try:
-            # Define the scope
-            scopes = ['https://www.googleapis.com/auth/spreadsheets']
-            
-            # Try to load credentials from environment variable first (for production)
-            credentials_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-            
-            if credentials_json:
-                # Production: load from environment variable
-                import json
-                import base64
-                
-                # Decode base64 credentials
-                decoded_credentials = base64.b64decode(credentials_json).decode('utf-8')
-                credentials_info = json.loads(decoded_credentials)
-                
-                credentials = Credentials.from_service_account_info(
-                    credentials_info, scopes=scopes
-                )
-            elif os.path.exists(self.credentials_file):
-                # Local development: load from file
-                credentials = Credentials.from_service_account_file(
-                    self.credentials_file, scopes=scopes
-                )
-            else:
-                # No credentials available
-                raise Exception("No Google credentials found. Set GOOGLE_APPLICATION_CREDENTIALS_JSON environment variable or provide credentials.json file")
-            
-            # Build the service
-            self.service = build('sheets', 'v4', credentials=credentials)
+            # The client is shared by every manager and thread in this process
+            client = get_sheets_client(self.credentials_file)
+            self.service = client.service
+            self.spreadsheets = client.spreadsheets
+            self.values = client.values
+            self.scheduler = get_scheduler()
             
         except Exception as e:
             raise Exception(f"Failed to authenticate with Google Sheets: {str(e)}")
     
-    def setup_sheet_headers(self) -> bool:
+    def _execute(self, request, operation: str = 'read'):
+        """
+        Run an API request through the shared scheduler, which handles quota, retries and coalescing
+        
+        Args:
+            request: Request built from self.values or self.spreadsheets
+            operation: 'read' or 'write'
+            
+        Returns:
+            The API response
+        """
+        return self.scheduler.execute(request, operation)
+    
+    def setup_sheet_headers(self, sheet_name: Optional[str] = None, expected_headers: Optional[List[str]] = None) -> bool:
         """
         Setup the sheet with proper headers if they don't exist
         
+        Args:
+            sheet_name: Tab to set up, defaults to the main sheet and, when
+                partitioning is enabled, every monthly tab and the summary tab
+            expected_headers: Header row, defaults to the ledger headers
+            
         Returns:
             True if headers were set up successfully, False otherwise
         """
+        tab = sheet_name or self.sheet_name
+        # Updated headers to include family member and timestamp
+        expected_headers = expected_headers or SHEET_HEADERS
+        header_range = sheet_range(tab, f'A1:{chr(64 + len(expected_headers))}1')
+        
         try:
             # Check if headers already exist
-            result = self.service.spreadsheets().values().get(
+            result = self._execute(self.values.get(
                 spreadsheetId=self.sheet_id,
-                range=f'{self.sheet_name}!A1:E1'
-            ).execute()
+                range=header_range
+            ))
             
             values = result.get('values', [])
             
-            # Updated headers to include family member and timestamp
-            expected_headers = ['Tanggal', 'Member', 'Nama', 'Tipe', 'Nominal']
-            
             # If no headers or incorrect headers, set them up
             if not values or values[0] != expected_headers:
                 headers = [expected_headers]
                 
-                self.service.spreadsheets().values().update(
+                self._execute(self.values.update(
                     spreadsheetId=self.sheet_id,
-                    range=f'{self.sheet_name}!A1:E1',
+                    range=header_range,
                     valueInputOption='RAW',
                     body={'values': headers}
-                ).execute()
+                ), 'write')
                 
-                print("Headers set up successfully with family member tracking")
+                print(f"Headers set up successfully with family member tracking ({tab})")
             
+        except HttpError as e:
+            print(f"Error setting up headers: {str(e)}")
+            return False
+        
+        if sheet_name is None and self.partitioning:
+            return self.setup_partitions()
+        if sheet_name is None and self.formula_summary:
+            return self.setup_formula_summary()
+        return True
+    
+    def _sheet_id_map(self, refresh: bool = False) -> Dict[str, int]:
+        """
+        Tab titles and ids, read once and then kept up to date locally
+        
+        Args:
+            refresh: Re-read them, e.g. to pick up tabs created by another process
+        """
+        if self._sheet_ids is None or refresh:
+            result = self._execute(self.spreadsheets.get(
+                spreadsheetId=self.sheet_id,
+                fields='sheets.properties(sheetId,title)'
+            ))
+            self._sheet_ids = {
+                sheet['properties']['title']: sheet['properties'].get('sheetId', 0)
+                for sheet in result.get('sheets', [])
+            }
+        return self._sheet_ids
+    
+    def partition_names(self, refresh: bool = False) -> List[str]:
+        """Monthly tabs in the spreadsheet, oldest first"""
+        return sorted(title for title in self._sheet_id_map(refresh) if PARTITION_PATTERN.match(title))
+    
+    def _has_partition(self, month: str) -> bool:
+        """Whether a month has its tab, re-reading the tab list when it isn't known yet"""
+        return month in self._sheet_id_map() or month in self._sheet_id_map(refresh=True)
+    
+    def _summary_month_set(self) -> Set[str]:
+        """Months that have a row in the summary tab"""
+        if self._summary_months is None:
+            result = self._execute(self.values.get(
+                spreadsheetId=self.sheet_id,
+                range=sheet_range(self.summary_sheet_name, 'A2:A')
+            ))
+            self._summary_months = {row[0] for row in result.get('values', []) if row}
+        return self._summary_months
+    
+    def setup_partitions(self) -> bool:
+        """
+        Create the summary tab and check the headers of every monthly tab
+        
+        The first time, the summary tab is filled with the totals of the rows
+        already in the main sheet, which stay where they are.
+        
+        Returns:
+            True if the tabs are set up, False otherwise
+        """
+        try:
+            with self.partition_lock:
+                self._sheet_ids = None
+                if self.summary_sheet_name not in self._sheet_id_map():
+                    self._create_summary_sheet()
+            
+            if not self.setup_sheet_headers(self.summary_sheet_name, SUMMARY_HEADERS):
+                return False
+            for partition in self.partition_names():
+                if not self.setup_sheet_headers(partition):
+                    return False
             return True
             
         except HttpError as e:
-            print(f"Error setting up headers: {str(e)}")
+            print(f"[ERROR] Error setting up monthly partitions: {str(e)}")
             return False
     
+    def _create_summary_sheet(self):
+        """Create the summary tab with the legacy totals of the main sheet, caller holds partition_lock"""
+        index = AggregateIndex.from_rows(self._read_base_rows())
+        months = sorted({month for month, _ in index.month_totals} | set(index.month_counts))
+        
+        rows = [SUMMARY_HEADERS]
+        for month in months:
+            pemasukan = index.month_totals.get((month, 'pemasukan'), 0)
+            pengeluaran = index.month_totals.get((month, 'pengeluaran'), 0)
+            count = index.month_counts.get(month, 0)
+            label = month if month != UNDATED else UNDATED_LABEL
+            rows.append([label, pemasukan, pengeluaran, pemasukan - pengeluaran, count, pemasukan, pengeluaran, count])
+        
+        try:
+            self._execute(self.spreadsheets.batchUpdate(
+                spreadsheetId=self.sheet_id,
+                body={'requests': add_sheet_requests(self.summary_sheet_name, rows)}
+            ), 'write')
+            self._summary_months = {row[0] for row in rows[1:]}
+            print(f"[INFO] Created summary sheet '{self.summary_sheet_name}' with {len(rows) - 1} months from {self.sheet_name}")
+        except HttpError as e:
+            # Another worker created it first
+            if 'already exists' not in str(e):
+                raise
+            self._summary_months = None
+        self._sheet_ids = None
+    
+    def setup_formula_summary(self) -> bool:
+        """
+        Create the formula summary tab if it doesn't exist yet
+        
+        Returns:
+            True if the tab is in place, False otherwise
+        """
+        try:
+            if self.formula_sheet_name not in self._sheet_id_map(refresh=True):
+                try:
+                    self._execute(self.spreadsheets.batchUpdate(
+                        spreadsheetId=self.sheet_id,
+                        body={'requests': add_sheet_requests(self.formula_sheet_name, [FORMULA_SUMMARY_HEADERS])}
+                    ), 'write')
+                    print(f"[INFO] Created formula summary sheet '{self.formula_sheet_name}'")
+                except HttpError as e:
+                    # Another worker created it first
+                    if 'already exists' not in str(e):
+                        raise
+            
+            self._formula_ready = self.setup_sheet_headers(self.formula_sheet_name, FORMULA_SUMMARY_HEADERS)
+            return self._formula_ready
+            
+        except HttpError as e:
+            print(f"[ERROR] Error setting up formula summary: {str(e)}")
+            return False
+    
+    def _formula_row(self, month: str, member: str) -> List[str]:
+        """Summary row for a month and member, ALL meaning every one"""
+        return [
+            month,
+            member,
+            summary_formula(self.sheet_name, 'pemasukan', None if month == ALL else month, None if member == ALL else member),
+            summary_formula(self.sheet_name, 'pengeluaran', None if month == ALL else month, None if member == ALL else member)
+        ]
+    
+    def _read_formula_totals(self, keys: List[Tuple[str, str]], extra_ranges: Optional[List[str]] = None) -> Tuple[Optional[Dict[Tuple[str, str], Tuple[int, int]]], List]:
+        """
+        Read income and expense totals computed by the formula summary tab
+        
+        Missing rows are added and broken ones rewritten for the next call,
+        while this call returns None so the caller totals the rows itself.
+        
+        Args:
+            keys: (month, member) pairs, ALL meaning every month or member
+            extra_ranges: Other ranges to fetch in the same batchGet
+            
+        Returns:
+            Totals by key, or None when any of them is unavailable, and the
+            values of the extra ranges
+        """
+        extra_ranges = extra_ranges or []
+        if not self._formula_ready and not self.setup_formula_summary():
+            return None, self._batch_get(extra_ranges)
+        
+        try:
+            # Unformatted so totals arrive as numbers however the cells are formatted
+            results = self._batch_get(
+                [sheet_range(self.formula_sheet_name, 'A2:D')] + extra_ranges,
+                valueRenderOption='UNFORMATTED_VALUE',
+                dateTimeRenderOption='FORMATTED_STRING'
+            )
+        except HttpError as e:
+            log.warning("Formula summary unavailable, totalling locally", extra={'error': str(e)})
+            self._formula_ready = False
+            return None, self._batch_get(extra_ranges)
+        
+        rows = {}
+        for number, row in enumerate(results[0], start=HEADER_ROWS + 1):
+            if len(row) >= 2:
+                rows.setdefault((str(row[0]), str(row[1])), (number, row))
+        
+        totals = {}
+        missing = []
+        broken = False
+        for key in keys:
+            if key not in rows:
+                missing.append(key)
+                continue
+            number, row = rows[key]
+            pemasukan = parse_nominal(row[2]) if len(row) > 2 else None
+            pengeluaran = parse_nominal(row[3]) if len(row) > 3 else None
+            if pemasukan is None or pengeluaran is None:
+                # An error like #REF! after the ledger was edited, or a cell overwritten by hand
+                log.warning("Formula summary row is broken, totalling locally", extra={'row': number, 'month': key[0], 'member': key[1]})
+                self._repair_formula_row(number, key)
+                broken = True
+                continue
+            totals[key] = (pemasukan, pengeluaran)
+        
+        if missing:
+            self._execute(self.values.append(
+                spreadsheetId=self.sheet_id,
+                range=sheet_range(self.formula_sheet_name, 'A:D'),
+                valueInputOption='USER_ENTERED',
+                body={'values': [self._formula_row(*key) for key in missing]}
+            ), 'write')
+        
+        if missing or broken:
+            return None, results[1:]
+        return totals, results[1:]
+    
+    def _repair_formula_row(self, number: int, key: Tuple[str, str]):
+        """Rewrite the formulas of a broken summary row, once per process"""
+        if key in self._formula_repaired:
+            return
+        self._formula_repaired.add(key)
+        self._execute(self.values.update(
+            spreadsheetId=self.sheet_id,
+            range=sheet_range(self.formula_sheet_name, f'A{number}:D{number}'),
+            valueInputOption='USER_ENTERED',
+            body={'values': [self._formula_row(*key)]}
+        ), 'write')
+    
+    def _ensure_partition(self, month: str):
+        """
+        Create the monthly tab on the first write of a month
+        
+        The tab, its headers and its summary row are added in one atomic
+        batchUpdate, so concurrent workers can't end up with a headerless tab
+        or two summary rows for the same month.
+        
+        Args:
+            month: Month in 'YYYY-MM' format
+        """
+        with self.partition_lock:
+            sheet_ids = self._sheet_id_map()
+            if month in sheet_ids:
+                return
+            
+            if self.summary_sheet_name not in sheet_ids:
+                self._create_summary_sheet()
+                sheet_ids = self._sheet_id_map()
+            
+            requests = add_sheet_requests(month, [SHEET_HEADERS])
+            summary_months = self._summary_month_set()
+            if month not in summary_months:
+                requests.append({'appendCells': {
+                    'sheetId': sheet_ids[self.summary_sheet_name],
+                    'rows': [{'values': [cell_data(value) for value in [month, 0, 0, 0, 0, 0, 0, 0]]}],
+                    'fields': 'userEnteredValue'
+                }})
+            
+            try:
+                self._execute(self.spreadsheets.batchUpdate(
+                    spreadsheetId=self.sheet_id,
+                    body={'requests': requests}
+                ), 'write')
+                sheet_ids[month] = requests[0]['addSheet']['properties']['sheetId']
+                summary_months.add(month)
+                print(f"[INFO] Created monthly sheet {month}")
+            except HttpError as e:
+                # Another worker created the tab, and its summary row, first
+                if 'already exists' not in str(e):
+                    raise
+                self._sheet_ids = None
+                self._summary_months = None
+    
+    def ensure_sheet_headers(self, marker_path: Optional[str] = None) -> bool:
+        """
+        Set up the headers unless a marker file says this sheet was already checked
+        
+        Args:
+            marker_path: File recording the last successful header check
+            
+        Returns:
+            True if the headers are known to be in place, False otherwise
+        """
+        marker_path = marker_path or os.getenv('SHEET_HEADERS_MARKER', os.path.join('data', 'sheet_headers.json'))
+        marker = {
+            'sheet_id': self.sheet_id,
+            'sheet_name': self.sheet_name,
+            'headers': SHEET_HEADERS,
+            'partitioning': self.summary_sheet_name if self.partitioning else None,
+            'formula_summary': self.formula_sheet_name if self.formula_summary else None
+        }
+        
+        try:
+            with open(marker_path, encoding='utf-8') as f:
+                if json.load(f) == marker:
+                    return True
+        except (OSError, ValueError):
+            pass
+        
+        if not self.setup_sheet_headers():
+            return False
+        
+        try:
+            directory = os.path.dirname(marker_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{marker_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(marker, f)
+            os.replace(temp_path, marker_path)
+        except OSError as e:
+            print(f"[WARNING] Could not save header check marker: {str(e)}")
+        
+        return True
+    
     def add_transaction(self, transaction: Dict[str, str]) -> bool:
         """
         Add a transaction to the Google Sheet
@@ -108,39 +534,457 @@ class GoogleSheetsManager:
         Returns:
             True if transaction was added successfully, False otherwise
         """
-        try:
-            from datetime import datetime
+        row = transaction_to_row(transaction)
+        if not self.append_rows([row]):
+            return False
+        
+        log.info("Transaction added", extra={'member': transaction.get('member', 'Unknown'), 'tipe': transaction['tipe'], 'tanggal': row[0]})
+        return True
+    
+    def add_transactions(self, transactions: List[Dict[str, str]]) -> bool:
+        """
+        Add several transactions to the Google Sheet in one append call
+        
+        Args:
+            transactions: Transaction dictionaries as accepted by add_transaction
             
-            # Use custom date if provided, otherwise use current timestamp
-            if 'tanggal' in transaction and transaction['tanggal']:
-                transaction_date = transaction['tanggal']
-            else:
-                transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Prepare the data with timestamp and family member
-            transaction_data = [[
-                transaction_date,
-                transaction.get('member', 'Unknown'),
-                transaction['nama'],
-                transaction['tipe'],
-                transaction['nominal']
-            ]]
-            
-            # Add the transaction using append (easier than finding next row)
-            self.service.spreadsheets().values().append(
+        Returns:
+            True if all transactions were added successfully, False otherwise
+        """
+        rows = [transaction_to_row(transaction) for transaction in transactions]
+        if not self.append_rows(rows):
+            return False
+        
+        log.info("Transactions added", extra={'count': len(rows)})
+        return True
+    
+    def append_rows(self, rows: List[List[str]]) -> bool:
+        """
+        Append several ledger rows in a single API call
+        
+        Args:
+            rows: Row values in sheet column order
+            
+        Returns:
+            True if all rows were added successfully, False otherwise
+        """
+        if not rows:
+            return True
+        
+        if self.partitioning:
+            return self._append_partitioned(rows)
+        
+        try:
+            # Add the rows using append (easier than finding next row)
+            result = self._execute(self.values.append(
                 spreadsheetId=self.sheet_id,
-                range=f'{self.sheet_name}!A:E',
+                range=f'{self.sheet_name}!A:F',
                 valueInputOption='RAW',
-                body={'values': transaction_data}
-            ).execute()
+                body={'values': rows}
+            ), 'write')
             
-            print(f"Transaction added successfully: {transaction['nama']} - {transaction['tipe']} - {transaction['nominal']} ({transaction.get('member', 'Unknown')}) on {transaction_date}")
+            # Keep the local ledger in step without reading it back
+            updated_range = result.get('updates', {}).get('updatedRange', '')
+            self.cache.apply_append(rows, updated_range)
+            self.row_index.apply_append(rows, updated_range)
             return True
             
         except HttpError as e:
-            print(f"Error adding transaction: {str(e)}")
+            log.error("Error adding transaction", extra={'error': str(e)})
             return False
     
+    def _append_partitioned(self, rows: List[List[str]]) -> bool:
+        """Append rows to their monthly tabs and refresh those months' summary rows"""
+        groups: Dict[Optional[str], List[List[str]]] = {}
+        for row in rows:
+            month = month_key(str(row[0])) if len(row) >= 5 else None
+            groups.setdefault(month, []).append(row)
+        
+        try:
+            for month, month_rows in groups.items():
+                # Rows without a recognizable date stay in the main sheet
+                tab = month or self.sheet_name
+                if month:
+                    self._ensure_partition(month)
+                
+                result = self._execute(self.values.append(
+                    spreadsheetId=self.sheet_id,
+                    range=sheet_range(tab, 'A:F'),
+                    valueInputOption='RAW',
+                    body={'values': month_rows}
+                ), 'write')
+                
+                if not month:
+                    self.row_index.apply_append(month_rows, result.get('updates', {}).get('updatedRange', ''))
+                    
+        except HttpError as e:
+            log.error("Error adding transaction", extra={'error': str(e)})
+            return False
+        finally:
+            # The cache holds every tab as one list, re-read it rather than guess where rows went
+            self.cache.mark_stale()
+        
+        try:
+            self.refresh_summary([month for month in groups if month])
+        except HttpError as e:
+            # The rows are stored, the summary catches up on the month's next write
+            log.warning("Could not update summary sheet", extra={'error': str(e)})
+        return True
+    
+    def refresh_summary(self, months: List[str]):
+        """
+        Recompute the summary rows of some months from their monthly tabs
+        
+        Args:
+            months: Months in 'YYYY-MM' format
+        """
+        if not months:
+            return
+        
+        results = self._batch_get(
+            [sheet_range(self.summary_sheet_name, 'A2:H')] +
+            [sheet_range(month, 'A2:F') for month in months]
+        )
+        summary_rows = {row[0]: (number, row) for number, row in enumerate(results[0], start=2) if row}
+        
+        data = []
+        for month, partition_rows in zip(months, results[1:]):
+            if month not in summary_rows:
+                print(f"[WARNING] Summary sheet has no row for {month}")
+                continue
+            number, row = summary_rows[month]
+            index = AggregateIndex.from_rows(partition_rows)
+            pemasukan = index.month_totals.get((month, 'pemasukan'), 0) + summary_int(row, 5)
+            pengeluaran = index.month_totals.get((month, 'pengeluaran'), 0) + summary_int(row, 6)
+            count = index.month_counts.get(month, 0) + summary_int(row, 7)
+            data.append({
+                'range': sheet_range(self.summary_sheet_name, f'B{number}:E{number}'),
+                'values': [[pemasukan, pengeluaran, pemasukan - pengeluaran, count]]
+            })
+        
+        if data:
+            self._execute(self.values.batchUpdate(
+                spreadsheetId=self.sheet_id,
+                body={'valueInputOption': 'RAW', 'data': data}
+            ), 'write')
+    
+    def _sync_cache(self):
+        """Bring the local ledger cache up to date with the sheet"""
+        with self.cache.lock:
+            if self.partitioning:
+                # Rows are spread over several tabs, so there is no single tail to follow
+                if not self.cache_enabled or self.cache.needs_reload() or self.cache.is_stale():
+                    self.cache.load([SHEET_HEADERS] + self.get_all_rows())
+                return
+            
+            if not self.cache_enabled or self.cache.needs_reload():
+                result = self._execute(self.values.get(
+                    spreadsheetId=self.sheet_id,
+                    range=f'{self.sheet_name}!A:F'
+                ))
+                self.cache.load(result.get('values', []))
+            
+            elif self.cache.is_stale():
+                # Only read rows past the last one we know about
+                result = self._execute(self.values.get(
+                    spreadsheetId=self.sheet_id,
+                    range=f'{self.sheet_name}!A{self.cache.last_row + 1}:F'
+                ))
+                self.cache.extend_tail(result.get('values', []))
+    
+    def _read_base_rows(self) -> List[List[str]]:
+        """Read every row of the main sheet, without the header row"""
+        result = self._execute(self.values.get(
+            spreadsheetId=self.sheet_id,
+            range=f'{self.sheet_name}!A:F'
+        ))
+        return result.get('values', [])[HEADER_ROWS:]
+    
+    def get_all_rows(self) -> List[List[str]]:
+        """
+        Read every ledger row from the sheet, followed by the monthly tabs oldest first
+        
+        Returns:
+            Raw row values without the header rows
+        """
+        rows = self._read_base_rows()
+        if self.partitioning:
+            partitions = self.partition_names(refresh=True)
+            for partition_rows in self._batch_get([sheet_range(partition, 'A2:F') for partition in partitions]):
+                rows.extend(partition_rows)
+        return rows
+    
+    def get_transactions_since(self, cursor: Dict[str, int], limit: int = 500) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """
+        Read only the rows added after a cursor, from the main sheet and every monthly tab
+        
+        Args:
+            cursor: Last row read in each tab, {} to start at the first row
+            limit: Maximum number of rows read from each tab
+            
+        Returns:
+            Transactions in tab then row order and the cursor to pass next time
+        """
+        tabs = [self.sheet_name] + (self.partition_names(refresh=True) if self.partitioning else [])
+        starts = [cursor.get(tab, HEADER_ROWS) + 1 for tab in tabs]
+        
+        try:
+            results = self._batch_get([
+                sheet_range(tab, f'A{start}:F{start + max(limit, 1) - 1}') for tab, start in zip(tabs, starts)
+            ])
+        except HttpError as e:
+            log.error("Error reading new transactions", extra={'error': str(e)})
+            return [], dict(cursor)
+        
+        transactions = []
+        next_cursor = dict(cursor)
+        for tab, start, rows in zip(tabs, starts, results):
+            # Blank rows come back as [] and still move the cursor
+            next_cursor[tab] = start - 1 + len(rows)
+            transactions.extend(transaction for transaction in map(row_to_transaction, rows) if transaction)
+        return transactions, next_cursor
+    
+    def get_transactions_page(self, limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        Get one page of transactions, walking back from the newest sheet row
+        
+        Only the page's rows are read, located with the row index. With
+        monthly partitions the newest tab comes first and a page never spans
+        two tabs, so the last page of a tab may hold fewer than `limit`.
+        
+        Args:
+            limit: Maximum number of transactions in the page
+            cursor: 'tab!row' of the first row of the previous page, None for the newest transactions
+            
+        Returns:
+            Transactions in row order and the cursor of the next, older page, None after the oldest one
+        """
+        tabs = [self.sheet_name] + (self.partition_names(refresh=cursor is None) if self.partitioning else [])
+        if cursor:
+            tab, separator, row = cursor.rpartition('!')
+            if not separator or tab not in tabs:
+                raise ValueError(f"Unknown cursor: {cursor}")
+            # An empty row number starts at the end of the tab
+            end = int(row) - 1 if row else None
+        else:
+            tab, end = tabs[-1], None
+        limit = max(limit, 1)
+        
+        try:
+            if end is None and tab == self.sheet_name:
+                self._sync_row_index()
+                end = self.row_index.last_row
+            
+            if end is None:
+                # A monthly tab holds one month, small enough to read whole to find its end
+                rows = self._batch_get([sheet_range(tab, f'A{HEADER_ROWS + 1}:F')])[0]
+                end = HEADER_ROWS + len(rows)
+                start = max(HEADER_ROWS + 1, end - limit + 1)
+                rows = rows[start - HEADER_ROWS - 1:]
+            else:
+                start = max(HEADER_ROWS + 1, end - limit + 1)
+                rows = self._batch_get([sheet_range(tab, f'A{start}:F{end}')])[0] if end >= start else []
+        except HttpError as e:
+            log.error("Error reading transaction page", extra={'error': str(e)})
+            return [], None
+        
+        if start > HEADER_ROWS + 1:
+            next_cursor = f"{tab}!{start}"
+        else:
+            position = tabs.index(tab)
+            next_cursor = f"{tabs[position - 1]}!" if position else None
+        return [transaction for transaction in map(row_to_transaction, rows) if transaction], next_cursor
+    
+    def _sync_row_index(self):
+        """Bring the month to row index up to date by reading only the date column"""
+        with self.row_index.lock:
+            if self.row_index.needs_reload():
+                result = self._execute(self.values.get(
+                    spreadsheetId=self.sheet_id,
+                    range=f'{self.sheet_name}!A:A'
+                ))
+                self.row_index.load(result.get('values', []))
+            
+            elif self.row_index.is_stale():
+                result = self._execute(self.values.get(
+                    spreadsheetId=self.sheet_id,
+                    range=f'{self.sheet_name}!A{self.row_index.last_row + 1}:A'
+                ))
+                self.row_index.extend_tail(result.get('values', []))
+    
+    def _batch_get(self, ranges: List[str], **options) -> List[List[List[str]]]:
+        """
+        Read several ranges in one API call
+        
+        Args:
+            ranges: A1 ranges including the sheet name
+            **options: Extra batchGet parameters, such as valueRenderOption
+            
+        Returns:
+            Rows of each range, in the order requested
+        """
+        if not ranges:
+            return []
+        
+        result = self._execute(self.values.batchGet(
+            spreadsheetId=self.sheet_id,
+            ranges=ranges,
+            **options
+        ))
+        value_ranges = result.get('valueRanges', [])
+        return [value_range.get('values', []) for value_range in value_ranges] + [[]] * (len(ranges) - len(value_ranges))
+    
+    def _read_recent(self, limit: int) -> List[List[str]]:
+        """Read only the last `limit` rows of the sheet"""
+        self._sync_row_index()
+        tail = self.row_index.tail_range(limit)
+        if not tail:
+            return []
+        return self._batch_get([f'{self.sheet_name}!A{tail[0]}:F{tail[1]}'])[0]
+    
+    def _read_month_summary(self, month: str, recent_limit: int = 5) -> Dict:
+        """
+        Total one month by reading only its rows, and only the columns the totals need
+        
+        Args:
+            month: Month in 'YYYY-MM' format
+            recent_limit: Number of recent transactions to include
+            
+        Returns:
+            Summary dictionary as returned by get_monthly_summary
+        """
+        self._sync_row_index()
+        block = self.row_index.month_range(month)
+        undated = self.row_index.undated_ranges()
+        # Leave room for rows without a valid nominal among the last ones
+        tail = self.row_index.tail_range(recent_limit * 2)
+        
+        ranges = []
+        if block:
+            ranges += [f'{self.sheet_name}!A{block[0]}:A{block[1]}', f'{self.sheet_name}!C{block[0]}:F{block[1]}']
+        ranges += [f'{self.sheet_name}!A{first}:F{last}' for first, last in undated]
+        if tail:
+            ranges.append(f'{self.sheet_name}!A{tail[0]}:F{tail[1]}')
+        results = self._batch_get(ranges)
+        
+        index = AggregateIndex()
+        if block:
+            dates, amounts = results[0], results[1]
+            results = results[2:]
+            for offset in range(max(len(dates), len(amounts))):
+                date_cells = dates[offset] if offset < len(dates) else []
+                amount_cells = (amounts[offset] if offset < len(amounts) else []) + ['', '', '', '']
+                # Member isn't read, rows of other months are ignored by total()
+                index.add_row([date_cells[0] if date_cells else ''] + [''] + amount_cells[:4])
+        for rows in results[:len(undated)]:
+            index.add_rows(rows)
+        
+        total_pemasukan = index.total(month, 'pemasukan')
+        total_pengeluaran = index.total(month, 'pengeluaran')
+        
+        return {
+            'total_pemasukan': total_pemasukan,
+            'total_pengeluaran': total_pengeluaran,
+            'saldo': total_pemasukan - total_pengeluaran,
+            'categories': index.categories(month),
+            'recent': recent_valid_transactions(results[-1], recent_limit) if tail else []
+        }
+    
+    def _read_formula_summary(self, month: str, recent_limit: int = 5) -> Optional[Dict]:
+        """
+        Read one month's totals from the formula summary tab, with the last rows for the recent list
+        
+        Args:
+            month: Month in 'YYYY-MM' format
+            recent_limit: Number of recent transactions to include
+            
+        Returns:
+            Summary dictionary as returned by get_monthly_summary, None if the formulas can't be used
+        """
+        self._sync_row_index()
+        # Leave room for rows without a valid nominal among the last ones
+        tail = self.row_index.tail_range(recent_limit * 2)
+        extra_ranges = [f'{self.sheet_name}!A{tail[0]}:F{tail[1]}'] if tail else []
+        
+        totals, results = self._read_formula_totals([(month, ALL)], extra_ranges)
+        if totals is None:
+            return None
+        
+        total_pemasukan, total_pengeluaran = totals[(month, ALL)]
+        return {
+            'total_pemasukan': total_pemasukan,
+            'total_pengeluaran': total_pengeluaran,
+            'saldo': total_pemasukan - total_pengeluaran,
+            'recent': recent_valid_transactions(results[0], recent_limit) if tail else []
+        }
+    
+    def _read_partition_summary(self, month: str, recent_limit: int = 5) -> Dict:
+        """
+        Total one month from its monthly tab and the summary tab
+        
+        Args:
+            month: Month in 'YYYY-MM' format
+            recent_limit: Number of recent transactions to include
+            
+        Returns:
+            Summary dictionary as returned by get_monthly_summary
+        """
+        ranges = [sheet_range(self.summary_sheet_name, 'A2:H')]
+        if self._has_partition(month):
+            ranges.append(sheet_range(month, 'A2:F'))
+        results = self._batch_get(ranges)
+        partition_rows = results[1] if len(results) > 1 else []
+        
+        index = AggregateIndex.from_rows(partition_rows)
+        total_pemasukan = index.month_totals.get((month, 'pemasukan'), 0)
+        total_pengeluaran = index.month_totals.get((month, 'pengeluaran'), 0)
+        categories = index.categories(month)
+        
+        # Rows of this month, and undated rows, left in the main sheet
+        for row in results[0]:
+            if row and row[0] in (month, UNDATED_LABEL):
+                total_pemasukan += summary_int(row, 5)
+                total_pengeluaran += summary_int(row, 6)
+                # The summary tab only holds their totals, so they aren't split by category
+                for tipe, column in (('pemasukan', 5), ('pengeluaran', 6)):
+                    if summary_int(row, column):
+                        categories[tipe][OTHER] = categories[tipe].get(OTHER, 0) + summary_int(row, column)
+        
+        return {
+            'total_pemasukan': total_pemasukan,
+            'total_pengeluaran': total_pengeluaran,
+            'saldo': total_pemasukan - total_pengeluaran,
+            'categories': categories,
+            'recent': recent_valid_transactions(partition_rows, recent_limit)
+        }
+    
+    def _read_recent_partitioned(self, limit: int) -> List[Dict[str, str]]:
+        """Read the newest monthly tabs until `limit` transactions are found"""
+        from datetime import datetime
+        self._has_partition(datetime.now().strftime('%Y-%m'))
+        
+        transactions: List[Dict[str, str]] = []
+        for partition in reversed(self.partition_names()):
+            if len(transactions) >= limit:
+                break
+            rows = self._batch_get([sheet_range(partition, 'A2:F')])[0]
+            transactions = [transaction for transaction in map(row_to_transaction, rows) if transaction] + transactions
+        
+        if len(transactions) < limit:
+            older = [transaction for transaction in map(row_to_transaction, self._read_recent(limit - len(transactions))) if transaction]
+            transactions = older + transactions
+        return transactions[-limit:] if limit > 0 else []
+    
+    def invalidate_cache(self):
+        """Force a full re-read on the next query, e.g. after editing the sheet manually"""
+        self.cache.invalidate()
+        self.row_index.invalidate()
+        self._sheet_ids = None
+        self._summary_months = None
+        for callback in self.on_invalidate:
+            callback()
+        print("[INFO] Ledger cache invalidated")
+    
     def get_recent_transactions(self, limit: int = 10) -> List[Dict[str, str]]:
         """
         Get recent transactions from the sheet
@@ -152,49 +996,26 @@ class GoogleSheetsManager:
             List of transaction dictionaries
         """
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f'{self.sheet_name}!A:E'
-            ).execute()
+            if self.partitioning:
+                return self._read_recent_partitioned(limit)
             
-            values = result.get('values', [])
+            if self.cache_enabled and not self.cache.needs_reload():
+                self._sync_cache()
+                return self.cache.recent(limit)
             
-            if not values or len(values) <= 1:
-                return []
-            
-            # Skip header row and get recent transactions
-            recent_values = values[1:][-limit:]
-            
-            transactions = []
-            for row in recent_values:
-                if len(row) >= 5:
-                    transactions.append({
-                        'tanggal': row[0],
-                        'member': row[1],
-                        'nama': row[2],
-                        'tipe': row[3],
-                        'nominal': row[4]
-                    })
-                elif len(row) >= 3:  # Support old format
-                    transactions.append({
-                        'tanggal': 'N/A',
-                        'member': 'Unknown',
-                        'nama': row[0],
-                        'tipe': row[1],
-                        'nominal': row[2]
-                    })
-            
-            return transactions
+            # Without a loaded cache, read only the tail instead of the whole sheet
+            transactions = [row_to_transaction(row) for row in self._read_recent(limit)]
+            return [transaction for transaction in transactions if transaction]
             
         except HttpError as e:
-            print(f"Error getting recent transactions: {str(e)}")
+            log.error("Error getting recent transactions", extra={'error': str(e)})
             return []
     
     def test_connection(self) -> bool:
         """Test the connection to Google Sheets"""
         try:
             # Try to get sheet metadata
-            self.service.spreadsheets().get(spreadsheetId=self.sheet_id).execute()
+            self._execute(self.spreadsheets.get(spreadsheetId=self.sheet_id))
             print("Google Sheets connection successful")
             return True
         except HttpError as e:
@@ -207,77 +1028,101 @@ class GoogleSheetsManager:
             from datetime import datetime
             current_month = datetime.now().strftime('%Y-%m')
             
-            # Get all data
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f'{self.sheet_name}!A:E'
-            ).execute()
+            if self.partitioning:
+                # Only this month's tab and the summary tab
+                return self._read_partition_summary(current_month)
             
-            values = result.get('values', [])
-            if len(values) <= 1:  # Only headers or empty
-                return {'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'recent': []}
-            
-            total_pemasukan = 0
-            total_pengeluaran = 0
-            recent_transactions = []
-            
-            # Process data (skip header)
-            for row in values[1:]:
-                if len(row) >= 5:
-                    date_str = row[0]
-                    member = row[1]
-                    nama = row[2]
-                    tipe = row[3]
-                    nominal = int(row[4])
-                    
-                    # Check if transaction is from current month
-                    if current_month in date_str:
-                        if tipe == 'pemasukan':
-                            total_pemasukan += nominal
-                        else:
-                            total_pengeluaran += nominal
-                    
-                    # Add to recent transactions
-                    recent_transactions.append({
-                        'tanggal': date_str,
+            if self.formula_summary:
+                summary = self._read_formula_summary(current_month)
+                if summary is not None:
+                    return summary
+            
+            # Only this month's rows, never the whole sheet
+            return self._read_month_summary(current_month)
+            
+        except Exception as e:
+            log.error("Error getting summary", extra={'error': str(e)})
+            return {'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'recent': []}
+    
+    def get_current_balance(self) -> int:
+        """Get current balance"""
+        summary = self.get_monthly_summary()
+        return summary.get('saldo', 0)
+    
+    def get_member_summary(self, member: str, month: Optional[str] = None) -> Dict:
+        """
+        Get one family member's totals for a month from the aggregate index
+        
+        Args:
+            member: Family member display name
+            month: Month in 'YYYY-MM' format, defaults to the current month
+            
+        Returns:
+            Dictionary with 'total_pemasukan', 'total_pengeluaran', 'saldo' and the member's running 'balance'
+        """
+        try:
+            from datetime import datetime
+            month = month or datetime.now().strftime('%Y-%m')
+            
+            if self.formula_summary:
+                totals, _ = self._read_formula_totals([(month, member), (ALL, member)])
+                if totals is not None:
+                    total_pemasukan, total_pengeluaran = totals[(month, member)]
+                    all_pemasukan, all_pengeluaran = totals[(ALL, member)]
+                    return {
                         'member': member,
-                        'nama': nama,
-                        'tipe': tipe,
-                        'nominal': nominal
-                    })
-                elif len(row) >= 3:  # Support old format
-                    nama = row[0]
-                    tipe = row[1]
-                    nominal = int(row[2])
-                    
-                    if tipe == 'pemasukan':
-                        total_pemasukan += nominal
-                    else:
-                        total_pengeluaran += nominal
-                    
-                    recent_transactions.append({
-                        'tanggal': 'N/A',
-                        'member': 'Unknown',
-                        'nama': nama,
-                        'tipe': tipe,
-                        'nominal': nominal
-                    })
+                        'total_pemasukan': total_pemasukan,
+                        'total_pengeluaran': total_pengeluaran,
+                        'saldo': total_pemasukan - total_pengeluaran,
+                        'balance': all_pemasukan - all_pengeluaran
+                    }
             
-            # Get 5 most recent
-            recent_transactions = recent_transactions[-5:]
+            self._sync_cache()
+            with self.cache.lock:
+                total_pemasukan = self.cache.index.total(month, 'pemasukan', member)
+                total_pengeluaran = self.cache.index.total(month, 'pengeluaran', member)
+                balance = self.cache.index.member_balances.get(member, 0)
             
             return {
+                'member': member,
                 'total_pemasukan': total_pemasukan,
                 'total_pengeluaran': total_pengeluaran,
                 'saldo': total_pemasukan - total_pengeluaran,
-                'recent': recent_transactions
+                'balance': balance
             }
             
         except Exception as e:
-            print(f"[ERROR] Error getting summary: {str(e)}")
-            return {'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'recent': []}
+            log.error("Error getting member summary", extra={'error': str(e)})
+            return {'member': member, 'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'balance': 0}
     
-    def get_current_balance(self) -> int:
-        """Get current balance"""
-        summary = self.get_monthly_summary()
-        return summary.get('saldo', 0)
+    def get_running_balance(self) -> int:
+        """Get the all-time balance across every transaction"""
+        try:
+            if self.formula_summary:
+                totals, _ = self._read_formula_totals([(ALL, ALL)])
+                if totals is not None:
+                    return totals[(ALL, ALL)][0] - totals[(ALL, ALL)][1]
+            
+            self._sync_cache()
+            return self.cache.index.balance
+        except Exception as e:
+            log.error("Error getting running balance", extra={'error': str(e)})
+            return 0
+    
+    def verify_aggregates(self) -> List[str]:
+        """
+        Check the aggregate index against a full scan of the sheet
+        
+        Returns:
+            List of mismatch descriptions, empty if the index is correct
+        """
+        self._sync_cache()
+        rows = self.get_all_rows()
+        
+        with self.cache.lock:
+            mismatches = self.cache.index.verify(rows)
+        
+        if mismatches:
+            print(f"[WARNING] Aggregate index out of sync: {len(mismatches)} mismatches, rebuilding")
+            self.cache.load([SHEET_HEADERS] + rows)
+        return mismatches
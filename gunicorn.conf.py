@@ -0,0 +1,13 @@
+# Gunicorn configuration, loaded automatically from the working directory
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Threaded workers: the Sheets client gives each thread its own connection,
+# so one process can serve several webhooks while others wait on Google
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = 5
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Import historical transactions from WhatsApp chat exports into the ledger
+
+Reads a WhatsApp .txt export or a JSONL file as a stream, parses messages in
+parallel, and writes the transactions to a local SQLite ledger in large
+chunks. With LEDGER_BACKEND=sqlite that is the bot's ledger, otherwise a
+staging ledger next to the source. Either way the rows are then mirrored to
+Google Sheets. Progress is committed together with each chunk, so an
+interrupted import can be resumed by running the same command again without
+adding any row twice.
+
+Usage:
+    python import_chat.py chat.txt [--workers 4] [--chunk-size 1000] [--dry-run]
+    python import_chat.py messages.jsonl --rejects rejected.txt
+
+JSONL lines look like:
+    {"timestamp": "2025-07-15 12:30:00", "from": "whatsapp:+6281234567890", "body": "makan pengeluaran 20rb"}
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from family_config import get_all_family_members, get_family_member
+from message_parser import MessageParser
+from write_queue import backoff_delay
+
+# Android: "15/07/25, 12.30 - Mama: makan pengeluaran 20rb"
+# iOS:     "[15/07/25 12.30.05] Mama: makan pengeluaran 20rb"
+EXPORT_LINE_PATTERN = re.compile(
+    '^\u200e?' r'\[?(?P<date>\d{1,2}/\d{1,2}/\d{2,4}),?\s+'
+    r'(?P<time>\d{1,2}[.:]\d{2}(?:[.:]\d{2})?(?:\s?[AaPp]\.?[Mm]\.?)?)\]?'
+    r'(?:\s+-)?\s+(?P<sender>[^:]+?):\s(?P<body>.*)$'
+)
+
+# Any line that starts a new entry, including system messages without a sender
+EXPORT_ENTRY_PATTERN = re.compile('^\u200e?' r'\[?\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}[.:]\d{2}')
+
+MAX_APPEND_ATTEMPTS = 5
+
+_parser = MessageParser()
+
+
+class ChatRecord(NamedTuple):
+    """One message from a chat export"""
+    index: int
+    sent_at: datetime
+    sender: str
+    body: str
+
+
+def parse_export_timestamp(date_str: str, time_str: str, date_order: str = 'dmy') -> datetime:
+    """
+    Parse the date and time of a WhatsApp export line
+
+    Args:
+        date_str: Date part like '15/07/25' or '15/07/2025'
+        time_str: Time part like '12.30', '12:30:05' or '2:30 PM'
+        date_order: 'dmy' or 'mdy', depending on the phone's locale
+
+    Returns:
+        Timestamp of the message
+    """
+    first, second, year = (int(part) for part in date_str.split('/'))
+    day, month = (first, second) if date_order == 'dmy' else (second, first)
+    if year < 100:
+        year += 2000
+
+    time_str = time_str.replace('.', ':').upper()
+    meridiem = None
+    for suffix in ('AM', 'PM', 'A:M:', 'P:M:'):
+        if time_str.endswith(suffix):
+            meridiem = suffix[0]
+            time_str = time_str[:-len(suffix)].strip()
+            break
+
+    parts = [int(part) for part in time_str.split(':')]
+    hour, minute = parts[0], parts[1]
+    second = parts[2] if len(parts) > 2 else 0
+    if meridiem == 'P' and hour < 12:
+        hour += 12
+    elif meridiem == 'A' and hour == 12:
+        hour = 0
+
+    return datetime(year, month, day, hour, minute, second)
+
+
+def read_whatsapp_export(path: str, date_order: str = 'dmy') -> Iterator[ChatRecord]:
+    """
+    Stream messages from a WhatsApp .txt export
+
+    Lines that don't start with a timestamp continue the previous message.
+    System messages without a sender are skipped.
+    """
+    current = None
+    index = 0
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+
+            if EXPORT_ENTRY_PATTERN.match(line):
+                if current:
+                    yield current
+                    index += 1
+                    current = None
+
+                match = EXPORT_LINE_PATTERN.match(line)
+                if not match:
+                    continue
+                try:
+                    sent_at = parse_export_timestamp(match.group('date'), match.group('time'), date_order)
+                except ValueError:
+                    continue
+                current = ChatRecord(index, sent_at, match.group('sender').strip(), match.group('body'))
+
+            elif current:
+                current = current._replace(body=f"{current.body}\n{line}")
+
+    if current:
+        yield current
+
+
+def read_jsonl(path: str) -> Iterator[ChatRecord]:
+    """Stream messages from a JSONL file with 'timestamp', 'from' and 'body' keys"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+                sent_at = datetime.fromisoformat(data['timestamp'])
+                yield ChatRecord(index, sent_at, data.get('from', ''), data.get('body', ''))
+            except (ValueError, KeyError) as e:
+                print(f"[WARNING] Skipping line {index + 1}: {str(e)}")
+
+
+def map_sender(sender: str) -> str:
+    """
+    Map an export sender to a family member name
+
+    Phone numbers like '+62 895-4117-8980' are normalized to the
+    'whatsapp:+62...' keys in FAMILY_CONFIG. Contact names that already match
+    a family member are kept as they are.
+    """
+    if sender.startswith('whatsapp:'):
+        return get_family_member(sender)
+
+    digits = re.sub(r'\D', '', sender)
+    if sender.lstrip('\u200e\u202a').startswith('+') and digits:
+        return get_family_member(f'whatsapp:+{digits}')
+
+    if sender in get_all_family_members().values():
+        return sender
+
+    return get_family_member(sender)
+
+
+def parse_record(record: ChatRecord) -> Dict:
+    """Parse one record in a worker process, a message may hold several transactions"""
+    transactions, _ = _parser.parse_transactions(record.body, record.sent_at)
+    member = map_sender(record.sender) if transactions else None
+    for transaction in transactions:
+        transaction['member'] = member
+    return {'record': record, 'transactions': transactions}
+
+
+def new_checkpoint(source: str) -> Dict:
+    """Progress of an import that hasn't started"""
+    return {'source': os.path.abspath(source), 'records_done': 0, 'imported': 0, 'rejected': 0}
+
+
+def checkpoint_key(source: str) -> str:
+    """Meta key the ledger keeps an import's progress under"""
+    return f"import:{os.path.abspath(source)}"
+
+
+def load_checkpoint(path: str, source: str) -> Dict:
+    """Load import progress for this source, or start from the beginning"""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('source') == os.path.abspath(source):
+            return checkpoint
+        print(f"[WARNING] Checkpoint {path} belongs to another file, starting over")
+    return new_checkpoint(source)
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Write the checkpoint atomically so a crash can't leave it half written"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def add_with_retry(ledger, transactions: List[Dict[str, str]], meta: Optional[Dict[str, str]] = None):
+    """Add transactions to the ledger, backing off on failures, with meta values in the same commit if given"""
+    for attempt in range(1, MAX_APPEND_ATTEMPTS + 1):
+        if ledger.add_transactions(transactions, meta) if meta else ledger.add_transactions(transactions):
+            return
+        delay = backoff_delay(attempt, base=2.0, cap=60.0)
+        print(f"[WARNING] Adding {len(transactions)} transactions failed, retrying in {delay:.1f}s")
+        time.sleep(delay)
+    raise RuntimeError(f"Giving up after {MAX_APPEND_ATTEMPTS} failed appends")
+
+
+class ChatImporter:
+    """Parse chat records in parallel and write them to the ledger in chunks"""
+
+    def __init__(self, ledger=None, workers: Optional[int] = None, chunk_size: int = 1000,
+                 checkpoint_path: Optional[str] = None, rejects_path: Optional[str] = None):
+        """
+        Initialize chat importer
+
+        Args:
+            ledger: LedgerStorage to add the transactions to, None for a dry run
+            workers: Number of parser processes, defaults to the CPU count
+            chunk_size: Transactions per write and per checkpoint
+            checkpoint_path: File to save progress to, for ledgers that can't commit it with the
+                transactions (a SQLiteLedger keeps it itself), None to disable resuming
+            rejects_path: File to write messages that could not be parsed
+        """
+        self.ledger = ledger
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+        self.rejects_path = rejects_path
+        # A SQLiteLedger commits progress with each chunk, so a crash can't split the two
+        self.atomic = hasattr(ledger, 'get_meta')
+
+    def _load_checkpoint(self, source: str) -> Dict:
+        """Progress saved by an earlier run, rejects written after it are dropped"""
+        if self.atomic:
+            saved = self.ledger.get_meta(checkpoint_key(source))
+            checkpoint = json.loads(saved) if saved else None
+        elif self.checkpoint_path and self.ledger:
+            checkpoint = load_checkpoint(self.checkpoint_path, source)
+        else:
+            checkpoint = None
+
+        if checkpoint is None:
+            checkpoint = new_checkpoint(source)
+            if self.rejects_path:
+                # Saved before the first chunk, so a rerun after a crash doesn't repeat its rejects
+                checkpoint['rejects_size'] = os.path.getsize(self.rejects_path) if os.path.exists(self.rejects_path) else 0
+                self._save(checkpoint, [])
+        elif self.rejects_path and os.path.exists(self.rejects_path) and 'rejects_size' in checkpoint:
+            with open(self.rejects_path, 'r+b') as f:
+                f.truncate(checkpoint['rejects_size'])
+        return checkpoint
+
+    def run(self, source: str, records: Iterator[ChatRecord]) -> Dict:
+        """
+        Import all records from a source
+
+        Returns:
+            Checkpoint dictionary with the final counts
+        """
+        checkpoint = self._load_checkpoint(source)
+
+        skip = checkpoint['records_done']
+        if skip:
+            print(f"[INFO] Resuming after {skip:,} records ({checkpoint['imported']:,} imported)")
+
+        pending_records = (record for record in records if record.index >= skip)
+        transactions = []
+        rejects = []
+        last_index = skip - 1
+        started = time.perf_counter()
+        processed = 0
+
+        with Pool(self.workers) as pool:
+            for result in pool.imap(parse_record, pending_records, chunksize=256):
+                record = result['record']
+                last_index = record.index
+                processed += 1
+
+                if result['transactions']:
+                    transactions.extend(result['transactions'])
+                else:
+                    rejects.append(record)
+
+                if len(transactions) >= self.chunk_size:
+                    self._commit(checkpoint, transactions, rejects, last_index)
+                    transactions, rejects = [], []
+                    self._report(processed, started, checkpoint)
+
+        self._commit(checkpoint, transactions, rejects, last_index)
+        self._report(processed, started, checkpoint)
+        return checkpoint
+
+    def _commit(self, checkpoint: Dict, transactions: List[Dict[str, str]], rejects: List[ChatRecord], last_index: int):
+        """Write the rejects of a chunk, then its transactions together with the advanced checkpoint"""
+        if rejects and self.rejects_path:
+            with open(self.rejects_path, 'ab') as f:
+                for record in rejects:
+                    body = record.body.replace('\n', ' ')
+                    f.write(f"{record.sent_at:%Y-%m-%d %H:%M:%S}\t{record.sender}\t{body}\n".encode('utf-8'))
+                checkpoint['rejects_size'] = f.tell()
+
+        checkpoint['records_done'] = last_index + 1
+        checkpoint['imported'] += len(transactions)
+        checkpoint['rejected'] += len(rejects)
+        self._save(checkpoint, transactions)
+
+    def _save(self, checkpoint: Dict, transactions: List[Dict[str, str]]):
+        """Add transactions and save the checkpoint, in one commit when the ledger allows it"""
+        if not self.ledger:
+            return
+        if self.atomic:
+            add_with_retry(self.ledger, transactions, {checkpoint_key(checkpoint['source']): json.dumps(checkpoint)})
+            return
+        if transactions:
+            add_with_retry(self.ledger, transactions)
+        if self.checkpoint_path:
+            save_checkpoint(self.checkpoint_path, checkpoint)
+
+    def _report(self, processed: int, started: float, checkpoint: Dict):
+        """Print progress and throughput"""
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"[INFO] {checkpoint['records_done']:,} records, {checkpoint['imported']:,} imported, "
+              f"{checkpoint['rejected']:,} rejected ({processed / elapsed:,.0f} records/s)")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Import WhatsApp chat exports into the ledger')
+    arg_parser.add_argument('source', help='WhatsApp .txt export or .jsonl file')
+    arg_parser.add_argument('--format', choices=['auto', 'whatsapp', 'jsonl'], default='auto')
+    arg_parser.add_argument('--date-order', choices=['dmy', 'mdy'], default='dmy',
+                            help='Date order used in the export (default: dmy)')
+    arg_parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+    arg_parser.add_argument('--chunk-size', type=int, default=1000, help='Transactions per write')
+    arg_parser.add_argument('--staging', default=None,
+                            help='Local ledger staging the rows with LEDGER_BACKEND=sheets (default: <source>.import.db)')
+    arg_parser.add_argument('--rejects', default=None, help='Write messages that could not be parsed to this file')
+    arg_parser.add_argument('--dry-run', action='store_true', help='Parse only, do not write to the ledger')
+    args = arg_parser.parse_args()
+
+    source_format = args.format
+    if source_format == 'auto':
+        source_format = 'jsonl' if args.source.endswith('.jsonl') else 'whatsapp'
+
+    if source_format == 'jsonl':
+        records = read_jsonl(args.source)
+    else:
+        records = read_whatsapp_export(args.source, args.date_order)
+
+    ledger = None
+    mirror = None
+    staged = False
+    if not args.dry_run:
+        load_dotenv()
+        from google_sheets_manager import GoogleSheetsManager
+        from sqlite_ledger import SQLiteLedger, SheetsMirror, bootstrap_from_sheets
+        sheets_manager = GoogleSheetsManager()
+        sheets_manager.setup_sheet_headers()
+        if os.getenv('LEDGER_BACKEND', 'sqlite').lower() == 'sqlite':
+            # Imported rows go where the bot reads
+            ledger = SQLiteLedger()
+            bootstrap_from_sheets(ledger, sheets_manager)
+        else:
+            # Sheet appends can't be committed with the progress, so rows are staged locally first
+            ledger = SQLiteLedger(args.staging or f"{args.source}.import.db")
+            staged = True
+        mirror = SheetsMirror(ledger, sheets_manager)
+
+    importer = ChatImporter(
+        ledger=ledger,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        rejects_path=args.rejects
+    )
+
+    print(f"[INFO] Importing {args.source} ({source_format})")
+    started = time.perf_counter()
+    checkpoint = importer.run(args.source, records)
+    elapsed = time.perf_counter() - started
+
+    if mirror:
+        try:
+            mirror.flush()
+        except RuntimeError as e:
+            if staged:
+                print(f"[WARNING] {str(e)}, run the same command again to copy the rest to Google Sheets")
+            else:
+                print(f"[WARNING] {str(e)}, the bot's mirror copies the rest to Google Sheets")
+
+    print("=" * 50)
+    print(f"[SUCCESS] Imported {checkpoint['imported']:,} transactions, rejected {checkpoint['rejected']:,} messages "
+          f"in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
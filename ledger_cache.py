@@ -0,0 +1,485 @@
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from categories import categorize
+
+# Sheet row 1 holds the headers, data starts at row 2
+HEADER_ROWS = 1
+
+# Month key for old format rows, which have no date and count in every month
+UNDATED = ''
+
+MONTH_PATTERN = re.compile(r'\d{4}-\d{2}')
+
+
+def parse_nominal(value) -> Optional[int]:
+    """Convert a nominal cell to int, None if it is not a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def row_to_transaction(row: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Convert a raw sheet row to a transaction dictionary
+
+    Args:
+        row: Raw row values as returned by the Sheets API
+
+    Returns:
+        Transaction dictionary or None if the row is too short
+    """
+    if len(row) >= 5:
+        return {
+            'tanggal': row[0],
+            'member': row[1],
+            'nama': row[2],
+            'tipe': row[3],
+            'nominal': row[4],
+            # Rows written before the Kategori column are classified when read
+            'kategori': row[5] if len(row) >= 6 and row[5] else categorize(row[2], row[3])
+        }
+    elif len(row) >= 3:  # Support old format
+        return {
+            'tanggal': 'N/A',
+            'member': 'Unknown',
+            'nama': row[0],
+            'tipe': row[1],
+            'nominal': row[2],
+            'kategori': categorize(row[0], row[1])
+        }
+    return None
+
+
+def transaction_to_row(transaction: Dict[str, str]) -> List[str]:
+    """
+    Convert a transaction dictionary to a sheet row
+
+    Args:
+        transaction: Dictionary with 'nama', 'tipe', 'nominal', 'member', and optionally 'tanggal' and 'kategori' keys
+
+    Returns:
+        Row values in sheet column order
+    """
+    # Use custom date if provided, otherwise use current timestamp
+    if 'tanggal' in transaction and transaction['tanggal']:
+        transaction_date = transaction['tanggal']
+    else:
+        transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    return [
+        transaction_date,
+        transaction.get('member', 'Unknown'),
+        transaction['nama'],
+        transaction['tipe'],
+        transaction['nominal'],
+        transaction.get('kategori') or categorize(transaction['nama'], transaction['tipe'])
+    ]
+
+
+def parse_start_row(updated_range: str) -> Optional[int]:
+    """Get the first row number from an A1 range like 'Sheet1!A7:E9'"""
+    match = re.search(r'![A-Z]+(\d+)', updated_range or '')
+    return int(match.group(1)) if match else None
+
+
+def month_key(date_str: str) -> Optional[str]:
+    """Get the 'YYYY-MM' month of a date cell, None if it has no recognizable month"""
+    match = MONTH_PATTERN.search(date_str)
+    return match.group(0) if match else None
+
+
+def recent_valid_transactions(rows: List[List[str]], limit: int) -> List[Dict]:
+    """
+    Get the last `limit` rows that hold a numeric nominal, oldest first
+
+    Args:
+        rows: Raw sheet rows in sheet order
+
+    Returns:
+        Transactions with 'nominal' converted to int
+    """
+    # Walk back from the end until we have enough valid transactions
+    transactions = []
+    for row in reversed(rows):
+        if len(transactions) >= limit:
+            break
+        transaction = row_to_transaction(row)
+        if not transaction:
+            continue
+        nominal = parse_nominal(transaction['nominal'])
+        if nominal is None:
+            continue
+        transaction['nominal'] = nominal
+        transactions.append(transaction)
+    transactions.reverse()
+    return transactions
+
+
+def merge_row_ranges(rows: List[int]) -> List[Tuple[int, int]]:
+    """Collapse sorted row numbers into (first, last) ranges of consecutive rows"""
+    ranges = []
+    for row in rows:
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+class AggregateIndex:
+    """Running totals keyed by (month, member, tipe), updated on every row"""
+
+    def __init__(self):
+        self.totals: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.month_totals: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.category_totals: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.month_counts: Dict[str, int] = defaultdict(int)
+        self.member_balances: Dict[str, int] = defaultdict(int)
+        self.balance = 0
+        self.row_count = 0
+
+    def add_row(self, row: List[str]):
+        """Add a raw sheet row to the running totals"""
+        transaction = row_to_transaction(row)
+        if not transaction:
+            return
+        nominal = parse_nominal(transaction['nominal'])
+        if nominal is None:
+            return
+
+        if len(row) >= 5:
+            month = month_key(transaction['tanggal'])
+        else:
+            month = UNDATED
+
+        # Anything that isn't income counts as expense, same as the reports
+        tipe = 'pemasukan' if transaction['tipe'] == 'pemasukan' else 'pengeluaran'
+        member = transaction['member']
+        signed = nominal if tipe == 'pemasukan' else -nominal
+
+        if month is not None:
+            self.totals[(month, member, tipe)] += nominal
+            self.month_totals[(month, tipe)] += nominal
+            self.category_totals[(month, tipe, transaction['kategori'])] += nominal
+            self.month_counts[month] += 1
+        self.member_balances[member] += signed
+        self.balance += signed
+        self.row_count += 1
+
+    def add_rows(self, rows: List[List[str]]):
+        """Add several raw sheet rows to the running totals"""
+        for row in rows:
+            self.add_row(row)
+
+    def total(self, month: str, tipe: str, member: Optional[str] = None) -> int:
+        """
+        Look up a total for a month
+
+        Args:
+            month: Month in 'YYYY-MM' format
+            tipe: 'pemasukan' or 'pengeluaran'
+            member: Restrict to one family member, all members if None
+
+        Returns:
+            Total nominal, including undated old format rows
+        """
+        if member is None:
+            return self.month_totals.get((month, tipe), 0) + self.month_totals.get((UNDATED, tipe), 0)
+        return self.totals.get((month, member, tipe), 0) + self.totals.get((UNDATED, member, tipe), 0)
+
+    def categories(self, month: str) -> Dict[str, Dict[str, int]]:
+        """
+        Totals of each category in a month
+
+        Args:
+            month: Month in 'YYYY-MM' format
+
+        Returns:
+            Category totals under 'pemasukan' and 'pengeluaran', including undated old format rows
+        """
+        breakdown: Dict[str, Dict[str, int]] = {'pemasukan': {}, 'pengeluaran': {}}
+        for (row_month, tipe, kategori), value in self.category_totals.items():
+            if value and row_month in (month, UNDATED):
+                breakdown[tipe][kategori] = breakdown[tipe].get(kategori, 0) + value
+        return breakdown
+
+    def snapshot(self) -> Dict:
+        """Plain dictionary view used to compare two indexes"""
+        return {
+            'totals': {key: value for key, value in self.totals.items() if value},
+            'category_totals': {key: value for key, value in self.category_totals.items() if value},
+            'member_balances': {key: value for key, value in self.member_balances.items() if value},
+            'balance': self.balance,
+            'row_count': self.row_count
+        }
+
+    @classmethod
+    def from_rows(cls, rows: List[List[str]]) -> 'AggregateIndex':
+        """Rebuild an index with a full scan of raw sheet rows"""
+        index = cls()
+        index.add_rows(rows)
+        return index
+
+    def verify(self, rows: List[List[str]]) -> List[str]:
+        """
+        Check the running totals against a full scan
+
+        Args:
+            rows: Raw sheet rows without the header
+
+        Returns:
+            List of mismatch descriptions, empty if the index is correct
+        """
+        expected = AggregateIndex.from_rows(rows).snapshot()
+        actual = self.snapshot()
+
+        mismatches = []
+        for section in ('totals', 'category_totals', 'member_balances'):
+            for key in sorted(set(expected[section]) | set(actual[section]), key=str):
+                if expected[section].get(key, 0) != actual[section].get(key, 0):
+                    mismatches.append(f"{section} {key}: expected {expected[section].get(key, 0)}, got {actual[section].get(key, 0)}")
+        for field in ('balance', 'row_count'):
+            if expected[field] != actual[field]:
+                mismatches.append(f"{field}: expected {expected[field]}, got {actual[field]}")
+        return mismatches
+
+
+class LedgerCache:
+    """Local copy of the ledger rows, kept in sync incrementally"""
+
+    def __init__(self, ttl: Optional[float] = None, max_age: Optional[float] = None):
+        """
+        Initialize ledger cache
+
+        Args:
+            ttl: Seconds before the tail of the sheet is re-read for new rows
+            max_age: Seconds before the whole sheet is re-read to pick up manual edits
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('LEDGER_CACHE_TTL', '60'))
+        self.max_age = max_age if max_age is not None else float(os.getenv('LEDGER_CACHE_MAX_AGE', '3600'))
+        self.rows: List[List[str]] = []
+        self.index = AggregateIndex()
+        self.loaded_at = 0.0
+        self.synced_at = 0.0
+        self.lock = threading.RLock()
+        self._loaded = False
+
+    @property
+    def last_row(self) -> int:
+        """Sheet row number of the last known row"""
+        return HEADER_ROWS + len(self.rows)
+
+    def needs_reload(self) -> bool:
+        """Whether the whole sheet has to be read again"""
+        return not self._loaded or time.time() - self.loaded_at >= self.max_age
+
+    def is_stale(self) -> bool:
+        """Whether rows appended outside this process may be missing"""
+        return time.time() - self.synced_at >= self.ttl
+
+    def invalidate(self):
+        """Drop cached rows, e.g. after the sheet was edited manually"""
+        with self.lock:
+            self.rows = []
+            self.index = AggregateIndex()
+            self._loaded = False
+            self.loaded_at = 0.0
+            self.synced_at = 0.0
+
+    def load(self, values: List[List[str]]):
+        """
+        Replace cached rows with a full read of the sheet
+
+        Args:
+            values: All sheet values including the header row
+        """
+        with self.lock:
+            self.rows = [list(row) for row in values[HEADER_ROWS:]]
+            self.index = AggregateIndex.from_rows(self.rows)
+            self._loaded = True
+            self.loaded_at = self.synced_at = time.time()
+
+    def extend_tail(self, values: List[List[str]]):
+        """
+        Add rows read from past the last known row
+
+        Args:
+            values: Rows starting at last_row + 1
+        """
+        with self.lock:
+            self._add_rows(values)
+            self.synced_at = time.time()
+
+    def apply_append(self, rows: List[List[str]], updated_range: str):
+        """
+        Record rows we appended ourselves without reading them back
+
+        Args:
+            rows: Rows that were appended
+            updated_range: The 'updatedRange' returned by the append call
+        """
+        with self.lock:
+            if not self._loaded:
+                return
+
+            start_row = parse_start_row(updated_range)
+            if start_row == self.last_row + 1:
+                self._add_rows(rows)
+            else:
+                # Someone else wrote rows we don't have yet, re-read the tail
+                self.synced_at = 0.0
+
+    def mark_stale(self):
+        """Re-read on the next query, e.g. after rows were written somewhere the cache can't follow"""
+        with self.lock:
+            self.synced_at = 0.0
+
+    def _add_rows(self, rows: List[List[str]]):
+        """Append rows and update the aggregates, caller holds the lock"""
+        new_rows = [list(row) for row in rows]
+        self.rows.extend(new_rows)
+        self.index.add_rows(new_rows)
+
+    def recent(self, limit: int) -> List[Dict[str, str]]:
+        """Get the last `limit` rows as transactions"""
+        with self.lock:
+            recent_rows = self.rows[-limit:] if limit > 0 else []
+
+        transactions = []
+        for row in recent_rows:
+            transaction = row_to_transaction(row)
+            if transaction:
+                transactions.append(transaction)
+        return transactions
+
+
+class RowIndex:
+    """Sheet row numbers of each month's rows, built from the date column alone
+
+    Rows are appended roughly in date order, so each month occupies one block
+    of rows. Reading that block, plus the few undated old format rows, is
+    enough to total a month without downloading the rest of the sheet.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_age: Optional[float] = None):
+        """
+        Initialize row index
+
+        Args:
+            ttl: Seconds before the date column past the last known row is re-read
+            max_age: Seconds before the whole date column is re-read
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('LEDGER_CACHE_TTL', '60'))
+        self.max_age = max_age if max_age is not None else float(os.getenv('LEDGER_CACHE_MAX_AGE', '3600'))
+        self.months: Dict[str, Tuple[int, int]] = {}
+        self.undated: List[int] = []
+        self.last_row = HEADER_ROWS
+        self.loaded_at = 0.0
+        self.synced_at = 0.0
+        self.lock = threading.RLock()
+        self._loaded = False
+
+    def needs_reload(self) -> bool:
+        """Whether the whole date column has to be read again"""
+        return not self._loaded or time.time() - self.loaded_at >= self.max_age
+
+    def is_stale(self) -> bool:
+        """Whether rows appended outside this process may be missing"""
+        return time.time() - self.synced_at >= self.ttl
+
+    def invalidate(self):
+        """Forget all row positions, e.g. after the sheet was edited manually"""
+        with self.lock:
+            self.months = {}
+            self.undated = []
+            self.last_row = HEADER_ROWS
+            self._loaded = False
+            self.loaded_at = 0.0
+            self.synced_at = 0.0
+
+    def load(self, column_values: List[List[str]]):
+        """
+        Rebuild the index from a read of the whole date column
+
+        Args:
+            column_values: Column A values including the header row
+        """
+        with self.lock:
+            self.months = {}
+            self.undated = []
+            self.last_row = HEADER_ROWS
+            self._add(HEADER_ROWS + 1, column_values[HEADER_ROWS:])
+            self._loaded = True
+            self.loaded_at = self.synced_at = time.time()
+
+    def extend_tail(self, column_values: List[List[str]]):
+        """
+        Add date cells read from past the last known row
+
+        Args:
+            column_values: Column A values starting at last_row + 1
+        """
+        with self.lock:
+            self._add(self.last_row + 1, column_values)
+            self.synced_at = time.time()
+
+    def apply_append(self, rows: List[List[str]], updated_range: str):
+        """
+        Record rows we appended ourselves without reading them back
+
+        Args:
+            rows: Rows that were appended
+            updated_range: The 'updatedRange' returned by the append call
+        """
+        with self.lock:
+            if not self._loaded:
+                return
+
+            start_row = parse_start_row(updated_range)
+            if start_row == self.last_row + 1:
+                self._add(start_row, [row[:1] for row in rows])
+            else:
+                # Someone else wrote rows we don't have yet, re-read the tail
+                self.synced_at = 0.0
+
+    def _add(self, start_row: int, column_values: List[List[str]]):
+        """Index date cells starting at a sheet row, caller holds the lock"""
+        for offset, cells in enumerate(column_values):
+            row_number = start_row + offset
+            if not cells or cells[0] in ('', None):
+                continue
+            month = month_key(str(cells[0]))
+            if month is None:
+                # Old format rows start with the name, they count in every month
+                self.undated.append(row_number)
+            elif month in self.months:
+                first, last = self.months[month]
+                self.months[month] = (min(first, row_number), max(last, row_number))
+            else:
+                self.months[month] = (row_number, row_number)
+        if column_values:
+            self.last_row = max(self.last_row, start_row + len(column_values) - 1)
+
+    def month_range(self, month: str) -> Optional[Tuple[int, int]]:
+        """First and last sheet row holding a date in the month, None if it has no rows"""
+        with self.lock:
+            return self.months.get(month)
+
+    def undated_ranges(self) -> List[Tuple[int, int]]:
+        """Row ranges without a recognizable date, read in full for every month"""
+        with self.lock:
+            return merge_row_ranges(self.undated)
+
+    def tail_range(self, limit: int) -> Optional[Tuple[int, int]]:
+        """First and last sheet row of the last `limit` rows, None if the sheet is empty"""
+        with self.lock:
+            if limit <= 0 or self.last_row <= HEADER_ROWS:
+                return None
+            return max(HEADER_ROWS + 1, self.last_row - limit + 1), self.last_row
@@ -0,0 +1,129 @@
+"""
+Ledger export as CSV or JSON Lines, streamed in batches
+
+The ledger is read through get_transactions_since one batch at a time and
+each batch is encoded and handed to the response before the next is read,
+so memory stays the same however long the ledger is.
+"""
+
+import csv
+import hmac
+import io
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+from structured_logging import get_logger
+
+log = get_logger('export')
+
+# Columns of each exported transaction, in sheet order
+EXPORT_FIELDS = ['tanggal', 'member', 'nama', 'tipe', 'nominal', 'kategori']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+# Largest page /recent returns
+RECENT_MAX_LIMIT = 500
+
+
+def page_limit(value: Optional[str], default: int = 10) -> int:
+    """
+    Read the limit parameter of /recent
+
+    Raises:
+        ValueError: If the value isn't a positive whole number
+    """
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError(f"limit must be positive: {value}")
+    return min(limit, RECENT_MAX_LIMIT)
+
+
+def export_authorized(authorization: Optional[str], token: Optional[str]) -> bool:
+    """
+    Whether a request may download the ledger
+
+    Args:
+        authorization: The request's Authorization header
+        token: The request's token parameter
+
+    Returns:
+        True if EXPORT_TOKEN is unset, or the request sends it as a bearer token or the token parameter
+    """
+    expected = os.getenv('EXPORT_TOKEN')
+    if not expected:
+        return True
+    given = token or ''
+    if authorization and authorization.startswith('Bearer '):
+        given = authorization[len('Bearer '):]
+    return hmac.compare_digest(given.encode(), expected.encode())
+
+
+def export_batch_size() -> int:
+    """Transactions read from the ledger per batch"""
+    return int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+
+def iter_batches(ledger, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, str]]]:
+    """
+    Read the whole ledger in batches, oldest first
+
+    Args:
+        ledger: LedgerStorage read with get_transactions_since
+        batch_size: Transactions per read, defaults to EXPORT_BATCH_SIZE
+
+    Yields:
+        Lists of at most batch_size transactions per tab read
+    """
+    batch_size = batch_size or export_batch_size()
+    cursor: Dict[str, int] = {}
+    while True:
+        transactions, next_cursor = ledger.get_transactions_since(cursor, batch_size)
+        if transactions:
+            yield transactions
+        if next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def encode_batch(transactions: List[Dict[str, str]], export_format: str) -> str:
+    """Encode a batch of transactions as CSV rows or JSON lines"""
+    if export_format == 'jsonl':
+        return ''.join(json.dumps({field: transaction.get(field, '') for field in EXPORT_FIELDS}, ensure_ascii=False) + '\n'
+                       for transaction in transactions)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, extrasaction='ignore')
+    writer.writerows(transactions)
+    return buffer.getvalue()
+
+
+def export_chunks(ledger, export_format: str = 'csv', batch_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Stream the whole ledger in an export format
+
+    Args:
+        ledger: LedgerStorage to export
+        export_format: 'csv' or 'jsonl'
+        batch_size: Transactions read and encoded at a time
+
+    Yields:
+        Chunks of the export, the CSV header first
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    if export_format == 'csv':
+        yield ','.join(EXPORT_FIELDS) + '\r\n'
+
+    count = 0
+    for transactions in iter_batches(ledger, batch_size):
+        count += len(transactions)
+        yield encode_batch(transactions, export_format)
+    log.info("Ledger exported", extra={'format': export_format, 'transactions': count})
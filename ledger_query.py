@@ -0,0 +1,394 @@
+"""
+Date-range and per-member reports, e.g. 'laporan juli' or 'pengeluaran 01/07-15/07'
+
+The index keeps every dated transaction sorted by date, overall and per family
+member, and answers a range by bisecting to its first and last transaction. It
+follows the ledger through get_transactions_since, so after the first load a
+query reads only the rows added since the previous one, whichever backend
+holds the ledger.
+"""
+
+import re
+import threading
+import weakref
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from categories import categorize, normalize
+from digest import MONTH_NAMES, RECENT_LIMIT, add_category, transaction_date
+from ledger_cache import parse_nominal
+from message_parser import MessageParser
+from structured_logging import get_logger
+
+log = get_logger('ledger_query')
+
+# First word of a query and the transaction type it reports, None for both
+QUERY_COMMANDS = {
+    'laporan': None,
+    'report': None,
+    'ringkasan': None,
+    'pemasukan': 'pemasukan',
+    'pengeluaran': 'pengeluaran',
+}
+
+# Indonesian and English month names and their short forms
+MONTHS = {name.lower(): number for number, name in enumerate(MONTH_NAMES, 1)}
+MONTHS.update({name.lower()[:3]: number for number, name in enumerate(MONTH_NAMES, 1)})
+MONTHS.update({
+    'january': 1, 'february': 2, 'march': 3, 'may': 5, 'june': 6, 'july': 7, 'august': 8,
+    'october': 10, 'december': 12, 'agt': 8, 'aug': 8, 'oct': 10, 'dec': 12,
+})
+
+MONTH_PATTERN = re.compile(r'\b(?P<month>' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\b(?:\s+(?P<year>\d{4}))?')
+
+# Same day forms as transactions, DD/MM or DD/MM/YYYY with '/' or '-'
+DATE = r'\d{1,2}[/\-]\d{1,2}(?:[/\-]\d{4})?'
+RANGE_PATTERN = re.compile(r'(?P<start>' + DATE + r')\s*(?:-|s/?d|sampai|hingga|to)\s*(?P<end>' + DATE + r')')
+
+RELATIVE_PATTERN = re.compile(r'\b(?P<unit>hari|minggu|bulan|tahun)\s+(?P<which>ini|lalu|kemarin)\b')
+
+
+class LedgerQuery:
+    """One parsed query: a day range, optionally one member and one transaction type"""
+
+    def __init__(self, start: date, end: date, label: str, member: Optional[str] = None, tipe: Optional[str] = None):
+        """
+        Initialize query
+
+        Args:
+            start: First day included
+            end: Day after the last one included
+            label: Period as shown in the reply, e.g. 'Juli 2025'
+            member: Family member name as written in the ledger, None for everyone
+            tipe: 'pemasukan' or 'pengeluaran', None for both
+        """
+        self.start = start
+        self.end = end
+        self.label = label
+        self.member = member
+        self.tipe = tipe
+
+    @property
+    def title(self) -> str:
+        """Report heading, e.g. 'Pengeluaran 01/07 - 15/07/2025 (Mama)'"""
+        title = f"{self.tipe.capitalize() if self.tipe else 'Ringkasan'} {self.label}"
+        return f"{title} ({self.member})" if self.member else title
+
+    def __repr__(self) -> str:
+        return f"LedgerQuery({self.start}, {self.end}, member={self.member!r}, tipe={self.tipe!r})"
+
+
+class QueryParser:
+    """Reads report queries, using the transaction parser's date conventions"""
+
+    def __init__(self, parser: Optional[MessageParser] = None):
+        self.parser = parser or MessageParser()
+
+    def is_query(self, message: str) -> bool:
+        """Whether a message starts with a query command and has more after it, cheap enough to call on every message"""
+        words = (message or '').split(None, 1)
+        return len(words) == 2 and words[0].lower() in QUERY_COMMANDS
+
+    def parse(self, message: str, members: Iterable[str] = (), now: Optional[datetime] = None) -> Optional[LedgerQuery]:
+        """
+        Parse a query such as 'laporan juli', 'laporan minggu ini', 'laporan Mama' or 'pengeluaran 01/07-15/07'
+
+        Args:
+            message: Message text
+            members: Member names that may follow the command
+            now: Reference time for relative periods, defaults to the current time
+
+        Returns:
+            LedgerQuery, or None if the message isn't a query. A member
+            without a period covers the current month, and a month later
+            in the year than the current one means last year's.
+        """
+        if not self.is_query(message):
+            return None
+        command, rest = message.split(None, 1)
+        tipe = QUERY_COMMANDS[command.lower()]
+        text = normalize(rest)
+        now = now or datetime.now()
+        names = {normalize(member): member for member in members if member}
+
+        # A member named like a month, such as Juni, wins over the month
+        if text in names:
+            start, end, label = month_period(now.year, now.month)
+            return LedgerQuery(start, end, label, names[text], tipe)
+
+        period, text = self._extract_period(text, now)
+        if text and text not in names:
+            return None
+        if period is None:
+            if not text:
+                return None
+            period = month_period(now.year, now.month)
+        start, end, label = period
+        return LedgerQuery(start, end, label, names.get(text), tipe)
+
+    def _extract_period(self, text: str, now: datetime) -> Tuple[Optional[Tuple[date, date, str]], str]:
+        """Find the period in a query, returning it with the text left around it"""
+        today = now.date()
+
+        match = RANGE_PATTERN.search(text)
+        if match:
+            first = self._day(match.group('start'), now)
+            last = self._day(match.group('end'), now)
+            if first is None or last is None:
+                return None, text
+            first, last = min(first, last), max(first, last)
+            label = f"{first.strftime('%d/%m')} - {last.strftime('%d/%m/%Y')}"
+            return (first, last + timedelta(days=1), label), cut(text, match.span())
+
+        match = RELATIVE_PATTERN.search(text)
+        if match:
+            return relative_period(match.group('unit'), match.group('which'), today), cut(text, match.span())
+
+        match = MONTH_PATTERN.search(text)
+        if match:
+            month = MONTHS[match.group('month')]
+            if match.group('year'):
+                year = int(match.group('year'))
+            else:
+                year = today.year if month <= today.month else today.year - 1
+            return month_period(year, month), cut(text, match.span())
+
+        # One day, in any form a transaction date can take: 15/07, kemarin, 3 hari lalu
+        tokens = self.parser.tokenize(text)
+        day = self.parser._date_from_tokens(tokens, now)
+        if day is None:
+            return None, text
+        spans = sorted(tokens.date_spans)
+        return day_period(day.date()), self.parser._remove_spans(text, spans)
+
+    def _day(self, text: str, now: datetime) -> Optional[date]:
+        """Convert one DD/MM or DD/MM/YYYY date, None if it isn't a valid day"""
+        day = self.parser._date_from_tokens(self.parser.tokenize(text), now)
+        return day.date() if day else None
+
+
+def cut(text: str, span: Tuple[int, int]) -> str:
+    """Remove a span from text and collapse whitespace"""
+    return ' '.join((text[:span[0]] + ' ' + text[span[1]:]).split())
+
+
+def day_period(day: date) -> Tuple[date, date, str]:
+    """One day as (start, end, label)"""
+    return day, day + timedelta(days=1), day.strftime('%d/%m/%Y')
+
+
+def month_period(year: int, month: int) -> Tuple[date, date, str]:
+    """One calendar month as (start, end, label)"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end, f"{MONTH_NAMES[month - 1]} {year}"
+
+
+def relative_period(unit: str, which: str, today: date) -> Tuple[date, date, str]:
+    """'hari', 'minggu', 'bulan' or 'tahun' with 'ini' (this) or 'lalu'/'kemarin' (previous) as (start, end, label)"""
+    previous = which != 'ini'
+    if unit == 'hari':
+        return day_period(today - timedelta(days=1) if previous else today)
+    if unit == 'minggu':
+        # ISO weeks, starting on Monday like the weekly digest
+        monday = today - timedelta(days=today.weekday() + (7 if previous else 0))
+        sunday = monday + timedelta(days=6)
+        return monday, sunday + timedelta(days=1), f"{monday.strftime('%d/%m')} - {sunday.strftime('%d/%m/%Y')}"
+    if unit == 'bulan':
+        if not previous:
+            return month_period(today.year, today.month)
+        last_month = today.replace(day=1) - timedelta(days=1)
+        return month_period(last_month.year, last_month.month)
+    year = today.year - 1 if previous else today.year
+    return date(year, 1, 1), date(year + 1, 1, 1), str(year)
+
+
+class SortedDates:
+    """Transactions kept sorted by date cell, found by bisection"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.entries: List[Dict] = []
+
+    def insert(self, key: str, entry: Dict):
+        """Add a transaction, after any others on the same date"""
+        # Ledgers are mostly written in date order, so this is usually an append
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.entries.append(entry)
+            return
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.entries.insert(position, entry)
+
+    def between(self, start: date, end: date) -> List[Dict]:
+        """Transactions dated from start up to but not including end"""
+        # '2025-07-15 12:00:00' sorts after '2025-07-15' and before '2025-07-16'
+        low = bisect_left(self.keys, start.isoformat())
+        high = bisect_left(self.keys, end.isoformat(), low)
+        return self.entries[low:high]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class DateIndex:
+    """All dated transactions of one ledger, overall and per member, sorted by date"""
+
+    def __init__(self, ledger, batch_size: int = 500):
+        """
+        Initialize index
+
+        Args:
+            ledger: LedgerStorage read with get_transactions_since
+            batch_size: Transactions read per call
+        """
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.cursor: Dict[str, int] = {}
+        self.transactions = SortedDates()
+        self.by_member: Dict[str, SortedDates] = {}
+        # Member name as first written in the ledger, by normalized name
+        self.member_names: Dict[str, str] = {}
+        # Old format rows without a date, left out of every range
+        self.undated = 0
+        self._lock = threading.Lock()
+
+    def add(self, transaction: Dict[str, str]):
+        """Index one transaction under its date and member"""
+        nominal = parse_nominal(transaction.get('nominal'))
+        day = transaction_date(transaction.get('tanggal', ''))
+        if nominal is None or day is None:
+            self.undated += nominal is not None
+            return
+
+        tipe = 'pemasukan' if transaction.get('tipe') == 'pemasukan' else 'pengeluaran'
+        entry = dict(transaction, tipe=tipe, nominal=nominal,
+                     kategori=transaction.get('kategori') or categorize(transaction.get('nama', ''), tipe))
+        tanggal = str(transaction.get('tanggal', '')).strip()
+        # Cells like '15/07/2025' sort under their ISO day
+        key = tanggal if tanggal.startswith(day.isoformat()) else day.isoformat()
+
+        self.transactions.insert(key, entry)
+        member = normalize(transaction.get('member', ''))
+        if member:
+            self.member_names.setdefault(member, str(transaction.get('member')).strip())
+            self.by_member.setdefault(member, SortedDates()).insert(key, entry)
+
+    def reset(self):
+        """Forget every indexed transaction, the next refresh reads the ledger from the start"""
+        with self._lock:
+            self.cursor = {}
+            self.transactions = SortedDates()
+            self.by_member = {}
+            self.member_names = {}
+            self.undated = 0
+
+    def refresh(self) -> int:
+        """
+        Index the transactions recorded since the last call
+
+        Returns:
+            Number of new transactions
+        """
+        with self._lock:
+            count = 0
+            while True:
+                transactions, cursor = self.ledger.get_transactions_since(self.cursor, self.batch_size)
+                for transaction in transactions:
+                    self.add(transaction)
+                count += len(transactions)
+                moved = cursor != self.cursor
+                self.cursor = cursor
+                if not moved or len(transactions) < self.batch_size:
+                    break
+        if count:
+            log.debug("Date index refreshed", extra={'new': count, 'indexed': len(self.transactions)})
+        return count
+
+    def members(self) -> List[str]:
+        """Names of the members found in the ledger"""
+        return list(self.member_names.values())
+
+    def between(self, start: date, end: date, member: Optional[str] = None) -> List[Dict]:
+        """Transactions from start up to but not including end, of one member if given, oldest first"""
+        if member is None:
+            return self.transactions.between(start, end)
+        dates = self.by_member.get(normalize(member))
+        return dates.between(start, end) if dates else []
+
+    def summary(self, query: LedgerQuery) -> Dict:
+        """
+        Totals of a query in the shape format_report_message expects
+
+        Args:
+            query: Period, member and type to report
+
+        Returns:
+            Dictionary with 'total_pemasukan', 'total_pengeluaran', 'saldo',
+            'categories', 'count' and the last transactions under 'recent'
+        """
+        totals = {'pemasukan': 0, 'pengeluaran': 0}
+        categories: Dict[str, Dict[str, int]] = {'pemasukan': {}, 'pengeluaran': {}}
+        matched = []
+        for entry in self.between(query.start, query.end, query.member):
+            if query.tipe and entry['tipe'] != query.tipe:
+                continue
+            totals[entry['tipe']] += entry['nominal']
+            add_category(categories, entry['tipe'], entry['kategori'], entry['nominal'])
+            matched.append(entry)
+
+        return {
+            'total_pemasukan': totals['pemasukan'],
+            'total_pengeluaran': totals['pengeluaran'],
+            'saldo': totals['pemasukan'] - totals['pengeluaran'],
+            'categories': categories,
+            'count': len(matched),
+            'recent': matched[-RECENT_LIMIT:]
+        }
+
+
+_indexes: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_date_index(ledger) -> DateIndex:
+    """The date index following a ledger, created on first use and dropped with the ledger"""
+    with _indexes_lock:
+        index = _indexes.get(ledger)
+        if index is None:
+            # A proxy, so the index doesn't keep its own key alive
+            index = _indexes[ledger] = DateIndex(weakref.proxy(ledger))
+            # Rows edited in the sheet by hand can't be followed with a cursor
+            if hasattr(ledger, 'on_invalidate'):
+                ledger.on_invalidate.append(index.reset)
+        return index
+
+
+def answer_query(query_parser: QueryParser, message: str, ledger, members: Iterable[str] = (),
+                 now: Optional[datetime] = None) -> Optional[Tuple[LedgerQuery, Dict]]:
+    """
+    Answer a report query from the ledger's date index
+
+    Args:
+        query_parser: Parser for the query
+        message: Message text
+        ledger: LedgerStorage of the sender's family
+        members: Configured member names, besides those found in the ledger
+        now: Reference time for relative periods, defaults to the current time
+
+    Returns:
+        The query and its summary, None if the message isn't a query.
+        Members found only in the ledger are recognized once the index has
+        been loaded by an earlier query.
+    """
+    index = get_date_index(ledger)
+    # Parse before reading the ledger, a transaction that merely starts with a command word costs nothing
+    query = query_parser.parse(message, list(members) + index.members(), now)
+    if query is None:
+        return None
+    if index.refresh():
+        # Members first seen in the new rows win, e.g. one named like a month
+        query = query_parser.parse(message, list(members) + index.members(), now)
+    return query, index.summary(query)
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger('dedupe')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS processed_messages (
+        sid TEXT PRIMARY KEY,
+        body TEXT,
+        status INTEGER,
+        mimetype TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_processed_messages_updated ON processed_messages (updated_at);
+'''
+
+# Response body, status code and mimetype of a handled message
+CachedResponse = Tuple[str, int, str]
+
+# Answer for a retry whose original is still being handled. It is an error so
+# Twilio tries again: if the original then fails and releases its claim, that
+# later retry saves the message instead of it being lost
+PENDING_RESPONSE: CachedResponse = ('Message is still being handled, try again later', 503, 'text/plain')
+
+
+class MessageDeduplicator:
+    """
+    Remembers the response to each Twilio MessageSid so webhook retries are answered without handling the message again
+
+    Recent responses are kept in an in-memory LRU. Every claim and response is
+    also stored in SQLite, shared by all worker processes, and kept for a TTL.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, cache_size: Optional[int] = None,
+                 wait_timeout: Optional[float] = None, stale_after: Optional[float] = None):
+        """
+        Initialize deduplicator
+
+        Args:
+            path: SQLite database file of handled messages
+            ttl: Seconds a response is replayed for
+            cache_size: Responses kept in memory
+            wait_timeout: Seconds a retry waits for the original to finish
+            stale_after: Seconds after which an unfinished claim is taken over, e.g. after a crash
+        """
+        self.path = path or os.getenv('DEDUPE_DB_PATH', os.path.join('data', 'dedupe.db'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('DEDUPE_TTL', '86400'))
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv('DEDUPE_CACHE_SIZE', '10000'))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv('DEDUPE_WAIT_TIMEOUT', '10'))
+        self.stale_after = stale_after if stale_after is not None else float(os.getenv('DEDUPE_STALE_AFTER', '120'))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[str, Tuple[CachedResponse, float]]' = OrderedDict()
+        # Messages being handled by this process, set when their response is stored
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._last_purge = 0.0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(SCHEMA)
+
+    def claim(self, sid: str) -> Tuple[str, Optional[CachedResponse]]:
+        """
+        Claim a message for handling, or get the response already given to it
+
+        Args:
+            sid: Twilio MessageSid
+
+        Returns:
+            ('new', None) if the caller should handle the message and then call
+            complete() or release(). Otherwise the source of the replayed
+            response, 'memory' or 'store', and the response. ('pending',
+            PENDING_RESPONSE) if the original is still running after
+            wait_timeout.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            outcome, response = self._try_claim(sid)
+            remaining = deadline - time.monotonic()
+            if outcome != 'pending':
+                return outcome, response
+            if remaining <= 0:
+                return outcome, PENDING_RESPONSE
+
+            # The original runs in this process, or in another worker that we poll
+            with self._lock:
+                event = self._in_flight.get(sid)
+            if event:
+                event.wait(min(remaining, 0.5))
+            else:
+                time.sleep(min(remaining, 0.05))
+
+    def _try_claim(self, sid: str) -> Tuple[str, Optional[CachedResponse]]:
+        """One claim attempt, 'pending' if someone else holds the claim"""
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(sid)
+            if cached and now - cached[1] < self.ttl:
+                self._cache.move_to_end(sid)
+                return 'memory', cached[0]
+            if sid in self._in_flight:
+                return 'pending', None
+
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    row = self._conn.execute(
+                        'SELECT body, status, mimetype, updated_at FROM processed_messages WHERE sid = ?', (sid,)
+                    ).fetchone()
+                    if row and row[0] is not None and now - row[3] < self.ttl:
+                        self._conn.execute('COMMIT')
+                        response = (row[0], row[1], row[2])
+                        self._remember(sid, response, row[3])
+                        return 'store', response
+                    if row and row[0] is None and now - row[3] < self.stale_after:
+                        self._conn.execute('COMMIT')
+                        return 'pending', None
+
+                    # Unseen, expired, or claimed by a worker that never finished
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO processed_messages (sid, body, status, mimetype, updated_at) VALUES (?, NULL, NULL, NULL, ?)',
+                        (sid, now)
+                    )
+                    self._conn.execute('COMMIT')
+                except sqlite3.Error:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error as e:
+                # Still dedupe retries reaching this process
+                log.warning("Message store unavailable, deduplicating in memory only", extra={'error': str(e)})
+
+            self._in_flight[sid] = threading.Event()
+        return 'new', None
+
+    def complete(self, sid: str, response: CachedResponse):
+        """
+        Store the response given to a claimed message and wake retries waiting for it
+
+        Args:
+            sid: Twilio MessageSid
+            response: Body, status code and mimetype sent back to Twilio
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(sid, response, now)
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO processed_messages (sid, body, status, mimetype, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    (sid, response[0], response[1], response[2], now)
+                )
+                if now - self._last_purge > 60:
+                    self._conn.execute('DELETE FROM processed_messages WHERE updated_at < ?', (now - max(self.ttl, self.stale_after),))
+                    self._last_purge = now
+            except sqlite3.Error as e:
+                log.warning("Error storing message response", extra={'error': str(e)})
+            event = self._in_flight.pop(sid, None)
+        if event:
+            event.set()
+
+    def release(self, sid: str):
+        """
+        Give up a claim without storing a response, so a retry handles the message again
+
+        Args:
+            sid: Twilio MessageSid
+        """
+        with self._lock:
+            try:
+                self._conn.execute('DELETE FROM processed_messages WHERE sid = ? AND body IS NULL', (sid,))
+            except sqlite3.Error as e:
+                log.warning("Error releasing message claim", extra={'error': str(e)})
+            event = self._in_flight.pop(sid, None)
+        if event:
+            event.set()
+
+    def _remember(self, sid: str, response: CachedResponse, stored_at: float):
+        """Add a response to the LRU, evicting the least recently used. Caller holds the lock"""
+        self._cache[sid] = (response, stored_at)
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
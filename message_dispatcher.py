@@ -0,0 +1,204 @@
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from api_scheduler import TokenBucket
+from structured_logging import get_logger, mask_phone
+from write_queue import backoff_delay
+
+log = get_logger('dispatcher')
+
+# Twilio answers these when the message was not created and trying again may work
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+OUTBOUND = metrics.counter('finance_bot_outbound_messages_total', 'Outbound WhatsApp messages, by outcome', ['status'])
+SEND_SECONDS = metrics.histogram('finance_bot_outbound_send_seconds', 'Latency of each Twilio message create call')
+
+
+def is_retryable(error: Exception) -> bool:
+    """True if a failed send can be tried again without risking a duplicate message"""
+    # Imported here so importing app.py doesn't load Twilio before the port is bound
+    import requests
+    from twilio.base.exceptions import TwilioRestException
+
+    if isinstance(error, TwilioRestException):
+        return error.status in RETRYABLE_STATUSES
+    # The request never reached Twilio. A read timeout may have created the message, so it is not retried
+    return isinstance(error, requests.exceptions.ConnectionError) and not isinstance(error, requests.exceptions.ReadTimeout)
+
+
+class OutboundMessage:
+    """A message waiting to be sent, and what happened to it"""
+
+    def __init__(self, to_number: str, body: str):
+        self.to_number = to_number
+        self.body = body
+        self.status = 'queued'
+        self.attempts = 0
+        self.sid: Optional[str] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the message is sent or has failed
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the message was sent
+        """
+        self.done.wait(timeout)
+        return self.status == 'sent'
+
+
+class OutboundDispatcher:
+    """Sends WhatsApp messages from a pool of worker threads
+
+    Each recipient is assigned to one worker by a hash of their number, so a
+    recipient's messages go out in the order they were submitted while
+    different recipients are served in parallel. Sends share one token bucket
+    sized to Twilio's throughput. Rate limits, server errors and refused
+    connections are retried with exponential backoff, holding back that
+    worker's later messages so the order is kept.
+    """
+
+    def __init__(self, send: Callable[[str, str], str], workers: Optional[int] = None, per_second: Optional[float] = None,
+                 max_retries: Optional[int] = None, max_backoff: Optional[float] = None):
+        """
+        Initialize dispatcher
+
+        Args:
+            send: Sends one message and returns its SID, raising on failure, e.g. WhatsAppBot.create_message
+            workers: Worker threads, each one owns a share of the recipients
+            per_second: Messages sent per second across all workers
+            max_retries: Retries after the first attempt before a message fails
+            max_backoff: Maximum seconds between retries
+        """
+        self.send = send
+        workers = workers or int(os.getenv('OUTBOUND_WORKERS', '4'))
+        # Twilio's default throughput for a WhatsApp sender is 80 messages per second
+        per_second = per_second or float(os.getenv('TWILIO_MESSAGES_PER_SECOND', '80'))
+        self.bucket = TokenBucket(per_second, max(per_second, 1))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OUTBOUND_MAX_RETRIES', '5'))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('OUTBOUND_MAX_BACKOFF', '30'))
+
+        self.queues: List[queue.Queue] = [queue.Queue() for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {'submitted': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index, worker_queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._run, args=(worker_queue,), name=f'outbound-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Send what is already queued, then stop the workers
+
+        Args:
+            timeout: Seconds to wait for each worker, messages still waiting to be retried fail
+        """
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        # Cut retry waits short for anything still running
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(1.0)
+        self._threads = []
+
+    def submit(self, to_number: str, body: str) -> OutboundMessage:
+        """
+        Queue a message
+
+        Args:
+            to_number: Recipient's WhatsApp number (format: whatsapp:+1234567890)
+            body: Message text
+
+        Returns:
+            The queued message, wait() on it for the outcome
+        """
+        message = OutboundMessage(to_number, body)
+        with self.lock:
+            self.stats['submitted'] += 1
+        self.queues[zlib.crc32(to_number.encode('utf-8')) % len(self.queues)].put(message)
+        return message
+
+    def broadcast(self, numbers: List[str], body: str) -> List[OutboundMessage]:
+        """Queue the same message for several recipients"""
+        return [self.submit(number, body) for number in numbers]
+
+    def pending_count(self) -> int:
+        """Messages queued or being sent"""
+        with self.lock:
+            return self.stats['submitted'] - self.stats['sent'] - self.stats['failed']
+
+    def snapshot(self) -> Dict:
+        """Counters for /health"""
+        with self.lock:
+            stats = dict(self.stats)
+        stats['pending'] = stats['submitted'] - stats['sent'] - stats['failed']
+        stats['workers'] = len(self._threads)
+        return stats
+
+    def _run(self, worker_queue: queue.Queue):
+        """Worker loop, one message at a time so each recipient's order is kept"""
+        while True:
+            message = worker_queue.get()
+            if message is None:
+                return
+            self._deliver(message)
+
+    def _throttle(self):
+        """Wait for a token from the shared bucket"""
+        wait = self.bucket.try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self.bucket.try_acquire()
+
+    def _deliver(self, message: OutboundMessage):
+        """Send one message, retrying transient failures"""
+        while True:
+            self._throttle()
+            message.attempts += 1
+            try:
+                with SEND_SECONDS.time():
+                    message.sid = self.send(message.to_number, message.body)
+                self._finish(message, 'sent')
+                return
+            except Exception as e:
+                message.error = str(e)
+                if not is_retryable(e) or message.attempts > self.max_retries or self._stopping.is_set():
+                    log.error("Message not sent", extra={'to': mask_phone(message.to_number), 'attempts': message.attempts, 'error': str(e)})
+                    self._finish(message, 'failed')
+                    return
+
+            delay = backoff_delay(message.attempts, base=1.0, cap=self.max_backoff)
+            with self.lock:
+                self.stats['retries'] += 1
+            OUTBOUND.inc(status='retried')
+            log.warning("Send failed, retrying", extra={'to': mask_phone(message.to_number), 'attempt': message.attempts, 'retry_in': round(delay, 1)})
+            self._stopping.wait(delay)
+
+    def _finish(self, message: OutboundMessage, status: str):
+        """Record a message's outcome and wake anyone waiting on it"""
+        message.status = status
+        with self.lock:
+            self.stats[status] += 1
+        OUTBOUND.inc(status=status)
+        message.done.set()
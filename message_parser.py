@@ -1,57 +1,123 @@
 import re
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 
+from categories import CategoryClassifier, get_classifier
+from structured_logging import get_logger
+
+log = get_logger('parser')
+
+TRANSACTION_TYPES = ('pemasukan', 'pengeluaran')
+
+# One pattern that splits a message into date, type and amount tokens in a
+# single pass. At each position the alternatives are tried in order, so a
+# date like 15/07/2025 is taken as a whole instead of as three numbers. The
+# leading lookahead skips positions that can't start any token.
+TOKEN_PATTERN = re.compile(r'''
+    (?=[\dkylbt''' + ''.join(sorted({t_type[0] for t_type in TRANSACTION_TYPES})) + r'''])
+    (?:
+        (?P<full_date>(?P<full_day>\d{1,2})[/\-](?P<full_month>\d{1,2})[/\-](?P<full_year>\d{4}))
+      | (?P<short_date>(?P<short_day>\d{1,2})[/\-](?P<short_month>\d{1,2})(?![/\-]\d))
+      | (?P<days_ago>(?P<days_ago_count>\d+)\s*hari\s*(?:yang\s*)?lalu)
+      | (?P<days_ahead>(?P<days_ahead_count>\d+)\s*hari\s*lagi)
+      | (?P<number>\d+(?:\.\d+)?)\s*(?:(?P<thousand>ribu|rb|k(?!emarin))|(?P<million>juta|jt|m))?
+      | (?P<yesterday>kemarin|yesterday)
+      | (?P<tomorrow>lusa|besok|tomorrow)
+      | (?P<type>''' + '|'.join(TRANSACTION_TYPES) + r''')
+    )
+''', re.VERBOSE)
+
+# When several date forms appear, the first one in this list wins
+DATE_PRIORITY = ('full_date', 'short_date', 'yesterday', 'tomorrow', 'days_ago', 'days_ahead')
+
+# Several transactions can be sent in one message, one per line or separated by ';'
+TRANSACTION_SEPARATOR = re.compile(r'[\r\n;]+')
+
+AMOUNT_MULTIPLIERS = {
+    'thousand': 1000,
+    'million': 1000000,
+    'number': 1,
+}
+
+
+class MessageTokens:
+    """Tokens found in one message"""
+    
+    __slots__ = ('types', 'dates', 'date_spans', 'amounts')
+    
+    def __init__(self):
+        # First position of each transaction type
+        self.types = {}
+        # First match of each date form
+        self.dates = {}
+        # Spans of every date token, used to strip dates from the name
+        self.date_spans = []
+        # Last match of each amount form
+        self.amounts = {}
+
+
 class MessageParser:
     """Parse WhatsApp messages for finance transactions"""
     
-    def __init__(self):
-        # Patterns for amount parsing
-        self.amount_patterns = {
-            r'(\d+(?:\.?\d+)?)\s*(?:ribu|rb|k)': lambda x: float(x) * 1000,
-            r'(\d+(?:\.?\d+)?)\s*(?:juta|jt|m)': lambda x: float(x) * 1000000,
-            r'(\d+(?:\.?\d+)?)': lambda x: float(x),
-        }
-        
+    def __init__(self, classifier: Optional[CategoryClassifier] = None):
         # Transaction types
-        self.transaction_types = ['pemasukan', 'pengeluaran']
+        self.transaction_types = list(TRANSACTION_TYPES)
+        # Tags each transaction with a category from FAMILY_CONFIG
+        self.classifier = classifier or get_classifier()
+    
+    def tokenize(self, text: str) -> MessageTokens:
+        """
+        Split lowercase message text into date, type and amount tokens
         
-        # Date patterns for parsing user input dates
-        self.date_patterns = [
-            # DD/MM/YYYY or DD-MM-YYYY
-            r'(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{4})',
-            # DD/MM or DD-MM (current year)
-            r'(\d{1,2})[\/\-](\d{1,2})(?![\/\-]\d)',
-            # Relative dates in Indonesian
-            r'(kemarin|yesterday)',
-            r'(lusa|besok|tomorrow)',
-            r'(\d+)\s*hari\s*(?:yang\s*)?lalu',
-            r'(\d+)\s*hari\s*lagi',
-        ]
-    
-    def parse_message(self, message: str) -> Optional[Dict[str, str]]:
+        Args:
+            text: Lowercase message text
+            
+        Returns:
+            MessageTokens with the tokens found
+        """
+        tokens = MessageTokens()
+        types = tokens.types
+        dates = tokens.dates
+        amounts = tokens.amounts
+        
+        for match in TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            
+            if kind in AMOUNT_MULTIPLIERS:
+                amounts[kind] = match
+            elif kind == 'type':
+                type_word = match.group(kind)
+                if type_word not in types:
+                    types[type_word] = match.start()
+            else:
+                if kind not in dates:
+                    dates[kind] = match
+                tokens.date_spans.append(match.span())
+        
+        return tokens
+    
+    def parse_message(self, message: str, now: Optional[datetime] = None) -> Optional[Dict[str, str]]:
         """
         Parse a WhatsApp message for financial transaction
         
         Args:
             message: The message text to parse
+            now: Reference time for relative dates and the default date, defaults to the current time
             
         Returns:
-            Dictionary with 'nama', 'tipe', 'nominal', 'tanggal' or None if parsing fails
+            Dictionary with 'nama', 'tipe', 'nominal', 'tanggal', 'kategori' or None if parsing fails
         """
         if not message or not isinstance(message, str):
             return None
-            
-        original_message = message.strip()
-        message = message.strip().lower()
         
-        # Parse date first (if provided)
-        parsed_date = self._parse_date(message)
+        message = message.strip().lower()
+        now = now or datetime.now()
+        tokens = self.tokenize(message)
         
         # Find transaction type
         transaction_type = None
         for t_type in self.transaction_types:
-            if t_type in message:
+            if t_type in tokens.types:
                 transaction_type = t_type
                 break
         
@@ -59,126 +125,177 @@ class MessageParser:
             return None
         
         # Parse amount
-        amount = self._parse_amount(message)
-        if amount is None:
+        amount_match = self._amount_token(tokens)
+        if amount_match is None:
             return None
+        amount = float(amount_match.group('number')) * AMOUNT_MULTIPLIERS[amount_match.lastgroup]
+        
+        # Parse date (if provided)
+        date_obj = self._date_from_tokens(tokens, now)
         
-        # Extract name (everything before the transaction type, excluding date)
-        type_index = message.find(transaction_type)
+        # Extract name (everything before the transaction type, excluding date and amount)
+        type_index = tokens.types[transaction_type]
         name_part = message[:type_index].strip()
         
-        # Remove date from name if it was parsed
-        if parsed_date and parsed_date != datetime.now().strftime('%Y-%m-%d %H:%M:%S'):
-            name_part = self._remove_date_from_text(name_part, original_message)
+        spans = list(tokens.date_spans) if date_obj else []
+        if amount_match.end() <= type_index:
+            # Amount written before the type, e.g. "makan 20rb pengeluaran"
+            spans.append(amount_match.span())
+        if spans:
+            name_part = self._remove_spans(message[:type_index], sorted(spans)) or name_part
         
         if not name_part:
             return None
         
-        transaction = {
+        return {
             'nama': name_part,
             'tipe': transaction_type,
-            'nominal': str(int(amount))
+            'nominal': str(int(amount)),
+            'tanggal': self._format_date(date_obj or now),
+            'kategori': self.classifier.classify(name_part, transaction_type)
         }
+    
+    def parse_transactions(self, message: str, now: Optional[datetime] = None) -> Tuple[List[Dict[str, str]], List[str]]:
+        """
+        Parse a message that may hold several transactions
         
-        # Add date if parsed
-        if parsed_date:
-            transaction['tanggal'] = parsed_date
+        Args:
+            message: The message text, one transaction per line or separated by ';'
+            now: Reference time for relative dates and the default date, defaults to the current time
+            
+        Returns:
+            Tuple of (valid transactions, lines that could not be parsed)
+        """
+        if not message or not isinstance(message, str):
+            return [], []
         
-        return transaction
-    
-    def _parse_amount(self, text: str) -> Optional[float]:
-        """Extract and convert amount from text"""
-        for pattern, converter in self.amount_patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                try:
-                    # Use the last match found (usually the amount)
-                    return converter(matches[-1])
-                except (ValueError, IndexError):
-                    continue
-        return None
+        now = now or datetime.now()
+        transactions = []
+        rejected = []
+        
+        for line in TRANSACTION_SEPARATOR.split(message):
+            line = line.strip()
+            if not line:
+                continue
+            transaction = self.parse_message(line, now)
+            if transaction and self.validate_transaction(transaction):
+                transactions.append(transaction)
+            else:
+                rejected.append(line)
+        
+        return transactions, rejected
     
-    def _parse_date(self, text: str) -> Optional[str]:
-        """Parse date from text and return formatted date string"""
-        try:
-            # Check for explicit date patterns
-            for pattern in self.date_patterns:
-                matches = re.search(pattern, text, re.IGNORECASE)
-                if matches:
-                    return self._convert_date_match(matches, pattern)
+    def rejection_reason(self, message: str) -> str:
+        """
+        Explain why a line was rejected, for metrics
+        
+        Args:
+            message: A line returned as rejected by parse_transactions
             
-            # If no date found, return current datetime
-            return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        Returns:
+            'no_type', 'no_amount', 'no_name' or 'invalid'
+        """
+        tokens = self.tokenize((message or '').strip().lower())
+        if not any(t_type in tokens.types for t_type in self.transaction_types):
+            return 'no_type'
+        if self._amount_token(tokens) is None:
+            return 'no_amount'
+        if self.parse_message(message) is None:
+            return 'no_name'
+        return 'invalid'
+    
+    def parse_many(self, messages: Iterable[Union[str, Tuple[str, datetime]]]) -> Iterator[Optional[Dict[str, str]]]:
+        """
+        Parse a stream of messages lazily
+        
+        Args:
+            messages: Message texts, or (text, sent_at) pairs so relative dates
+                like 'kemarin' resolve against when the message was sent
             
-        except Exception as e:
-            print(f"Error parsing date: {e}")
-            return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        Yields:
+            Transaction dictionary or None for each message, in input order
+        """
+        for item in messages:
+            if isinstance(item, tuple):
+                yield self.parse_message(item[0], item[1])
+            else:
+                yield self.parse_message(item)
+    
+    def _amount_token(self, tokens: MessageTokens):
+        """Pick the amount token, preferring ribu over juta over plain numbers"""
+        for kind in AMOUNT_MULTIPLIERS:
+            if kind in tokens.amounts:
+                # The last match found is usually the amount
+                return tokens.amounts[kind]
+        return None
+    
+    def _date_from_tokens(self, tokens: MessageTokens, now: datetime) -> Optional[datetime]:
+        """Convert the highest priority date token, None if there is none or it is invalid"""
+        for kind in DATE_PRIORITY:
+            match = tokens.dates.get(kind)
+            if match:
+                return self._convert_date_token(kind, match, now)
+        return None
     
-    def _convert_date_match(self, match, pattern: str) -> str:
-        """Convert regex match to formatted date string"""
+    def _convert_date_token(self, kind: str, match, now: datetime) -> Optional[datetime]:
+        """Convert a date token to a datetime that keeps the time of `now`"""
         try:
-            groups = match.groups()
-            
             # DD/MM/YYYY or DD-MM-YYYY
-            if r'(\d{4})' in pattern:
-                day, month, year = int(groups[0]), int(groups[1]), int(groups[2])
-                date_obj = datetime(year, month, day)
+            if kind == 'full_date':
+                date_obj = datetime(int(match.group('full_year')), int(match.group('full_month')), int(match.group('full_day')))
             
             # DD/MM or DD-MM (current year)
-            elif len(groups) == 2 and groups[0].isdigit():
-                day, month = int(groups[0]), int(groups[1])
-                current_year = datetime.now().year
-                date_obj = datetime(current_year, month, day)
+            elif kind == 'short_date':
+                date_obj = datetime(now.year, int(match.group('short_month')), int(match.group('short_day')))
             
             # Relative dates
-            elif 'kemarin' in groups[0] or 'yesterday' in groups[0]:
-                date_obj = datetime.now() - timedelta(days=1)
-            
-            elif 'lusa' in groups[0] or 'besok' in groups[0] or 'tomorrow' in groups[0]:
-                date_obj = datetime.now() + timedelta(days=1)
+            elif kind == 'yesterday':
+                date_obj = now - timedelta(days=1)
             
-            elif 'hari' in pattern and 'lalu' in pattern:
-                days_ago = int(groups[0])
-                date_obj = datetime.now() - timedelta(days=days_ago)
+            elif kind == 'tomorrow':
+                date_obj = now + timedelta(days=1)
             
-            elif 'hari' in pattern and 'lagi' in pattern:
-                days_ahead = int(groups[0])
-                date_obj = datetime.now() + timedelta(days=days_ahead)
+            elif kind == 'days_ago':
+                date_obj = now - timedelta(days=int(match.group('days_ago_count')))
             
             else:
-                return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                date_obj = now + timedelta(days=int(match.group('days_ahead_count')))
             
             # Keep current time but use parsed date
-            current_time = datetime.now().time()
-            final_datetime = datetime.combine(date_obj.date(), current_time)
+            return datetime.combine(date_obj.date(), now.time())
             
-            return final_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            
-        except (ValueError, IndexError) as e:
-            print(f"Error converting date: {e}")
-            return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    def _remove_date_from_text(self, text: str, original_text: str) -> str:
-        """Remove date patterns from transaction name"""
-        cleaned_text = text
-        
-        # Remove common date patterns from the text
-        date_removal_patterns = [
-            r'\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4}',
-            r'\d{1,2}[\/\-]\d{1,2}(?![\/\-]\d)',
-            r'kemarin|yesterday',
-            r'lusa|besok|tomorrow',
-            r'\d+\s*hari\s*(?:yang\s*)?lalu',
-            r'\d+\s*hari\s*lagi',
-        ]
-        
-        for pattern in date_removal_patterns:
-            cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE).strip()
-        
-        # Clean up extra spaces
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-        
-        return cleaned_text if cleaned_text else text
+        except (ValueError, OverflowError) as e:
+            log.debug("Invalid date in message", extra={'kind': kind, 'token': match.group(0), 'error': str(e)})
+            return None
+    
+    def _format_date(self, date_obj: datetime) -> str:
+        """Format a datetime as 'YYYY-MM-DD HH:MM:SS', faster than strftime"""
+        return date_obj.isoformat(sep=' ', timespec='seconds')
+    
+    def _remove_spans(self, text: str, spans) -> str:
+        """Cut the given spans out of text and collapse whitespace"""
+        pieces = []
+        position = 0
+        for start, end in spans:
+            if start >= len(text):
+                break
+            pieces.append(text[position:start])
+            position = end
+        pieces.append(text[position:])
+        return ' '.join(''.join(pieces).split())
+    
+    def _parse_amount(self, text: str) -> Optional[float]:
+        """Extract and convert amount from text"""
+        match = self._amount_token(self.tokenize(text.lower()))
+        if match is None:
+            return None
+        return float(match.group('number')) * AMOUNT_MULTIPLIERS[match.lastgroup]
+    
+    def _parse_date(self, text: str, now: Optional[datetime] = None) -> Optional[str]:
+        """Parse date from text and return formatted date string"""
+        now = now or datetime.now()
+        date_obj = self._date_from_tokens(self.tokenize(text.lower()), now)
+        return self._format_date(date_obj or now)
     
     def validate_transaction(self, transaction: Dict[str, str]) -> bool:
         """Validate that the transaction has all required fields"""
@@ -0,0 +1,209 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from parser-fast to Google-API-slow
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render a label set like {operation="append"}"""
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    """Render a sample value, integers without a decimal point"""
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    """Base for metrics with an optional set of label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize metric
+
+        Args:
+            name: Metric name, e.g. 'finance_bot_parse_seconds'
+            help_text: One line description shown in the exposition
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in labelnames order"""
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for the current values"""
+
+    def render(self) -> str:
+        """HELP, TYPE and sample lines"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to the count of one label set"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Current count of one label set"""
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (last one is +Inf), sum and count
+        self.values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        """Record one observation"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent inside the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        """Number of observations of one label set"""
+        with self.lock:
+            state = self.values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self.values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else format_value(bound)
+                labels = format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Value read from a function at scrape time, e.g. a queue depth"""
+
+    def __init__(self, name: str, help_text: str, function: Callable[[], Optional[float]], kind: str = 'gauge'):
+        """
+        Initialize callback metric
+
+        Args:
+            name: Metric name
+            help_text: One line description
+            function: Returns the current value, or None to leave the sample out
+            kind: 'gauge', or 'counter' for totals kept elsewhere
+        """
+        super().__init__(name, help_text)
+        self.function = function
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.function()
+        except Exception:
+            value = None
+        return [] if value is None else [f"{self.name} {format_value(value)}"]
+
+
+class Registry:
+    """Metrics exposed together on /metrics"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, returning the one already registered under that name if any"""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Content type of the text exposition format, Flask adds the charset
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create and register a counter"""
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Create and register a histogram"""
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def callback(name: str, help_text: str, function: Callable[[], Optional[float]], kind: str = 'gauge') -> CallbackMetric:
+    """Create and register a metric read from a function at scrape time"""
+    return REGISTRY.register(CallbackMetric(name, help_text, function, kind))
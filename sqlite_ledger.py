@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""
+Local SQLite ledger, the system of record when LEDGER_BACKEND=sqlite
+
+Every transaction is committed locally first and answered from indexed
+queries. SheetsMirror copies new rows to Google Sheets in the background.
+
+Usage:
+    python sqlite_ledger.py status    # row counts and rows waiting for the mirror
+    python sqlite_ledger.py mirror    # run the mirror as its own process
+"""
+
+import argparse
+import os
+import signal
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from categories import categorize
+from ledger_cache import UNDATED, month_key, parse_nominal, row_to_transaction, transaction_to_row
+from storage import LedgerStorage
+from structured_logging import get_logger
+from write_queue import SheetsFlusher, WriteBehindQueue
+
+log = get_logger('ledger')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tanggal TEXT NOT NULL,
+        member TEXT NOT NULL,
+        nama TEXT NOT NULL,
+        tipe TEXT NOT NULL,
+        nominal NOT NULL,
+        amount INTEGER,
+        month TEXT,
+        kategori TEXT,
+        mirrored INTEGER NOT NULL DEFAULT 0,
+        claimed_by TEXT,
+        claimed_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_transactions_tanggal ON transactions (tanggal);
+    CREATE INDEX IF NOT EXISTS idx_transactions_month ON transactions (month, tipe, amount);
+    CREATE INDEX IF NOT EXISTS idx_transactions_member ON transactions (member, month, tipe, amount);
+    CREATE INDEX IF NOT EXISTS idx_transactions_unmirrored ON transactions (id) WHERE mirrored = 0;
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+'''
+
+# Created after ledgers from before the kategori column have been migrated
+CATEGORY_INDEX = 'CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (month, tipe, kategori, amount)'
+
+# Columns of a transaction dictionary, in sheet order
+TRANSACTION_COLUMNS = ('tanggal', 'member', 'nama', 'tipe', 'nominal', 'kategori')
+
+
+def row_to_record(row: List, mirrored: bool) -> Optional[Tuple]:
+    """
+    Convert a raw sheet row to a transactions table record
+
+    Args:
+        row: Row values in sheet column order, old 3-column rows included
+        mirrored: Whether the row is already in Google Sheets
+
+    Returns:
+        Values for the insert statement, None if the row is too short
+    """
+    transaction = row_to_transaction(row)
+    if not transaction:
+        return None
+
+    # Old format rows have no date and count in every month, like the sheet reports
+    month = month_key(str(transaction['tanggal'])) if len(row) >= 5 else UNDATED
+
+    return (
+        str(transaction['tanggal']),
+        str(transaction['member']),
+        str(transaction['nama']),
+        str(transaction['tipe']),
+        transaction['nominal'],
+        parse_nominal(transaction['nominal']),
+        month,
+        str(transaction['kategori']),
+        int(mirrored)
+    )
+
+
+class SQLiteLedger(LedgerStorage):
+    """Transactions stored in a local SQLite database, indexed by date, month, member and type"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize SQLite ledger
+
+        Args:
+            path: SQLite database file, shared by every worker process
+        """
+        self.path = path or os.getenv('LEDGER_DB_PATH', os.path.join('data', 'ledger.db'))
+
+        # Called after every local commit, e.g. to wake the mirror
+        self.on_write: Optional[Callable[[], None]] = None
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.execute(CATEGORY_INDEX)
+
+    def _migrate(self):
+        """Add the kategori column to a ledger created before it existed, classifying the rows already there"""
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(transactions)')}
+        if 'kategori' in columns:
+            return
+
+        migrated = False
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another worker may have migrated while we waited for the lock
+                columns = {row[1] for row in self._conn.execute('PRAGMA table_info(transactions)')}
+                if 'kategori' not in columns:
+                    migrated = True
+                    self._conn.execute('ALTER TABLE transactions ADD COLUMN kategori TEXT')
+                    rows = self._conn.execute('SELECT id, nama, tipe FROM transactions').fetchall()
+                    self._conn.executemany(
+                        'UPDATE transactions SET kategori = ? WHERE id = ?',
+                        [(categorize(nama, tipe), row_id) for row_id, nama, tipe in rows]
+                    )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+        if migrated:
+            print(f"[INFO] Added categories to the {len(rows)} transactions in {self.path}")
+
+    def _insert(self, records: List[Tuple], meta: Optional[Dict[str, str]] = None):
+        """Insert records and meta values in one local commit"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany('''
+                    INSERT INTO transactions (tanggal, member, nama, tipe, nominal, amount, month, kategori, mirrored)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', records)
+                if meta:
+                    self._conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', meta.items())
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def add_transaction(self, transaction: Dict[str, str]) -> bool:
+        """
+        Record a transaction locally, the mirror copies it to Google Sheets later
+
+        Args:
+            transaction: Dictionary with 'nama', 'tipe', 'nominal', 'member', and optionally 'tanggal' keys
+
+        Returns:
+            True if the transaction was committed, False otherwise
+        """
+        return self.add_transactions([transaction])
+
+    def add_transactions(self, transactions: List[Dict[str, str]], meta: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Record several transactions in one local commit
+
+        Args:
+            transactions: Transaction dictionaries as accepted by add_transaction
+            meta: Values stored under their keys in the same commit, e.g. import progress
+
+        Returns:
+            True if the transactions were committed, False otherwise
+        """
+        records = [row_to_record(transaction_to_row(transaction), mirrored=False) for transaction in transactions]
+
+        try:
+            self._insert(records, meta)
+        except sqlite3.Error as e:
+            log.error("Error saving transactions to local ledger", extra={'error': str(e)})
+            return False
+
+        if records and self.on_write:
+            self.on_write()
+        return True
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Value stored under a key with add_transactions, None if there is none"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def needs_bootstrap(self) -> bool:
+        """True until the ledger has been filled from the existing sheet"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'bootstrapped'").fetchone() is None
+
+    def bootstrap(self, rows: List[List[str]]) -> int:
+        """
+        Fill an empty ledger with the rows already in Google Sheets
+
+        Args:
+            rows: Raw sheet rows without the header
+
+        Returns:
+            Number of rows copied, 0 if another worker already did it
+        """
+        records = [record for record in (row_to_record(row, mirrored=True) for row in rows) if record]
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = 'bootstrapped'").fetchone():
+                    self._conn.execute('ROLLBACK')
+                    return 0
+                self._conn.executemany('''
+                    INSERT INTO transactions (tanggal, member, nama, tipe, nominal, amount, month, kategori, mirrored)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', records)
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('bootstrapped', ?)",
+                    (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),)
+                )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+        return len(records)
+
+    def get_recent_transactions(self, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Get recent transactions
+
+        Args:
+            limit: Maximum number of transactions to return
+
+        Returns:
+            List of transaction dictionaries, oldest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT tanggal, member, nama, tipe, nominal, kategori FROM transactions ORDER BY id DESC LIMIT ?',
+                (max(limit, 0),)
+            ).fetchall()
+        return [dict(zip(TRANSACTION_COLUMNS, row)) for row in reversed(rows)]
+
+    def get_transactions_page(self, limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        Get one page of transactions, walking back from the newest by row id
+
+        Args:
+            limit: Maximum number of transactions in the page
+            cursor: Row id the previous page started at, None for the newest transactions
+
+        Returns:
+            Transactions oldest first and the cursor of the next, older page, None after the oldest one
+        """
+        before = int(cursor) if cursor else None
+        query = 'SELECT id, tanggal, member, nama, tipe, nominal, kategori FROM transactions'
+        params: List = []
+        if before is not None:
+            query += ' WHERE id < ?'
+            params.append(before)
+        # One extra row tells whether an older page exists
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(max(limit, 0) + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        page = rows[:max(limit, 0)]
+        next_cursor = str(page[-1][0]) if page and len(rows) > len(page) else None
+        return [dict(zip(TRANSACTION_COLUMNS, row[1:])) for row in reversed(page)], next_cursor
+
+    def get_transactions_since(self, cursor: Dict[str, int], limit: int = 500) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """
+        Get transactions committed after a cursor
+
+        Args:
+            cursor: {'id': last row id seen}, {} to start at the first transaction
+            limit: Maximum number of transactions to return
+
+        Returns:
+            Transactions in commit order and the cursor to pass next time
+        """
+        last_id = cursor.get('id', 0)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, tanggal, member, nama, tipe, nominal, kategori FROM transactions WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id, max(limit, 0))
+            ).fetchall()
+        if rows:
+            last_id = rows[-1][0]
+        return [dict(zip(TRANSACTION_COLUMNS, row[1:])) for row in rows], {'id': last_id}
+
+    def _month_totals(self, month: str, member: Optional[str] = None) -> Tuple[int, int]:
+        """Income and expense totals for a month, including undated old format rows"""
+        query = '''
+            SELECT tipe = 'pemasukan', SUM(amount) FROM transactions
+            WHERE month IN (?, ?) AND amount IS NOT NULL
+        '''
+        params = [month, UNDATED]
+        if member is not None:
+            query += ' AND member = ?'
+            params.append(member)
+        query += " GROUP BY tipe = 'pemasukan'"
+
+        with self._lock:
+            totals = dict(self._conn.execute(query, params).fetchall())
+        # Anything that isn't income counts as expense
+        return totals.get(1, 0) or 0, totals.get(0, 0) or 0
+
+    def _category_totals(self, month: str) -> Dict[str, Dict[str, int]]:
+        """Totals of each category for a month under 'pemasukan' and 'pengeluaran', including undated old format rows"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT tipe = 'pemasukan', kategori, SUM(amount) FROM transactions
+                WHERE month IN (?, ?) AND amount IS NOT NULL
+                GROUP BY tipe = 'pemasukan', kategori
+            ''', (month, UNDATED)).fetchall()
+
+        categories: Dict[str, Dict[str, int]] = {'pemasukan': {}, 'pengeluaran': {}}
+        for is_income, kategori, total in rows:
+            if total:
+                categories['pemasukan' if is_income else 'pengeluaran'][kategori] = total
+        return categories
+
+    def get_monthly_summary(self) -> Dict:
+        """Get monthly financial summary for family"""
+        try:
+            current_month = datetime.now().strftime('%Y-%m')
+            total_pemasukan, total_pengeluaran = self._month_totals(current_month)
+            categories = self._category_totals(current_month)
+
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT tanggal, member, nama, tipe, amount, kategori FROM transactions
+                    WHERE amount IS NOT NULL ORDER BY id DESC LIMIT 5
+                ''').fetchall()
+
+            return {
+                'total_pemasukan': total_pemasukan,
+                'total_pengeluaran': total_pengeluaran,
+                'saldo': total_pemasukan - total_pengeluaran,
+                'categories': categories,
+                'recent': [dict(zip(TRANSACTION_COLUMNS, row)) for row in reversed(rows)]
+            }
+
+        except sqlite3.Error as e:
+            log.error("Error getting summary", extra={'error': str(e)})
+            return {'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'recent': []}
+
+    def get_current_balance(self) -> int:
+        """Get current balance"""
+        summary = self.get_monthly_summary()
+        return summary.get('saldo', 0)
+
+    def _balance(self, member: Optional[str] = None) -> int:
+        """All-time balance, for one member if given"""
+        query = "SELECT SUM(CASE WHEN tipe = 'pemasukan' THEN amount ELSE -amount END) FROM transactions"
+        params = []
+        if member is not None:
+            query += ' WHERE member = ?'
+            params.append(member)
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0] or 0
+
+    def get_member_summary(self, member: str, month: Optional[str] = None) -> Dict:
+        """
+        Get one family member's totals for a month
+
+        Args:
+            member: Family member display name
+            month: Month in 'YYYY-MM' format, defaults to the current month
+
+        Returns:
+            Dictionary with 'total_pemasukan', 'total_pengeluaran', 'saldo' and the member's running 'balance'
+        """
+        try:
+            month = month or datetime.now().strftime('%Y-%m')
+            total_pemasukan, total_pengeluaran = self._month_totals(month, member)
+
+            return {
+                'member': member,
+                'total_pemasukan': total_pemasukan,
+                'total_pengeluaran': total_pengeluaran,
+                'saldo': total_pemasukan - total_pengeluaran,
+                'balance': self._balance(member)
+            }
+
+        except sqlite3.Error as e:
+            log.error("Error getting member summary", extra={'error': str(e)})
+            return {'member': member, 'total_pemasukan': 0, 'total_pengeluaran': 0, 'saldo': 0, 'balance': 0}
+
+    def get_running_balance(self) -> int:
+        """Get the all-time balance across every transaction"""
+        try:
+            return self._balance()
+        except sqlite3.Error as e:
+            log.error("Error getting running balance", extra={'error': str(e)})
+            return 0
+
+    def test_connection(self) -> bool:
+        """Check that the database can be queried"""
+        try:
+            with self._lock:
+                self._conn.execute('SELECT 1 FROM transactions LIMIT 1').fetchall()
+            return True
+        except sqlite3.Error as e:
+            print(f"[ERROR] Local ledger unavailable: {str(e)}")
+            return False
+
+    def row_count(self) -> int:
+        """Number of transactions in the ledger"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def unmirrored_count(self) -> int:
+        """Number of transactions not yet copied to Google Sheets"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM transactions WHERE mirrored = 0').fetchone()[0]
+
+
+class SheetsMirror(SheetsFlusher):
+    """Background worker copying new local ledger rows to Google Sheets, in ledger order"""
+
+    def __init__(self, ledger: SQLiteLedger, sheets_manager, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_backoff: Optional[float] = None):
+        """
+        Initialize Sheets mirror
+
+        Args:
+            ledger: Local ledger holding the rows
+            sheets_manager: GoogleSheetsManager used to append the rows
+            batch_size: Maximum rows written per append call
+            flush_interval: Seconds between checks for new rows
+            max_backoff: Maximum seconds to wait between failed writes
+        """
+        super().__init__(
+            sheets_manager,
+            batch_size=batch_size or int(os.getenv('LEDGER_MIRROR_BATCH_SIZE', '100')),
+            flush_interval=flush_interval if flush_interval is not None else float(os.getenv('LEDGER_MIRROR_INTERVAL', '1')),
+            max_backoff=max_backoff if max_backoff is not None else float(os.getenv('LEDGER_MIRROR_MAX_BACKOFF', '60')),
+            name='sheets-mirror'
+        )
+        self.ledger = ledger
+        ledger.on_write = self.wakeup
+
+    def pending_count(self) -> int:
+        """Number of rows not yet written to Google Sheets"""
+        return self.ledger.unmirrored_count()
+
+    def _claim_batch(self) -> List[Tuple[int, List]]:
+        """Claim the oldest unmirrored rows so mirrors in other workers skip them"""
+        conn = self.ledger._conn
+        now = time.time()
+        with self.ledger._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    UPDATE transactions SET claimed_by = ?, claimed_at = ?
+                    WHERE id IN (
+                        SELECT id FROM transactions
+                        WHERE mirrored = 0 AND (claimed_by IS NULL OR claimed_at < ?)
+                        ORDER BY id LIMIT ?
+                    )
+                ''', (self._worker_id, now, now - self.claim_timeout, self.batch_size))
+                batch = conn.execute('''
+                    SELECT id, tanggal, member, nama, tipe, nominal, kategori FROM transactions
+                    WHERE mirrored = 0 AND claimed_by = ? AND claimed_at = ? ORDER BY id
+                ''', (self._worker_id, now)).fetchall()
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        return [(row[0], list(row[1:])) for row in batch]
+
+    def _release_batch(self, ids: List[int], written: bool):
+        """Mark written rows as mirrored, or hand them back for a retry"""
+        placeholders = ','.join('?' * len(ids))
+        with self.ledger._lock:
+            if written:
+                self.ledger._conn.execute(
+                    f'UPDATE transactions SET mirrored = 1, claimed_by = NULL, claimed_at = NULL WHERE id IN ({placeholders})', ids
+                )
+            else:
+                self.ledger._conn.execute(
+                    f'UPDATE transactions SET claimed_by = NULL, claimed_at = NULL WHERE id IN ({placeholders})', ids
+                )
+
+
+def bootstrap_from_sheets(ledger: SQLiteLedger, sheets_manager) -> int:
+    """
+    Fill a new local ledger with the rows already in Google Sheets
+
+    Rows the sheets backend left in the write-behind queue are written to the
+    sheet first, so they are part of the copy.
+
+    Returns:
+        Number of rows copied, 0 if the ledger was already filled
+    """
+    if not ledger.needs_bootstrap():
+        return 0
+
+    queue_path = os.getenv('WRITE_QUEUE_PATH', os.path.join('data', 'write_queue.db'))
+    if os.path.exists(queue_path):
+        written = WriteBehindQueue(sheets_manager, path=queue_path).flush()
+        if written:
+            print(f"[INFO] Wrote {written} rows left in the write-behind queue")
+
+    copied = ledger.bootstrap(sheets_manager.get_all_rows())
+    print(f"[INFO] Local ledger filled with {copied} rows from Google Sheets")
+    return copied
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Inspect the local ledger or run its Google Sheets mirror')
+    arg_parser.add_argument('command', choices=['status', 'mirror'])
+    args = arg_parser.parse_args()
+
+    load_dotenv()
+    ledger = SQLiteLedger()
+
+    if args.command == 'status':
+        print(f"[INFO] {ledger.path}: {ledger.row_count()} transactions, {ledger.unmirrored_count()} waiting for Google Sheets")
+        return
+
+    from google_sheets_manager import GoogleSheetsManager
+
+    mirror = SheetsMirror(ledger, GoogleSheetsManager())
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+
+    print(f"[INFO] Mirroring {ledger.path} to Google Sheets ({mirror.pending_count()} rows waiting)")
+    mirror.start()
+    try:
+        # The mirror thread checks for rows written by other processes every interval
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    mirror.stop()
+
+
+if __name__ == '__main__':
+    main()
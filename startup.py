@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StartupState:
+    """Readiness and phase timings of the bot's startup, readable without any API calls"""
+
+    def __init__(self):
+        """Initialize startup state, counting from the moment it is created"""
+        self.created_at = time.time()
+        self._created = time.perf_counter()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.status = 'starting'
+        self.attempts = 0
+        self.error = None
+        self.ready_after = None
+        self.phases: Dict[str, float] = {}
+
+    @property
+    def ready(self) -> bool:
+        """True once every component has been initialized"""
+        return self._ready.is_set()
+
+    def begin_attempt(self):
+        """Record the start of an initialization attempt"""
+        with self._lock:
+            self.attempts += 1
+            self.status = 'initializing'
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time one startup phase
+
+        Args:
+            name: Phase name shown in the timings
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self):
+        """Record that startup finished"""
+        with self._lock:
+            self.status = 'ready'
+            self.error = None
+            self.ready_after = round(time.perf_counter() - self._created, 4)
+        self._ready.set()
+
+    def mark_failed(self, error: str):
+        """
+        Record a failed initialization attempt
+
+        Args:
+            error: Reason the attempt failed
+        """
+        with self._lock:
+            self.status = 'failed'
+            self.error = error
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for startup to finish
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the components are ready
+        """
+        return self._ready.wait(timeout)
+
+    def summary(self) -> str:
+        """One line describing where startup time went"""
+        with self._lock:
+            parts = [f"{name} {seconds:.2f}s" for name, seconds in self.phases.items()]
+            total = f"{self.ready_after:.2f}s" if self.ready_after is not None else 'n/a'
+        return f"ready after {total} ({', '.join(parts)})"
+
+    def snapshot(self) -> Dict:
+        """Startup state as a JSON-friendly dictionary"""
+        with self._lock:
+            return {
+                'status': self.status,
+                'ready': self._ready.is_set(),
+                'attempts': self.attempts,
+                'error': self.error,
+                'uptime_seconds': round(time.perf_counter() - self._created, 3),
+                'ready_after_seconds': self.ready_after,
+                'phases': dict(self.phases)
+            }
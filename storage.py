@@ -0,0 +1,75 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+class LedgerStorage(ABC):
+    """Where transactions are recorded and where reports read them from"""
+
+    @abstractmethod
+    def add_transaction(self, transaction: Dict[str, str]) -> bool:
+        """
+        Record a transaction
+
+        Args:
+            transaction: Dictionary with 'nama', 'tipe', 'nominal', 'member', and optionally 'tanggal' keys
+
+        Returns:
+            True if the transaction was stored, False otherwise
+        """
+
+    @abstractmethod
+    def add_transactions(self, transactions: List[Dict[str, str]]) -> bool:
+        """Record several transactions at once, True if all of them were stored"""
+
+    @abstractmethod
+    def get_recent_transactions(self, limit: int = 10) -> List[Dict[str, str]]:
+        """Get the last `limit` transactions in ledger order"""
+
+    @abstractmethod
+    def get_transactions_page(self, limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        Get one page of transactions, newest page first
+
+        Args:
+            limit: Maximum number of transactions in the page
+            cursor: Cursor returned with the previous page, None for the newest transactions
+
+        Returns:
+            Transactions in ledger order and the cursor of the next, older page, None after the oldest one
+
+        Raises:
+            ValueError: If the cursor wasn't returned by this ledger
+        """
+
+    @abstractmethod
+    def get_transactions_since(self, cursor: Dict[str, int], limit: int = 500) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """
+        Get transactions recorded after a cursor, for consumers that only want new rows
+
+        Args:
+            cursor: Cursor returned by the previous call, {} to start at the first transaction
+            limit: Maximum number of transactions to return
+
+        Returns:
+            Transactions in ledger order and the cursor to pass next time
+        """
+
+    @abstractmethod
+    def get_monthly_summary(self) -> Dict:
+        """Get the current month's 'total_pemasukan', 'total_pengeluaran', 'saldo', per-category totals under 'categories' when the backend can split them, and 'recent' transactions"""
+
+    @abstractmethod
+    def get_current_balance(self) -> int:
+        """Get the current month's balance"""
+
+    @abstractmethod
+    def get_member_summary(self, member: str, month: Optional[str] = None) -> Dict:
+        """Get one family member's totals for a month, defaulting to the current month"""
+
+    @abstractmethod
+    def get_running_balance(self) -> int:
+        """Get the all-time balance across every transaction"""
+
+    @abstractmethod
+    def test_connection(self) -> bool:
+        """Check that the storage can be reached"""
@@ -0,0 +1,202 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# Request ID of the request being handled on this thread, '-' outside requests
+request_id_var: ContextVar[str] = ContextVar('request_id', default='-')
+
+LOGGER_NAME = 'finance_bot'
+
+PHONE_PATTERN = re.compile(r'(\+?\d)(\d+)(\d{4})')
+
+# Attributes every LogRecord has, everything else came in through extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def mask_phone(number: str) -> str:
+    """
+    Hide the middle digits of a phone number
+
+    Args:
+        number: Number like 'whatsapp:+6281234567890'
+
+    Returns:
+        Number like 'whatsapp:+62*******7890'
+    """
+    if not number:
+        return number
+    return PHONE_PATTERN.sub(lambda m: m.group(1) + m.group(2)[:1] + '*' * (len(m.group(2)) - 1) + m.group(3), number)
+
+
+def new_request_id() -> str:
+    """Short random request ID"""
+    return uuid.uuid4().hex[:16]
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the bot's namespace, e.g. get_logger('webhook'), setting up logging on first use"""
+    configure_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID on the thread that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keep only a fraction of DEBUG records, everything above passes"""
+
+    def __init__(self, rate: float):
+        """
+        Initialize sampler
+
+        Args:
+            rate: Fraction of DEBUG records kept, between 0 and 1
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format the message here, the arguments may change after the call returns
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Write to whatever sys.stdout is at the time, so redirected output is followed"""
+
+    def emit(self, record: logging.LogRecord):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the time, level, request ID and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The console style used by print(), '[LEVEL] message', with extra fields appended"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        extra = ' '.join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_')
+        )
+        line = f"[{record.levelname}] {record.getMessage()}"
+        if extra:
+            line += f" ({extra})"
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+def configure_logging() -> logging.Logger:
+    """
+    Send the bot's log records through a queue to a background writer thread
+
+    Request threads only format the message and put it on a bounded queue, the
+    listener thread does the JSON encoding and the write to stdout. Safe to
+    call more than once.
+
+    Returns:
+        The bot's root logger
+    """
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    with _configure_lock:
+        if _listener is not None:
+            return logger
+
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(RequestContextFilter())
+        queue_handler.addFilter(DebugSampler(float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01'))))
+
+        stream_handler = StdoutHandler()
+        if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(TextFormatter())
+
+        logger.handlers = [queue_handler]
+        logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    return logger
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def dropped_records() -> int:
+    """Records dropped because the queue was full"""
+    logger = logging.getLogger(LOGGER_NAME)
+    return sum(getattr(handler, 'dropped', 0) for handler in logger.handlers)
+
@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from structured_logging import get_logger, mask_phone
+
+log = get_logger('tenants')
+
+# Tenant ids name a directory, so they are kept to safe characters
+TENANT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+TENANT_MANAGERS_CREATED = metrics.counter('finance_bot_tenant_managers_created_total', 'Google Sheets managers created for a family')
+TENANT_MANAGERS_EVICTED = metrics.counter('finance_bot_tenant_managers_evicted_total', 'Google Sheets managers dropped to stay within TENANT_CACHE_SIZE')
+
+
+class Tenant:
+    """One family served by a shared deployment, with its own sheet, members and bot name"""
+
+    def __init__(self, tenant_id: str, sheet_id: str, members: Dict[str, str], sheet_name: Optional[str] = None,
+                 family_name: Optional[str] = None, bot_name: Optional[str] = None, whatsapp_number: Optional[str] = None):
+        """
+        Initialize tenant
+
+        Args:
+            tenant_id: Short unique name, used in logs and for the family's local files
+            sheet_id: Google Sheet holding the family's ledger
+            members: WhatsApp number to display name of each family member
+            sheet_name: Ledger tab, defaults to GOOGLE_SHEET_NAME
+            family_name: Name used in replies, defaults to the tenant id
+            bot_name: Bot name used in replies, defaults to the one in FAMILY_CONFIG
+            whatsapp_number: Twilio number reserved for this family, messages sent to it belong to it whoever sends them
+        """
+        self.tenant_id = tenant_id
+        self.sheet_id = sheet_id
+        self.members = dict(members)
+        self.sheet_name = sheet_name
+        self.family_name = family_name or tenant_id
+        self.bot_name = bot_name
+        self.whatsapp_number = whatsapp_number
+
+    @classmethod
+    def from_config(cls, entry: Dict) -> 'Tenant':
+        """
+        Build a tenant from one entry of the tenants file
+
+        Raises:
+            ValueError: If 'id' or 'sheet_id' is missing, or the id has characters other than letters, digits, '-' and '_'
+        """
+        if not entry.get('id') or not entry.get('sheet_id'):
+            raise ValueError(f"Tenant entry needs an 'id' and a 'sheet_id': {entry}")
+        if not TENANT_ID_PATTERN.fullmatch(str(entry['id'])):
+            raise ValueError(f"Tenant id may only hold letters, digits, '-' and '_': {entry['id']}")
+        return cls(
+            str(entry['id']),
+            entry['sheet_id'],
+            entry.get('members', {}),
+            sheet_name=entry.get('sheet_name'),
+            family_name=entry.get('family_name'),
+            bot_name=entry.get('bot_name'),
+            whatsapp_number=entry.get('whatsapp_number')
+        )
+
+    def get_member(self, phone_number: str) -> str:
+        """Display name of a family member, 'Family Member' for unknown numbers"""
+        return self.members.get(phone_number, 'Family Member')
+
+
+class TenantRegistry:
+    """Finds the family a message belongs to, by the Twilio number it was sent to or by its sender"""
+
+    def __init__(self, tenants: List[Tenant]):
+        """
+        Index the tenants
+
+        Args:
+            tenants: Every family, in config order
+
+        Raises:
+            ValueError: If two tenants share an id or a reserved Twilio number
+        """
+        self.tenants: Dict[str, Tenant] = {}
+        self.by_number: Dict[str, Tenant] = {}
+        self.by_member: Dict[str, Tenant] = {}
+
+        for tenant in tenants:
+            if tenant.tenant_id in self.tenants:
+                raise ValueError(f"Duplicate tenant id: {tenant.tenant_id}")
+            self.tenants[tenant.tenant_id] = tenant
+
+            if tenant.whatsapp_number:
+                if tenant.whatsapp_number in self.by_number:
+                    raise ValueError(f"Twilio number {tenant.whatsapp_number} is reserved by two tenants")
+                self.by_number[tenant.whatsapp_number] = tenant
+
+            for number in tenant.members:
+                if number in self.by_member:
+                    # Only messages to a reserved number can reach the second family
+                    print(f"[WARNING] {mask_phone(number)} is in {self.by_member[number].tenant_id} and {tenant.tenant_id}, "
+                          f"messages not sent to a reserved number go to {self.by_member[number].tenant_id}")
+                    continue
+                self.by_member[number] = tenant
+
+    @classmethod
+    def load(cls, path: str) -> 'TenantRegistry':
+        """
+        Read the tenants file, a JSON list of tenant entries
+
+        Args:
+            path: JSON file, see README for the format
+
+        Returns:
+            Registry of every tenant in the file
+        """
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            raise ValueError(f"{path} must hold a JSON list of tenants")
+        return cls([Tenant.from_config(entry) for entry in entries])
+
+    def resolve(self, to_number: str, from_number: str) -> Optional[Tenant]:
+        """
+        Find the family a message belongs to
+
+        Args:
+            to_number: Twilio number the message was sent to
+            from_number: Sender's WhatsApp number
+
+        Returns:
+            The family reserving the Twilio number, else the family the sender belongs to, None if neither
+        """
+        return self.by_number.get(to_number) or self.by_member.get(from_number)
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+
+class TenantManagerCache:
+    """Google Sheets managers of recently active families, created on first use
+
+    Each manager holds its own ledger cache and row index, so the number kept
+    is capped at `capacity`. The least recently used one is dropped when a new
+    family needs room, and is rebuilt from its sheet if the family comes back.
+    All managers share the process's Sheets client and API scheduler.
+    """
+
+    def __init__(self, factory: Callable[[Tenant], object], capacity: Optional[int] = None):
+        """
+        Initialize manager cache
+
+        Args:
+            factory: Creates a ready to use manager for a tenant
+            capacity: Maximum managers kept at once
+        """
+        self.factory = factory
+        self.capacity = capacity or int(os.getenv('TENANT_CACHE_SIZE', '100'))
+        self._managers: 'OrderedDict[str, object]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tenant: Tenant):
+        """
+        Get a family's manager, creating it if it isn't cached
+
+        Args:
+            tenant: Family to serve
+
+        Returns:
+            The family's GoogleSheetsManager
+        """
+        with self._lock:
+            manager = self._managers.get(tenant.tenant_id)
+            if manager is not None:
+                self._managers.move_to_end(tenant.tenant_id)
+                return manager
+
+        # Created without the lock, so a slow sheet doesn't hold up other families
+        manager = self.factory(tenant)
+        TENANT_MANAGERS_CREATED.inc()
+
+        with self._lock:
+            # Another thread may have created one meanwhile, keep the first
+            manager = self._managers.setdefault(tenant.tenant_id, manager)
+            self._managers.move_to_end(tenant.tenant_id)
+            while len(self._managers) > self.capacity:
+                evicted, _ = self._managers.popitem(last=False)
+                TENANT_MANAGERS_EVICTED.inc()
+                log.info("Tenant manager evicted", extra={'tenant': evicted})
+        return manager
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._managers)
+
+
+def sheets_manager_factory(credentials_file: str = 'credentials.json', state_dir: Optional[str] = None) -> Callable[[Tenant], object]:
+    """
+    Factory creating a tenant's GoogleSheetsManager with its headers checked
+
+    Args:
+        credentials_file: Path to Google service account credentials JSON file, shared by every tenant
+        state_dir: Directory of per-tenant files such as the header check marker
+
+    Returns:
+        Function for TenantManagerCache
+    """
+    state_dir = state_dir or os.getenv('TENANT_STATE_DIR', os.path.join('data', 'tenants'))
+
+    def create(tenant: Tenant):
+        from google_sheets_manager import GoogleSheetsManager
+
+        manager = GoogleSheetsManager(credentials_file, sheet_id=tenant.sheet_id, sheet_name=tenant.sheet_name)
+        manager.ensure_sheet_headers(os.path.join(state_dir, tenant.tenant_id, 'sheet_headers.json'))
+        return manager
+
+    return create
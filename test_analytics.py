@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the NumPy spending analytics
+"""
+
+import gc
+import os
+import tempfile
+import time
+from datetime import date
+from unittest import mock
+
+from analytics import LedgerColumns, _analytics, analyze, generate_columns, get_analytics
+from sqlite_ledger import SQLiteLedger
+from whatsapp_bot import WhatsAppBot
+
+TODAY = date(2025, 7, 16)
+
+def transaction(tanggal, member, nama, tipe, nominal, kategori=None):
+    """Transaction dictionary as the ledger returns it"""
+    row = {'tanggal': tanggal, 'member': member, 'nama': nama, 'tipe': tipe, 'nominal': nominal}
+    if kategori:
+        row['kategori'] = kategori
+    return row
+
+def test_analytics():
+    """Test the columns, each figure of the analysis, the reply and the 1M row budget"""
+    print("[TEST] Testing Analytics...")
+    print("=" * 50)
+
+    checks = []
+    columns = LedgerColumns(capacity=2)
+    added = columns.add([
+        transaction('2025-05-03 10:00:00', 'Papa', 'gaji', 'pemasukan', '6000000'),
+        transaction('2025-05-10 12:00:00', 'Mama', 'sayur', 'pengeluaran', '300000', 'belanja'),
+        transaction('2025-06-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000'),
+        transaction('2025-06-12 12:00:00', 'Mama', 'sayur', 'pengeluaran', '600000', 'belanja'),
+        transaction('2025-07-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5500000'),
+        transaction('2025-07-02 12:00:00', 'Mama', 'sayur', 'pengeluaran', '450000', 'belanja'),
+        transaction('2025-07-05 19:00:00', 'Papa', 'bensin', 'pengeluaran', '150000', 'transport'),
+        transaction('2025-07-09 19:00:00', 'Cece', 'makan siang', 'pengeluaran', '300000'),
+        transaction('N/A', 'Unknown', 'jajan', 'pengeluaran', '10000'),  # Old format without a date
+        transaction('2025-07-10 19:00:00', 'Cece', 'tol', 'pengeluaran', 'abc'),  # Not a number
+    ])
+    checks.append(("rows encoded", (added, len(columns), columns.undated, columns.member_names), (8, 8, 1, ['Papa', 'Mama', 'Cece'])))
+    checks.append(("columns", (str(columns.days.dtype), str(columns.amounts.dtype), int(columns.months[0])), ('int64', 'int64', 664)))
+
+    analysis = analyze(columns, TODAY, months=3, window=2)
+    checks.append(("monthly trend", [(month['month'], month['pemasukan'], month['pengeluaran']) for month in analysis['trend']],
+                   [('2025-05', 6000000, 300000), ('2025-06', 5000000, 600000), ('2025-07', 5500000, 900000)]))
+    checks.append(("moving average", [month['pengeluaran_rata_rata'] for month in analysis['trend']], [150000, 450000, 750000]))
+    checks.append(("top spenders", [(row['member'], row['pengeluaran'], row['share']) for row in analysis['top_spenders']],
+                   [('Mama', 450000, 50.0), ('Cece', 300000, 33.3), ('Papa', 150000, 16.7)]))
+    checks.append(("category share", [(row['kategori'], row['share'], row['change']) for row in analysis['categories']],
+                   [('belanja', 50.0, -25.0), ('makan', 33.3, None), ('transport', 16.7, None)]))
+    checks.append(("month over month", analysis['month_over_month']['pengeluaran'], {'current': 900000, 'previous': 600000, 'delta': 300000, 'change': 50.0}))
+
+    with mock.patch.dict(os.environ, {'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32, 'TWILIO_AUTH_TOKEN': 'test', 'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886'}):
+        message = WhatsAppBot().format_analysis_message(analysis)
+    checks.append(("reply", ['• Pengeluaran: Rp 900,000 (+50.0%)' in message, '• Jul 2025: Rp 900,000 (rata-rata Rp 750,000)' in message,
+                             '1. Mama: Rp 450,000 (50.0%)' in message], [True, True, True]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        ledger.add_transaction(transaction('2025-07-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5500000'))
+        analytics = get_analytics(ledger)
+        first = analytics.report(TODAY)['month_over_month']['pemasukan']['current']
+        ledger.add_transaction(transaction('2025-07-03 08:00:00', 'Mama', 'bonus', 'pemasukan', '500000'))
+        checks.append(("follows the ledger", (first, analytics.report(TODAY)['month_over_month']['pemasukan']['current'], len(analytics.columns)),
+                       (5500000, 6000000, 2)))
+        analytics.reset()
+        checks.append(("reset reads the ledger again", (len(analytics.columns), analytics.report(TODAY)['transactions']), (0, 2)))
+        followed = len(_analytics)
+        del ledger, analytics
+        gc.collect()
+        checks.append(("analytics dropped with their ledger", len(_analytics), followed - 1))
+
+    large = generate_columns(1000000, today=TODAY)
+    started = time.perf_counter()
+    analysis = analyze(large, TODAY)
+    elapsed = time.perf_counter() - started
+    spent = large.amounts[(large.months == large.months.max()) & ~large.income].sum()
+    checks.append(("1M rows well under a second", (elapsed < 0.5, analysis['month_over_month']['pengeluaran']['current']), (True, int(spent))))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_analytics()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the Google Sheets API scheduler
+"""
+
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import api_scheduler
+from api_scheduler import ApiScheduler, TokenBucket
+
+class StubRequest:
+    """Stands in for a googleapiclient HttpRequest"""
+
+    def __init__(self, uri, statuses=(), delay=0.0, method='GET'):
+        self.method = method
+        self.uri = uri
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.executed = 0
+
+    def execute(self):
+        self.executed += 1
+        time.sleep(self.delay)
+        if self.statuses:
+            status = self.statuses.pop(0)
+            raise HttpError(httplib2.Response({'status': status}), b'{}')
+        return {'uri': self.uri, 'executed': self.executed}
+
+def test_api_scheduler():
+    """Test the token bucket, retries and read coalescing"""
+    print("[TEST] Testing API Scheduler...")
+    print("=" * 50)
+
+    checks = []
+    # Don't sleep through real backoff delays
+    backoff_delay = api_scheduler.backoff_delay
+    api_scheduler.backoff_delay = lambda attempt, base=1.0, cap=60.0: 0.0
+
+    bucket = TokenBucket(rate=10, capacity=2)
+    checks.append(("burst allowed", [bucket.try_acquire(), bucket.try_acquire()], [0.0, 0.0]))
+    checks.append(("empty bucket waits", 0.05 < bucket.try_acquire() <= 0.1, True))
+
+    scheduler = ApiScheduler(read_per_minute=600, write_per_minute=600, max_retries=3)
+    request = StubRequest('/values/A:E', statuses=[429, 503])
+    checks.append(("read retried on 429 and 503", scheduler.execute(request)['executed'], 3))
+
+    request = StubRequest('/values:append', statuses=[429], method='POST')
+    checks.append(("write retried on 429", scheduler.execute(request, 'write')['executed'], 2))
+
+    request = StubRequest('/values:append', statuses=[503], method='POST')
+    try:
+        scheduler.execute(request, 'write')
+        raised = False
+    except HttpError:
+        raised = True
+    checks.append(("write not retried on 503", (raised, request.executed), (True, 1)))
+
+    request = StubRequest('/values/A:E', statuses=[500] * 5)
+    try:
+        scheduler.execute(request)
+        raised = False
+    except HttpError:
+        raised = True
+    checks.append(("gives up after max retries", (raised, request.executed), (True, 4)))
+
+    # Concurrent identical reads share the first one's response
+    slow = StubRequest('/values/laporan', delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.execute(slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    checks.append(("concurrent reads coalesced", (slow.executed, len(results)), (1, 5)))
+
+    scheduler.execute(StubRequest('/values:append', method='POST'), 'write')
+    checks.append(("read after a write is not shared", scheduler.execute(slow)['executed'], 2))
+
+    throttled = ApiScheduler(read_per_minute=120, write_per_minute=60)
+    throttled.buckets['read'].tokens = 0
+    started = time.monotonic()
+    throttled.execute(StubRequest('/values/A:A'))
+    checks.append(("throttled until a token is free", time.monotonic() - started >= 0.4, True))
+
+    snapshot = scheduler.snapshot()
+    checks.append(("coalesced counted", snapshot['coalesced'], 4))
+    checks.append(("rate limits counted", snapshot['rate_limited'], 2))
+    checks.append(("throttle counted", throttled.snapshot()['throttled'], 1))
+    api_scheduler.backoff_delay = backoff_delay
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_api_scheduler()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for the async server, run against the local Sheets and Twilio stand-ins
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from google.auth.credentials import AnonymousCredentials
+
+import async_app
+import sheets_client
+from api_scheduler import get_scheduler
+from fake_services import FakeSheetsServer
+from google_sheets_manager import SHEET_HEADERS
+
+async def exercise(directory: str, checks: list):
+    """Start the async app on a local port and post webhooks to it"""
+    app = await async_app.create_app(os.path.join(directory, 'credentials.json'))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    components = app[async_app.COMPONENTS]
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async def post(body, sid=None, sender='whatsapp:+6281234567890'):
+                data = {'Body': body, 'From': sender}
+                if sid:
+                    data['MessageSid'] = sid
+                async with session.post(url + '/webhook', data=data) as response:
+                    return response.status, await response.text(), response.headers.get('X-Request-Id')
+
+            generation = get_scheduler().generation
+            first = await post('makan siang pengeluaran 20rb', 'SM100')
+            checks.append(("transaction saved", (first[0], '[SUCCESS]' in first[1]), (200, True)))
+            checks.append(("append ends in-flight read sharing", get_scheduler().generation > generation, True))
+            checks.append(("request id from MessageSid", first[2], 'SM100'))
+            checks.append(("retry replayed", (await post('makan siang pengeluaran 20rb', 'SM100'))[1], first[1]))
+
+            replies = await asyncio.gather(*(post(f'jajan {index} pengeluaran 5rb') for index in range(20)))
+            checks.append(("concurrent webhooks", {reply[0] for reply in replies}, {200}))
+            checks.append(("help reply", '[HELP]' in (await post('help'))[1], True))
+            family = await post('sayur pengeluaran 30rb', sender='whatsapp:+6281111111111')
+            checks.append(("tenant reply", '[SUCCESS]' in family[1], True))
+
+            async with session.get(url + '/recent') as response:
+                recent = await response.json()
+            checks.append(("recent transactions", recent['count'], 10))
+            async with session.get(url + '/recent', params={'limit': '15'}) as response:
+                newest = await response.json()
+            async with session.get(url + '/recent', params={'limit': '15', 'cursor': newest['next_cursor']}) as response:
+                older = await response.json()
+            checks.append(("recent pages", (newest['count'], older['count'], older['next_cursor']), (15, 6, None)))
+            async with session.get(url + '/export', params={'format': 'jsonl'}) as response:
+                exported = (await response.text()).splitlines()
+            checks.append(("export streamed", (len(exported), '"nama": "makan siang"' in exported[0]), (21, True)))
+            with mock.patch.dict(os.environ, {'EXPORT_TOKEN': 'rahasia'}):
+                async with session.get(url + '/analytics') as response:
+                    refused = response.status
+                async with session.get(url + '/analytics', headers={'Authorization': 'Bearer rahasia'}) as response:
+                    allowed = (response.status, 'top_spenders' in await response.json())
+            checks.append(("analytics needs the export token", (refused, allowed), (401, (200, True))))
+            async with session.get(url + '/test') as response:
+                checks.append(("connection test", (await response.json())['status'], 'OK'))
+    finally:
+        await runner.cleanup()
+
+def test_async_app():
+    """Test webhooks, retries, tenants and the async Sheets client"""
+    print("[TEST] Testing Async App...")
+    print("=" * 50)
+
+    sheets = FakeSheetsServer(latency=0.02).start()
+    sheets.sheets['Sheet1'] = [SHEET_HEADERS]
+    sheets.sheets['Budi'] = []
+
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'GOOGLE_SHEET_ID': 'test-sheet',
+            'GOOGLE_SHEETS_API_ENDPOINT': sheets.url,
+            'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+            'TWILIO_AUTH_TOKEN': 'test',
+            'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886',
+            'LEDGER_BACKEND': 'sheets',
+            'DEDUPE_DB_PATH': os.path.join(directory, 'dedupe.db'),
+            'SHEET_HEADERS_MARKER': os.path.join(directory, 'sheet_headers.json'),
+            'TENANTS_CONFIG': os.path.join(directory, 'tenants.json'),
+            'TENANT_STATE_DIR': os.path.join(directory, 'tenants')
+        }
+        with open(environment['TENANTS_CONFIG'], 'w', encoding='utf-8') as f:
+            json.dump([{'id': 'budi', 'sheet_id': 'sheet-budi', 'sheet_name': 'Budi', 'members': {'whatsapp:+6281111111111': 'Papa Budi'}}], f)
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            asyncio.run(exercise(directory, checks))
+
+    checks.append(("rows appended without duplicates", len(sheets.sheets['Sheet1']), 22))
+    checks.append(("tenant row in its own sheet", [row[1:3] for row in sheets.sheets['Budi'][1:]], [['Papa Budi', 'sayur']]))
+    sheets.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_async_app()
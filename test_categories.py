@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for transaction categories
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+import sheets_client
+from categories import OTHER, CategoryClassifier, KeywordMatcher, categorize
+from fake_services import FakeSheetsServer
+from google_sheets_manager import SHEET_HEADERS, GoogleSheetsManager
+from ledger_cache import AggregateIndex
+from message_parser import MessageParser
+from whatsapp_bot import WhatsAppBot
+
+def test_categories():
+    """Test the keyword matcher, parse-time tagging, aggregates and the report section"""
+    print("[TEST] Testing Categories...")
+    print("=" * 50)
+
+    checks = []
+
+    matcher = KeywordMatcher({'he': 'he', 'she': 'she', 'his': 'his', 'hers': 'hers'})
+    checks.append(("overlapping keywords", list(matcher.find('ushers')), [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]))
+
+    checks.append(("category name", categorize('makan siang', 'pengeluaran'), 'makan'))
+    checks.append(("alias", categorize('isi bensin motor', 'pengeluaran'), 'transport'))
+    checks.append(("multi-word alias", categorize('beli tiket pesawat', 'pengeluaran'), 'transport'))
+    checks.append(("longest keyword wins", categorize('kopi waktu jalan jalan', 'pengeluaran'), 'hiburan'))
+    checks.append(("whole words only", categorize('tolak angin', 'pengeluaran'), OTHER))
+    checks.append(("income categories for income", (categorize('gajian', 'pemasukan'), categorize('makan', 'pemasukan')), ('gaji', OTHER)))
+
+    classifier = CategoryClassifier.from_config({
+        'expense_categories': ['anak'],
+        'income_categories': [],
+        'category_aliases': {'anak': ['SPP', 'les  piano']}
+    })
+    checks.append(("user aliases", [classifier.classify(name, 'pengeluaran') for name in ['bayar spp', 'les piano', 'bensin']], ['anak', 'anak', OTHER]))
+
+    parser = MessageParser()
+    parsed = parser.parse_message("bayar listrik pengeluaran 350rb")
+    checks.append(("tagged at parse time", parsed['kategori'], 'tagihan'))
+
+    month = datetime.now().strftime('%Y-%m')
+    rows = [
+        [f'{month}-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000', 'gaji'],
+        [f'{month}-02 12:00:00', 'Mama', 'nasi padang', 'pengeluaran', '30000'],  # Written before the Kategori column
+        [f'{month}-03 19:00:00', 'Cece', 'traktir', 'pengeluaran', '80000', 'hiburan'],
+        ['jajan', 'pengeluaran', '10000'],  # Old format, counts in every month
+    ]
+    expected = {'pemasukan': {'gaji': 5000000}, 'pengeluaran': {'makan': 40000, 'hiburan': 80000}}
+    checks.append(("aggregate by category", AggregateIndex.from_rows(rows).categories(month), expected))
+
+    with mock.patch.dict(os.environ, {'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32, 'TWILIO_AUTH_TOKEN': 'test', 'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886'}):
+        report = WhatsAppBot().format_report_message({
+            'total_pemasukan': 5000000, 'total_pengeluaran': 120000, 'saldo': 4880000, 'categories': expected, 'recent': []
+        })
+    checks.append(("report section", '*Per Kategori:*\n• [OUT] hiburan: Rp 80,000\n• [OUT] makan: Rp 40,000\n• [IN] gaji: Rp 5,000,000\n' in report, True))
+
+    server = FakeSheetsServer().start()
+    server.sheets['Sheet1'] = [SHEET_HEADERS[:5]] + rows
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'GOOGLE_SHEET_ID': 'test-sheet',
+            'GOOGLE_SHEETS_API_ENDPOINT': server.url,
+            'LEDGER_CACHE_ENABLED': 'false',
+            'SHEET_HEADERS_MARKER': os.path.join(directory, 'sheet_headers.json')
+        }
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            manager = GoogleSheetsManager(os.path.join(directory, 'credentials.json'))
+            manager.ensure_sheet_headers()
+            checks.append(("Kategori header added", server.sheets['Sheet1'][0], SHEET_HEADERS))
+
+            manager.add_transaction(dict(parser.parse_message("obat batuk pengeluaran 25rb"), member='Mama'))
+            checks.append(("category written to column F", server.sheets['Sheet1'][-1][5], 'kesehatan'))
+
+            summary = manager.get_monthly_summary()
+            checks.append(("month read by category", summary['categories']['pengeluaran'], dict(expected['pengeluaran'], kesehatan=25000)))
+    server.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_categories()
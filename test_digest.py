@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the scheduled digests
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from digest import DigestScheduler
+from fake_services import FakeSheetsServer
+from google.auth.credentials import AnonymousCredentials
+from google_sheets_manager import SHEET_HEADERS, GoogleSheetsManager
+from sqlite_ledger import SQLiteLedger
+from whatsapp_bot import WhatsAppBot
+import sheets_client
+
+class RecordingDispatcher:
+    """Stands in for OutboundDispatcher, keeping what would be sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    def broadcast(self, numbers, body):
+        self.sent.append((list(numbers), body))
+        return []
+
+def transaction(tanggal, tipe, nominal, nama='makan'):
+    return {'tanggal': tanggal, 'member': 'Mama', 'nama': nama, 'tipe': tipe, 'nominal': str(nominal)}
+
+def test_digest():
+    """Test incremental totals, due digests, the leader lock and saved state"""
+    print("[TEST] Testing Digests...")
+    print("=" * 50)
+
+    checks = []
+    environment = {
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'test',
+        'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886'
+    }
+    # Monday the 1st: yesterday closed a day, an ISO week and a month
+    monday = datetime(2025, 9, 1, 8, 0)
+
+    with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, environment):
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        ledger.bootstrap([['jajan', 'pengeluaran', '1000']])  # Old format row, counts in every month
+        ledger.add_transactions([
+            transaction('2025-08-05 12:00:00', 'pemasukan', 5000000, 'gaji'),
+            transaction('2025-08-27 12:00:00', 'pengeluaran', 30000),
+            transaction('2025-08-31 19:00:00', 'pengeluaran', 20000),
+        ])
+
+        options = {
+            'recipients': ['whatsapp:+6281111111111', 'whatsapp:+6282222222222'],
+            'state_path': os.path.join(directory, 'digest_state.json'),
+            'lock_path': os.path.join(directory, 'digest.lock')
+        }
+        bot = WhatsAppBot()
+        dispatcher = RecordingDispatcher()
+        scheduler = DigestScheduler(ledger, bot, dispatcher, **options)
+
+        checks.append(("nothing before send time", scheduler.tick(datetime(2025, 9, 1, 6, 59)), []))
+        checks.append(("all three digests due", scheduler.tick(monday), ['daily:2025-08-31', 'weekly:2025-W35', 'monthly:2025-08']))
+        checks.append(("daily totals", scheduler.accumulator.summary('daily', '2025-08-31')['total_pengeluaran'], 20000))
+        checks.append(("weekly totals", scheduler.accumulator.summary('weekly', '2025-W35')['total_pengeluaran'], 50000))
+        checks.append(("monthly includes undated rows", scheduler.accumulator.summary('monthly', '2025-08')['saldo'], 5000000 - 51000))
+        checks.append(("sent to every recipient", [len(numbers) for numbers, _ in dispatcher.sent], [2, 2, 2]))
+        checks.append(("report formatting reused", 'Ringkasan Bulanan Agustus 2025' in dispatcher.sent[2][1] and 'Rp 4,949,000' in dispatcher.sent[2][1], True))
+        checks.append(("not sent twice", scheduler.tick(monday), []))
+
+        # Another worker doesn't get the lock while the leader holds it
+        follower = DigestScheduler(ledger, bot, RecordingDispatcher(), **options)
+        checks.append(("single leader", (follower.tick(monday), follower.leader), ([], False)))
+
+        ledger.add_transaction(transaction('2025-09-01 07:30:00', 'pengeluaran', 15000))
+        checks.append(("only new rows read", scheduler.ingest(), 1))
+        checks.append(("old periods pruned", sorted(scheduler.accumulator.totals), [
+            'daily:2025-08-31', 'daily:2025-09-01', 'monthly:2025-08', 'monthly:2025-09', 'weekly:2025-W35', 'weekly:2025-W36'
+        ]))
+        scheduler.stop()
+
+        # The next leader continues from the saved cursor and sent periods
+        checks.append(("next leader resumes", (follower.tick(datetime(2025, 9, 2, 7, 0)), follower.ingest()), (['daily:2025-09-01'], 0)))
+        checks.append(("resumed totals", follower.accumulator.summary('daily', '2025-09-01')['total_pengeluaran'], 15000))
+        follower.stop()
+
+        sheets = FakeSheetsServer().start()
+        sheets.sheets['Sheet1'] = [SHEET_HEADERS] + [['2025-08-31 10:00:00', 'Papa', 'bensin', 'pengeluaran', '50000']] * 3
+        with mock.patch.dict(os.environ, {'GOOGLE_SHEET_ID': 'test-sheet', 'GOOGLE_SHEETS_API_ENDPOINT': sheets.url}), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            manager = GoogleSheetsManager(os.path.join(directory, 'credentials.json'))
+            first, cursor = manager.get_transactions_since({}, limit=2)
+            second, cursor = manager.get_transactions_since(cursor, limit=2)
+            checks.append(("sheet rows read after the cursor", (len(first), len(second), cursor), (2, 1, {'Sheet1': 4})))
+        sheets.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_digest()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for the formula summary tab, run against the local Sheets stand-in
+
+The stand-in stores formulas as text instead of evaluating them, so the test
+fills in the values Google Sheets would compute.
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+import sheets_client
+from fake_services import FakeSheetsServer
+from google_sheets_manager import ALL, FORMULA_SUMMARY_HEADERS, SHEET_HEADERS, GoogleSheetsManager, summary_formula
+from ledger_cache import AggregateIndex
+
+def test_formula_summary():
+    """Test formula rows, reading computed totals and falling back when they are missing or broken"""
+    month = datetime.now().strftime('%Y-%m')
+    ledger_rows = [
+        [f'{month}-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000'],
+        [f'{month}-02 12:00:00', 'Cece', 'makan siang', 'pengeluaran', '20000'],
+        ['2020-01-05 12:00:00', 'Mama', 'belanja', 'pengeluaran', '100000'],
+        ['jajan', 'pengeluaran', '10000'],  # Old format without date or member
+    ]
+    index = AggregateIndex.from_rows(ledger_rows)
+    server = FakeSheetsServer().start()
+    server.sheets['Sheet1'] = [SHEET_HEADERS] + ledger_rows
+
+    print("[TEST] Testing Formula Summary...")
+    print("=" * 50)
+
+    checks = []
+    formula = summary_formula('Sheet1', 'pemasukan', month)
+    checks.append(("formula converts text nominals", 'VALUE(\'Sheet1\'!E2:E)' in formula, True))
+    checks.append(("formula filters by month", f'="{month}")' in formula, True))
+    checks.append(("undated rows counted", 'VALUE(\'Sheet1\'!C2:C)' in formula, True))
+    checks.append(("undated rows belong to Unknown", 'C2:C' in summary_formula('Sheet1', 'pemasukan', month, 'Papa'), False))
+
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'GOOGLE_SHEET_ID': 'test-sheet',
+            'GOOGLE_SHEETS_API_ENDPOINT': server.url,
+            'SHEET_FORMULA_SUMMARY': 'true',
+            'SHEET_HEADERS_MARKER': os.path.join(directory, 'sheet_headers.json')
+        }
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            manager = GoogleSheetsManager(os.path.join(directory, 'credentials.json'))
+            manager.cache_enabled = False
+            checks.append(("summary tab set up", manager.ensure_sheet_headers(), True))
+            checks.append(("summary headers", server.sheets['Rekap'][0], FORMULA_SUMMARY_HEADERS))
+
+            expected_income = index.total(month, 'pemasukan')
+            expected_expense = index.total(month, 'pengeluaran')
+            report = manager.get_monthly_summary()
+            checks.append(("missing row totals locally", (report['total_pemasukan'], report['total_pengeluaran']), (expected_income, expected_expense)))
+            rekap = server.sheets['Rekap']
+            checks.append(("missing row added", rekap[1][:2], [month, ALL]))
+            checks.append(("row holds formulas", rekap[1][2].startswith('=ARRAYFORMULA('), True))
+
+            # What Google Sheets would compute, offset so the test can tell where totals came from
+            rekap[1][2:4] = [expected_income + 1, expected_expense + 1]
+            requests_before = server.request_count
+            report = manager.get_monthly_summary()
+            checks.append(("totals from formulas", (report['total_pemasukan'], report['total_pengeluaran']), (expected_income + 1, expected_expense + 1)))
+            checks.append(("one call for totals and recent", server.request_count - requests_before, 1))
+            checks.append(("recent from the tail", [t['nama'] for t in report['recent']], ['gaji', 'makan siang', 'belanja', 'jajan']))
+
+            rekap[1][2] = '#REF!'
+            report = manager.get_monthly_summary()
+            checks.append(("broken row totals locally", report['total_pemasukan'], expected_income))
+            checks.append(("broken row rewritten", rekap[1][2].startswith('=ARRAYFORMULA('), True))
+
+            manager.get_member_summary('Papa', month)
+            checks.append(("member rows added", [row[:2] for row in rekap[2:]], [[month, 'Papa'], [ALL, 'Papa']]))
+            rekap[2][2:4] = [5000000, 0]
+            rekap[3][2:4] = [5000000, 30000]
+            member = manager.get_member_summary('Papa', month)
+            checks.append(("member totals from formulas", (member['saldo'], member['balance']), (5000000, 4970000)))
+
+    server.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_formula_summary()
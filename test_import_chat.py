@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the chat export importer
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from import_chat import ChatImporter, map_sender, parse_export_timestamp, parse_record, read_whatsapp_export
+from message_parser import MessageParser
+from sqlite_ledger import SQLiteLedger
+
+EXPORT = """15/07/25, 12.30 - Messages and calls are end-to-end encrypted.
+15/07/25, 12.31 - Mama: makan siang pengeluaran 20rb
+15/07/25, 12.32 - +62 896-1252-4288: bensin pengeluaran 50rb kemarin
+[16/07/25 08.00.05] Papa: halo semua
+[16/07/25 08.01.00] Papa: gaji pemasukan 5jt
+"""
+
+def test_chat_import():
+    """Test reading an export and parsing its messages"""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+        f.write(EXPORT)
+        path = f.name
+
+    try:
+        records = list(read_whatsapp_export(path))
+    finally:
+        os.remove(path)
+
+    results = [(parse_record(record)['transactions'] or [None])[0] for record in records]
+
+    print("[TEST] Testing Chat Import...")
+    print("=" * 50)
+
+    checks = [
+        ("system message skipped", len(records), 4),
+        ("android timestamp", records[0].sent_at, datetime(2025, 7, 15, 12, 31)),
+        ("ios timestamp", records[2].sent_at, datetime(2025, 7, 16, 8, 0, 5)),
+        ("phone sender mapped", results[1]['member'], 'Mama'),
+        ("relative date uses message time", results[1]['tanggal'], '2025-07-14 12:32:00'),
+        ("chatter rejected", results[2], None),
+        ("contact name kept", results[3]['member'], 'Papa'),
+        ("12 hour clock", parse_export_timestamp('7/16/25', '2:30 PM', 'mdy'), datetime(2025, 7, 16, 14, 30)),
+        ("unknown sender", map_sender('Tetangga'), 'Family Member'),
+    ]
+
+    # parse_many streams results in input order
+    parser = MessageParser()
+    parsed = list(parser.parse_many(["kopi pengeluaran 15k", ("gaji pemasukan 5jt kemarin", datetime(2025, 1, 2, 9, 0))]))
+    checks.append(("parse_many plain message", parsed[0]['nominal'], '15000'))
+    checks.append(("parse_many with send time", parsed[1]['tanggal'], '2025-01-01 09:00:00'))
+
+    # Imported rows land in the local ledger that reports read
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chat.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"01/{now:%m/%y}, 08.00 - Papa: gaji pemasukan 5jt\n01/{now:%m/%y}, 12.00 - Mama: sayur pengeluaran 50rb\n")
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        checkpoint = ChatImporter(ledger, workers=1).run(path, read_whatsapp_export(path))
+        summary = ledger.get_monthly_summary()
+        unmirrored = ledger.unmirrored_count()
+    checks.append(("import reaches the ledger", (checkpoint['imported'], summary['total_pemasukan'], summary['total_pengeluaran']), (2, 5000000, 50000)))
+    checks.append(("imported rows wait for the mirror", unmirrored, 2))
+
+    # A crash after a chunk is committed, then one before, adds no row or reject twice on resume
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chat.txt')
+        rejects_path = os.path.join(directory, 'rejected.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("01/07/25, 08.00 - Papa: gaji pemasukan 5jt\n01/07/25, 09.00 - Papa: halo semua\n"
+                    "01/07/25, 12.00 - Mama: sayur pengeluaran 50rb\n01/07/25, 13.00 - Mama: kopi pengeluaran 15k\n")
+        db_path = os.path.join(directory, 'ledger.db')
+
+        def crash(ledger, after_write):
+            original = ledger.add_transactions
+            def add_transactions(transactions, meta=None):
+                if not transactions:
+                    return original(transactions, meta)
+                if after_write:
+                    original(transactions, meta)
+                raise KeyboardInterrupt("crashed")
+            return mock.patch.object(ledger, 'add_transactions', add_transactions)
+
+        for after_write in (True, False):
+            ledger = SQLiteLedger(db_path)
+            try:
+                with crash(ledger, after_write):
+                    ChatImporter(ledger, workers=1, chunk_size=1, rejects_path=rejects_path).run(path, read_whatsapp_export(path))
+            except KeyboardInterrupt:
+                pass
+        ledger = SQLiteLedger(db_path)
+        checkpoint = ChatImporter(ledger, workers=1, chunk_size=1, rejects_path=rejects_path).run(path, read_whatsapp_export(path))
+        with open(rejects_path, encoding='utf-8') as f:
+            rejected = f.read().splitlines()
+        names = [transaction['nama'] for transaction in ledger.get_recent_transactions(10)]
+    checks.append(("resume adds no duplicates", (names, len(rejected), checkpoint['imported'], checkpoint['rejected']),
+                   (['gaji', 'sayur', 'kopi'], 1, 3, 1)))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_chat_import()
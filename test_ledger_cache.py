@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory ledger cache
+"""
+
+from ledger_cache import AggregateIndex, LedgerCache, RowIndex, recent_valid_transactions
+
+SHEET_VALUES = [
+    ['Tanggal', 'Member', 'Nama', 'Tipe', 'Nominal'],
+    ['2025-06-30 10:00:00', 'Mama', 'belanja', 'pengeluaran', '100000'],
+    ['2025-07-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000'],
+    ['2025-07-02 12:00:00', 'Cece', 'makan siang', 'pengeluaran', '20000'],
+]
+
+def test_ledger_cache():
+    """Test loading, appending and summarizing cached rows"""
+    cache = LedgerCache(ttl=60, max_age=3600)
+
+    print("[TEST] Testing Ledger Cache...")
+    print("=" * 50)
+
+    checks = []
+
+    checks.append(("needs reload before first load", cache.needs_reload(), True))
+
+    cache.load(SHEET_VALUES)
+    checks.append(("last row after load", cache.last_row, 4))
+    checks.append(("no reload after load", cache.needs_reload(), False))
+
+    # Our own append lands right after the last known row
+    cache.apply_append([['2025-07-03 09:00:00', 'Mama', 'bensin', 'pengeluaran', '50000']], 'Sheet1!A5:E5')
+    checks.append(("last row after append", cache.last_row, 5))
+
+    checks.append(("july pemasukan", cache.index.total('2025-07', 'pemasukan'), 5000000))
+    checks.append(("july pengeluaran", cache.index.total('2025-07', 'pengeluaran'), 70000))
+    checks.append(("recent nominal is int", recent_valid_transactions(cache.rows, 5)[-1]['nominal'], 50000))
+
+    recent = cache.recent(2)
+    checks.append(("recent names", [tx['nama'] for tx in recent], ['makan siang', 'bensin']))
+
+    # An append past a gap means rows were written elsewhere
+    cache.apply_append([['2025-07-04 09:00:00', 'Papa', 'parkir', 'pengeluaran', '5000']], 'Sheet1!A8:E8')
+    checks.append(("gap is not applied", cache.last_row, 5))
+    checks.append(("gap marks cache stale", cache.is_stale(), True))
+
+    cache.extend_tail([
+        ['2025-07-04 08:00:00', 'Given', 'pulsa', 'pengeluaran', '25000'],
+        [],
+        ['2025-07-04 09:00:00', 'Papa', 'parkir', 'pengeluaran', '5000'],
+    ])
+    checks.append(("last row after tail sync", cache.last_row, 8))
+    checks.append(("empty rows are skipped", len(cache.recent(3)), 2))
+
+    cache.invalidate()
+    checks.append(("needs reload after invalidate", cache.needs_reload(), True))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+def test_aggregate_index():
+    """Test running totals against a full scan"""
+    rows = SHEET_VALUES[1:] + [
+        ['2025-07-05 18:00:00', 'Mama', 'arisan', 'pemasukan', '300000'],
+        ['jajan', 'pengeluaran', '10000'],  # Old format without date or member
+        ['2025-07-06 07:00:00', 'Papa', 'tol', 'pengeluaran', 'abc'],  # Not a number
+    ]
+
+    print("\n[TEST] Testing Aggregate Index...")
+    print("=" * 50)
+
+    index = AggregateIndex()
+    for row in rows:
+        index.add_row(row)
+
+    checks = [
+        ("july pemasukan", index.total('2025-07', 'pemasukan'), 5300000),
+        ("july pengeluaran includes undated", index.total('2025-07', 'pengeluaran'), 30000),
+        ("june pengeluaran includes undated", index.total('2025-06', 'pengeluaran'), 110000),
+        ("mama july pemasukan", index.total('2025-07', 'pemasukan', 'Mama'), 300000),
+        ("papa balance", index.member_balances['Papa'], 5000000),
+        ("running balance", index.balance, 5170000),
+        ("matches full scan", index.verify(rows), []),
+    ]
+
+    # A missed row must show up when verifying
+    index.add_row(['2025-07-07 07:00:00', 'Cece', 'buku', 'pengeluaran', '40000'])
+    checks.append(("detects drift", len(index.verify(rows)) > 0, True))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+def test_row_index():
+    """Test month row ranges built from the date column"""
+    column = [
+        ['Tanggal'],
+        ['jajan'],  # Old format rows start with the name
+        ['es teh'],
+        ['2025-06-30 10:00:00'],
+        ['2025-07-01 08:00:00'],
+        ['2025-06-29 21:00:00'],  # Entered late with a custom date
+        ['2025-07-02 12:00:00'],
+    ]
+
+    print("\n[TEST] Testing Row Index...")
+    print("=" * 50)
+
+    index = RowIndex(ttl=60, max_age=3600)
+    checks = [("needs reload before first load", index.needs_reload(), True)]
+
+    index.load(column)
+    checks.append(("last row", index.last_row, 7))
+    checks.append(("june block", index.month_range('2025-06'), (4, 6)))
+    checks.append(("july block", index.month_range('2025-07'), (5, 7)))
+    checks.append(("missing month", index.month_range('2025-08'), None))
+    checks.append(("undated rows merged", index.undated_ranges(), [(2, 3)]))
+    checks.append(("tail range", index.tail_range(2), (6, 7)))
+    checks.append(("tail stops at header", index.tail_range(100), (2, 7)))
+
+    index.apply_append([['2025-08-01 09:00:00', 'Mama', 'bensin', 'pengeluaran', '50000']], 'Sheet1!A8:E8')
+    checks.append(("append extends index", index.month_range('2025-08'), (8, 8)))
+
+    # An append past a gap means rows were written elsewhere
+    index.apply_append([['2025-08-03 09:00:00', 'Papa', 'parkir', 'pengeluaran', '5000']], 'Sheet1!A10:E10')
+    checks.append(("gap is not applied", index.last_row, 8))
+    checks.append(("gap marks index stale", index.is_stale(), True))
+
+    index.extend_tail([['2025-08-02 08:00:00'], ['2025-08-03 09:00:00']])
+    checks.append(("tail sync", (index.last_row, index.month_range('2025-08')), (10, (8, 10))))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_ledger_cache()
+    test_aggregate_index()
+    test_row_index()
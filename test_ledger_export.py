@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the streamed ledger export and /recent pages
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from ledger_export import export_authorized, export_chunks, page_limit
+from sqlite_ledger import SQLiteLedger
+
+def test_ledger_export():
+    """Test paging back through the ledger and exporting it in batches"""
+    print("[TEST] Testing Ledger Export...")
+    print("=" * 50)
+
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        ledger.add_transactions([
+            {'tanggal': f'2025-07-{day:02d} 12:00:00', 'member': 'Mama', 'nama': f'belanja {day}', 'tipe': 'pengeluaran', 'nominal': str(day * 1000)}
+            for day in range(1, 8)
+        ])
+        ledger.add_transaction({'tanggal': '2025-07-08 09:00:00', 'member': 'Papa', 'nama': 'makan, "padang"', 'tipe': 'pengeluaran', 'nominal': '30000'})
+
+        newest, cursor = ledger.get_transactions_page(3)
+        checks.append(("newest page in ledger order", [t['nama'] for t in newest], ['belanja 6', 'belanja 7', 'makan, "padang"']))
+        pages = [newest]
+        while cursor:
+            page, cursor = ledger.get_transactions_page(3, cursor)
+            pages.append(page)
+        checks.append(("pages until the oldest", [len(page) for page in pages], [3, 3, 2]))
+        checks.append(("last full page ends paging", ledger.get_transactions_page(8)[1], None))
+
+        reads = []
+        original = ledger.get_transactions_since
+        with mock.patch.object(ledger, 'get_transactions_since', lambda cursor, limit: reads.append(limit) or original(cursor, limit)):
+            chunks = list(export_chunks(ledger, 'csv', batch_size=3))
+        rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+        checks.append(("csv rows", (len(rows), rows[-1]['nama'], rows[-1]['kategori']), (8, 'makan, "padang"', 'makan')))
+        checks.append(("read in batches", (len(chunks), set(reads)), (4, {3})))
+
+        lines = ''.join(export_chunks(ledger, 'jsonl')).splitlines()
+        checks.append(("jsonl lines", (len(lines), json.loads(lines[0])['nominal']), (8, '1000')))
+
+    checks.append(("page limit", (page_limit(None), page_limit('50'), page_limit('100000')), (10, 50, 500)))
+    with mock.patch.dict(os.environ, {'EXPORT_TOKEN': 'rahasia'}):
+        allowed = [export_authorized('Bearer rahasia', None), export_authorized(None, 'rahasia'), export_authorized(None, 'salah'), export_authorized(None, None)]
+    checks.append(("export token", allowed, [True, True, False, False]))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_ledger_export()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for date-range and per-member queries
+"""
+
+import gc
+import os
+import tempfile
+from datetime import date, datetime
+from unittest import mock
+
+from ledger_query import DateIndex, QueryParser, SortedDates, _indexes, answer_query, get_date_index
+from sqlite_ledger import SQLiteLedger
+from whatsapp_bot import WhatsAppBot
+
+NOW = datetime(2025, 7, 16, 9, 30)
+
+def period(query):
+    """Start, end, member and type of a parsed query, None if it didn't parse"""
+    return (query.start, query.end, query.member, query.tipe) if query else None
+
+def test_ledger_query():
+    """Test the query grammar, the sorted index and answers from a ledger"""
+    print("[TEST] Testing Ledger Queries...")
+    print("=" * 50)
+
+    checks = []
+    parser = QueryParser()
+    members = ['Papa', 'Mama', 'Juni']
+    parse = lambda message: period(parser.parse(message, members, NOW))
+
+    checks.append(("month name", parse('laporan juli'), (date(2025, 7, 1), date(2025, 8, 1), None, None)))
+    checks.append(("later month is last year's", parse('laporan desember')[:2], (date(2024, 12, 1), date(2025, 1, 1))))
+    checks.append(("month with year", parse('laporan agustus 2023')[:2], (date(2023, 8, 1), date(2023, 9, 1))))
+    checks.append(("this week", parse('laporan minggu ini')[:2], (date(2025, 7, 14), date(2025, 7, 21))))
+    checks.append(("last month", parse('laporan bulan lalu')[:2], (date(2025, 6, 1), date(2025, 7, 1))))
+    checks.append(("member this month", parse('laporan mama'), (date(2025, 7, 1), date(2025, 8, 1), 'Mama', None)))
+    checks.append(("member named like a month", parse('laporan Juni')[2], 'Juni'))
+    checks.append(("date range", parse('pengeluaran 01/07-15/07'), (date(2025, 7, 1), date(2025, 7, 16), None, 'pengeluaran')))
+    checks.append(("range with dashes and year", parse('pemasukan 20-06-2025 sampai 5-7-2025')[:2], (date(2025, 6, 20), date(2025, 7, 6))))
+    checks.append(("relative day and member", parse('laporan kemarin papa'), (date(2025, 7, 15), date(2025, 7, 16), 'Papa', None)))
+    checks.append(("not queries", [parse(message) for message in ['laporan', 'laporan budi', 'pengeluaran 20rb', 'makan pengeluaran 20rb']], [None] * 4))
+
+    dates = SortedDates()
+    for key in ['2025-07-03 10:00:00', '2025-07-01 09:00:00', '2025-07-03 08:00:00', '2025-07-05 12:00:00']:
+        dates.insert(key, key)
+    checks.append(("sorted on insert", dates.keys, ['2025-07-01 09:00:00', '2025-07-03 08:00:00', '2025-07-03 10:00:00', '2025-07-05 12:00:00']))
+    checks.append(("bisected range", dates.between(date(2025, 7, 2), date(2025, 7, 5)), ['2025-07-03 08:00:00', '2025-07-03 10:00:00']))
+
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        ledger.add_transactions([
+            {'tanggal': '2025-07-01 08:00:00', 'member': 'Papa', 'nama': 'gaji', 'tipe': 'pemasukan', 'nominal': '5000000'},
+            {'tanggal': '2025-07-10 12:00:00', 'member': 'Mama', 'nama': 'sayur', 'tipe': 'pengeluaran', 'nominal': '50000'},
+            {'tanggal': '2025-06-28 19:00:00', 'member': 'Mama', 'nama': 'bensin', 'tipe': 'pengeluaran', 'nominal': '30000'},  # Backdated
+            {'tanggal': '2025-07-15 07:00:00', 'member': 'Papa', 'nama': 'makan siang', 'tipe': 'pengeluaran', 'nominal': '25000'},
+        ])
+
+        index = get_date_index(ledger)
+        checks.append(("index loaded from ledger", (index.refresh(), index.refresh()), (4, 0)))
+        checks.append(("one index per ledger", get_date_index(ledger) is index, True))
+
+        july = parser.parse('laporan juli', members, NOW)
+        summary = index.summary(july)
+        checks.append(("month totals", (summary['total_pemasukan'], summary['total_pengeluaran'], summary['count']), (5000000, 75000, 3)))
+        checks.append(("month categories", summary['categories']['pengeluaran'], {'belanja': 50000, 'makan': 25000}))
+
+        ledger.add_transaction({'tanggal': '2025-07-02 10:00:00', 'member': 'Mama', 'nama': 'pulsa', 'tipe': 'pengeluaran', 'nominal': '100000'})
+        query, summary = answer_query(parser, 'pengeluaran 28/06-10/07 mama', ledger, now=NOW)
+        checks.append(("new rows and member range", ([entry['nama'] for entry in summary['recent']], summary['total_pengeluaran']), (['bensin', 'pulsa', 'sayur'], 180000)))
+        checks.append(("members found in ledger", sorted(index.members()), ['Mama', 'Papa']))
+
+        index.reset()
+        checks.append(("reset reads the ledger again", (len(index.transactions), index.refresh()), (0, 5)))
+
+        cold = SQLiteLedger(os.path.join(directory, 'cold.db'))
+        reads = []
+        with mock.patch.object(cold, 'get_transactions_since', lambda *args: reads.append(args) or ([], {})):
+            answer_query(parser, 'pengeluaran 20rb bensin', cold, members, now=NOW)
+            checks.append(("non-query leaves the ledger unread", len(reads), 0))
+            answer_query(parser, 'laporan juli', cold, members, now=NOW)
+            checks.append(("query reads the ledger", len(reads), 1))
+        indexed = len(_indexes)
+        del cold
+        gc.collect()
+        checks.append(("index dropped with its ledger", len(_indexes), indexed - 1))
+
+        undated = DateIndex(ledger)
+        undated.add({'tanggal': 'N/A', 'member': 'Unknown', 'nama': 'jajan', 'tipe': 'pengeluaran', 'nominal': '10000'})
+        checks.append(("undated rows left out", (len(undated.transactions), undated.undated), (0, 1)))
+
+    with mock.patch.dict(os.environ, {'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32, 'TWILIO_AUTH_TOKEN': 'test', 'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886'}):
+        message = WhatsAppBot().format_query_message(summary, query.title, query.tipe)
+    checks.append(("reply", ('*Pengeluaran 28/06 - 10/07/2025 (Mama):*\n• Total Pengeluaran: Rp 180,000\n• Jumlah Transaksi: 3\n' in message), True))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_ledger_query()
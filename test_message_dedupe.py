@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for MessageSid deduplication
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from message_dedupe import PENDING_RESPONSE, MessageDeduplicator
+
+RESPONSE = ('<Response><Message>Tersimpan</Message></Response>', 200, 'text/xml')
+
+def test_message_dedupe():
+    """Test replay from memory and from the store, waiting retries, release, TTL and stale claims"""
+    print("[TEST] Testing Message Dedupe...")
+    print("=" * 50)
+
+    checks = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'dedupe.db')
+        dedupe = MessageDeduplicator(path, ttl=60, cache_size=2, wait_timeout=2, stale_after=30)
+
+        checks.append(("first delivery handled", dedupe.claim('SM1'), ('new', None)))
+        dedupe.complete('SM1', RESPONSE)
+        checks.append(("retry replayed from memory", dedupe.claim('SM1'), ('memory', RESPONSE)))
+
+        # Another worker process only shares the database
+        other = MessageDeduplicator(path, ttl=60, wait_timeout=0.2, stale_after=30)
+        checks.append(("retry replayed from store", other.claim('SM1'), ('store', RESPONSE)))
+
+        # A retry arriving while the original is still running waits for its response
+        dedupe.claim('SM2')
+        results = []
+        retry = threading.Thread(target=lambda: results.append(dedupe.claim('SM2')))
+        retry.start()
+        time.sleep(0.1)
+        dedupe.complete('SM2', RESPONSE)
+        retry.join()
+        checks.append(("waiting retry gets the response", results, [('memory', RESPONSE)]))
+
+        dedupe.claim('SM3')
+        checks.append(("unfinished claim in another worker", other.claim('SM3'), ('pending', PENDING_RESPONSE)))
+        checks.append(("pending retry asks Twilio to retry", PENDING_RESPONSE[1] >= 500, True))
+        dedupe.release('SM3')
+        checks.append(("released message handled again", other.claim('SM3'), ('new', None)))
+
+        for sid in ('SM4', 'SM5'):
+            dedupe.claim(sid)
+            dedupe.complete(sid, RESPONSE)
+        checks.append(("LRU evicts oldest", list(dedupe._cache), ['SM4', 'SM5']))
+        checks.append(("evicted response still in store", dedupe.claim('SM1'), ('store', RESPONSE)))
+
+        expired = MessageDeduplicator(path, ttl=0, stale_after=0)
+        checks.append(("expired response handled again", expired.claim('SM4'), ('new', None)))
+        crashed = MessageDeduplicator(path, stale_after=0)
+        checks.append(("stale claim taken over", crashed.claim('SM4'), ('new', None)))
+
+        for instance in (dedupe, other, expired, crashed):
+            instance.close()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_message_dedupe()
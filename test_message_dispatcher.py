@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for the outbound message dispatcher, run against the local Twilio stand-in
+"""
+
+import os
+import time
+from unittest import mock
+
+import message_dispatcher
+from fake_services import FakeTwilioServer
+from message_dispatcher import OutboundDispatcher
+from whatsapp_bot import WhatsAppBot
+
+MAMA = 'whatsapp:+6281111111111'
+PAPA = 'whatsapp:+6282222222222'
+KAKAK = 'whatsapp:+6283333333333'
+
+def test_message_dispatcher():
+    """Test broadcast, per-recipient order, retries, permanent failures and rate limiting"""
+    print("[TEST] Testing Message Dispatcher...")
+    print("=" * 50)
+
+    twilio = FakeTwilioServer().start()
+    environment = {
+        'TWILIO_API_BASE_URL': twilio.url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'test',
+        'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886'
+    }
+
+    checks = []
+    # Don't sleep through real backoff delays
+    with mock.patch.dict(os.environ, environment), \
+            mock.patch.object(message_dispatcher, 'backoff_delay', lambda attempt, base=1.0, cap=60.0: 0.0):
+        bot = WhatsAppBot()
+        dispatcher = OutboundDispatcher(bot.create_message, workers=3, per_second=1000, max_retries=2)
+        dispatcher.start()
+
+        sent = dispatcher.broadcast([MAMA, PAPA, KAKAK], 'Ringkasan hari ini')
+        checks.append(("broadcast sent", [message.wait(5) for message in sent], [True, True, True]))
+        checks.append(("message SID recorded", sent[0].sid.startswith('SM'), True))
+
+        twilio.fail(MAMA, 429, 503)
+        ordered = [dispatcher.submit(MAMA, f'pesan {index}') for index in range(10)]
+        ordered[-1].wait(5)
+        bodies = [message['body'] for message in twilio.messages if message['to'] == MAMA and message['body'].startswith('pesan')]
+        checks.append(("retried after 429 and 503", (ordered[0].status, ordered[0].attempts), ('sent', 3)))
+        checks.append(("order kept through retries", bodies, [f'pesan {index}' for index in range(10)]))
+
+        twilio.fail(PAPA, 400)
+        rejected = dispatcher.submit(PAPA, 'nomor salah')
+        checks.append(("client error not retried", (rejected.wait(5), rejected.attempts), (False, 1)))
+
+        twilio.fail(KAKAK, 429, 429, 429, 429)
+        exhausted = dispatcher.submit(KAKAK, 'coba lagi')
+        checks.append(("gives up after max retries", (exhausted.wait(5), exhausted.attempts), (False, 3)))
+
+        snapshot = dispatcher.snapshot()
+        checks.append(("outcomes counted", (snapshot['sent'], snapshot['failed'], snapshot['retries'], snapshot['pending']), (13, 2, 4, 0)))
+        dispatcher.stop()
+
+        throttled = OutboundDispatcher(bot.create_message, workers=4, per_second=20)
+        throttled.start()
+        started = time.monotonic()
+        messages = [throttled.submit(f'whatsapp:+62890000{index:05d}', 'Pengingat') for index in range(30)]
+        delivered = all(message.wait(10) for message in messages)
+        checks.append(("rate limited to 20 per second", (delivered, time.monotonic() - started >= 0.45), (True, True)))
+        throttled.stop()
+
+    twilio.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_message_dispatcher()
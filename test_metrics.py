@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the metrics registry and its text exposition
+"""
+
+from message_parser import MessageParser
+from metrics import Counter, Histogram, Registry
+
+def test_metrics():
+    """Test counters, histograms, rendering and parse failure reasons"""
+    print("[TEST] Testing Metrics...")
+    print("=" * 50)
+
+    checks = []
+    registry = Registry()
+    commands = registry.register(Counter('test_commands_total', 'Commands handled', ['command']))
+    latency = registry.register(Histogram('test_request_seconds', 'Request latency', ['route'], buckets=(0.01, 0.1)))
+
+    commands.inc(command='laporan')
+    commands.inc(2, command='transaksi')
+    latency.observe(0.005, route='/webhook')
+    latency.observe(0.05, route='/webhook')
+    latency.observe(3, route='/webhook')
+    with latency.time(route='/health'):
+        pass
+
+    checks.append(("counter value", commands.value(command='transaksi'), 2))
+    checks.append(("same name registers once", registry.register(Counter('test_commands_total', 'Again')) is commands, True))
+    checks.append(("histogram count", latency.count(route='/webhook'), 3))
+    checks.append(("timer observed", latency.count(route='/health'), 1))
+
+    text = registry.render()
+    checks.append(("type line", '# TYPE test_request_seconds histogram' in text, True))
+    checks.append(("counter sample", 'test_commands_total{command="transaksi"} 2' in text, True))
+    checks.append(("buckets are cumulative", 'test_request_seconds_bucket{route="/webhook",le="0.1"} 2' in text, True))
+    checks.append(("+Inf bucket", 'test_request_seconds_bucket{route="/webhook",le="+Inf"} 3' in text, True))
+    checks.append(("sum", 'test_request_seconds_sum{route="/webhook"} 3.055' in text, True))
+
+    parser = MessageParser()
+    reasons = [parser.rejection_reason(line) for line in ['halo', 'makan pengeluaran', 'pengeluaran 20rb']]
+    checks.append(("parse failure reasons", reasons, ['no_type', 'no_amount', 'no_name']))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_metrics()
@@ -3,6 +3,9 @@
 Test script for the WhatsApp Finance Tracker Bot
 """
 
+import contextlib
+import io
+
 from message_parser import MessageParser
 
 def test_message_parser():
@@ -96,6 +99,41 @@ def test_amount_parsing():
             actual = result['nominal'] if result else "None"
             print(f"[FAIL] '{amount_text}' -> Expected: {int(expected):,}, Got: {actual}")
 
+def test_multi_transaction():
+    """Test messages holding several transactions"""
+    parser = MessageParser()
+    
+    message = "makan 20rb pengeluaran\nbensin pengeluaran 50rb kemarin\nhalo semua; gaji pemasukan 5juta"
+    transactions, rejected = parser.parse_transactions(message)
+    
+    print("\n[TEST] Testing Multi-Transaction Messages...")
+    print("=" * 50)
+    
+    checks = [
+        ("transaction count", len(transactions), 3),
+        ("amount before type", (transactions[0]['nama'], transactions[0]['nominal']), ("makan", "20000")),
+        ("second line", (transactions[1]['nama'], transactions[1]['nominal']), ("bensin", "50000")),
+        ("semicolon separator", transactions[2]['tipe'], "pemasukan"),
+        ("rejected lines", rejected, ["halo semua"]),
+        ("single line", len(parser.parse_transactions("kopi pengeluaran 25ribu")[0]), 1),
+    ]
+    
+    # An impossible date is logged, not printed, and the message still parses
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = parser.parse_message("makan pengeluaran 20rb 31/02/2025")
+    checks.append(("impossible date kept quiet", (result['nominal'], output.getvalue()), ("20000", "")))
+    
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+    
+    assert passed == len(checks)
+
 if __name__ == "__main__":
     print("[TEST] WhatsApp Finance Tracker Bot - Test Suite")
     print("=" * 50)
@@ -103,6 +141,7 @@ if __name__ == "__main__":
     # Run tests
     parser_success = test_message_parser()
     test_amount_parsing()
+    test_multi_transaction()
     
     print("\n" + "=" * 50)
     if parser_success:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for monthly sheet partitioning, run against the local Sheets stand-in
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+import sheets_client
+from fake_services import FakeSheetsServer
+from google_sheets_manager import SHEET_HEADERS, SUMMARY_HEADERS, UNDATED_LABEL, GoogleSheetsManager
+from ledger_cache import AggregateIndex
+
+def test_sheet_partitions():
+    """Test the summary tab, tab creation on first write and laporan totals"""
+    month = datetime.now().strftime('%Y-%m')
+    server = FakeSheetsServer().start()
+    server.sheets['Sheet1'] = [
+        SHEET_HEADERS,
+        [f'{month}-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000'],
+        ['2020-01-05 12:00:00', 'Mama', 'belanja', 'pengeluaran', '100000'],
+        ['jajan', 'pengeluaran', '10000'],  # Old format without date or member
+    ]
+
+    print("[TEST] Testing Monthly Sheet Partitions...")
+    print("=" * 50)
+
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'GOOGLE_SHEET_ID': 'test-sheet',
+            'GOOGLE_SHEETS_API_ENDPOINT': server.url,
+            'SHEET_PARTITIONING': 'monthly',
+            'SHEET_HEADERS_MARKER': os.path.join(directory, 'sheet_headers.json')
+        }
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            manager = GoogleSheetsManager(os.path.join(directory, 'credentials.json'))
+            checks.append(("partitions set up", manager.ensure_sheet_headers(), True))
+            summary = server.sheets['Ringkasan']
+            checks.append(("summary headers", summary[0], SUMMARY_HEADERS))
+            checks.append(("legacy totals", sorted(row[0] for row in summary[1:]), sorted(['2020-01', month, UNDATED_LABEL])))
+
+            checks.append(("first write of a month", manager.add_transactions([
+                {'tanggal': f'{month}-02 12:00:00', 'member': 'Cece', 'nama': 'makan siang', 'tipe': 'pengeluaran', 'nominal': '20000'},
+                {'tanggal': '2031-05-01 09:00:00', 'member': 'Papa', 'nama': 'bonus', 'tipe': 'pemasukan', 'nominal': '7000'},
+            ]), True))
+            checks.append(("monthly tabs created", month in server.sheets and '2031-05' in server.sheets, True))
+            checks.append(("monthly tab headers", server.sheets[month][0], SHEET_HEADERS))
+            checks.append(("legacy rows stay put", len(server.sheets['Sheet1']), 4))
+
+            # A second process sees the tab created above instead of creating another one
+            other = GoogleSheetsManager(os.path.join(directory, 'credentials.json'))
+            other.add_transaction({'tanggal': f'{month}-03 07:00:00', 'member': 'Mama', 'nama': 'sayur', 'tipe': 'pengeluaran', 'nominal': '15000'})
+            month_rows = [row for row in server.sheets['Ringkasan'] if row[0] == month]
+            checks.append(("one summary row per month", len(month_rows), 1))
+            checks.append(("summary row totals", month_rows[0][1:5], [5000000, 35000, 4965000, 3]))
+
+            index = AggregateIndex.from_rows(manager.get_all_rows())
+            requests_before = server.request_count
+            report = manager.get_monthly_summary()
+            checks.append(("laporan income", report['total_pemasukan'], index.total(month, 'pemasukan')))
+            checks.append(("laporan expense", report['total_pengeluaran'], index.total(month, 'pengeluaran')))
+            checks.append(("laporan reads one range batch", server.request_count - requests_before, 1))
+            checks.append(("recent from this month's tab", [t['nama'] for t in report['recent']], ['makan siang', 'sayur']))
+            checks.append(("recent across tabs", [t['nama'] for t in manager.get_recent_transactions(3)], ['makan siang', 'sayur', 'bonus']))
+            pages, cursor = [], None
+            while True:
+                page, cursor = manager.get_transactions_page(2, cursor)
+                pages.append([t['nama'] for t in page])
+                if cursor is None:
+                    break
+            checks.append(("pages walk back across tabs", pages, [['bonus'], ['makan siang', 'sayur'], ['belanja', 'jajan'], ['gaji']]))
+            checks.append(("running balance", manager.get_running_balance(), index.balance))
+            checks.append(("aggregates verified", manager.verify_aggregates(), []))
+
+    server.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_sheet_partitions()
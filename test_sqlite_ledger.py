@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the local SQLite ledger and its Google Sheets mirror
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from ledger_cache import AggregateIndex
+from sqlite_ledger import SQLiteLedger, SheetsMirror
+from write_queue import SheetsFlusher
+
+class RecordingSheets:
+    """Stands in for GoogleSheetsManager, remembering appended rows"""
+
+    def __init__(self):
+        self.rows = []
+        self.fail = False
+
+    def append_rows(self, rows):
+        if self.fail:
+            return False
+        self.rows.extend(rows)
+        return True
+
+def test_sqlite_ledger():
+    """Test bootstrap, totals and mirroring"""
+    month = datetime.now().strftime('%Y-%m')
+    sheet_rows = [
+        [f'{month}-01 08:00:00', 'Papa', 'gaji', 'pemasukan', '5000000'],
+        [f'{month}-02 12:00:00', 'Cece', 'makan siang', 'pengeluaran', '20000'],
+        ['2020-01-05 12:00:00', 'Mama', 'belanja', 'pengeluaran', '100000'],
+        ['jajan', 'pengeluaran', '10000'],  # Old format without date or member
+        [f'{month}-03 07:00:00', 'Papa', 'tol', 'pengeluaran', 'abc'],  # Not a number
+    ]
+
+    print("[TEST] Testing SQLite Ledger...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = SQLiteLedger(os.path.join(directory, 'ledger.db'))
+        sheets = RecordingSheets()
+        mirror = SheetsMirror(ledger, sheets, flush_interval=0)
+
+        checks = []
+
+        checks.append(("needs bootstrap when new", ledger.needs_bootstrap(), True))
+        checks.append(("bootstrap copies rows", ledger.bootstrap(sheet_rows), 5))
+        checks.append(("second bootstrap is a no-op", ledger.bootstrap(sheet_rows), 0))
+        checks.append(("bootstrapped rows are mirrored", mirror.pending_count(), 0))
+
+        ledger.add_transactions([
+            {'tanggal': f'{month}-04 09:00:00', 'member': 'Mama', 'nama': 'arisan', 'tipe': 'pemasukan', 'nominal': 300000},
+            {'tanggal': f'{month}-04 10:00:00', 'member': 'Mama', 'nama': 'bensin', 'tipe': 'pengeluaran', 'nominal': 50000},
+        ])
+        new_rows = [
+            [f'{month}-04 09:00:00', 'Mama', 'arisan', 'pemasukan', 300000, 'hadiah'],
+            [f'{month}-04 10:00:00', 'Mama', 'bensin', 'pengeluaran', 50000, 'transport'],
+        ]
+
+        # Totals must match the in-memory aggregate index over the same rows
+        index = AggregateIndex.from_rows(sheet_rows + new_rows)
+        summary = ledger.get_monthly_summary()
+        checks.append(("month pemasukan", summary['total_pemasukan'], index.total(month, 'pemasukan')))
+        checks.append(("month pengeluaran", summary['total_pengeluaran'], index.total(month, 'pengeluaran')))
+        checks.append(("month categories", summary['categories'], index.categories(month)))
+        checks.append(("current balance", ledger.get_current_balance(), 5300000 - 80000))
+        checks.append(("running balance", ledger.get_running_balance(), index.balance))
+        checks.append(("member summary", ledger.get_member_summary('Mama')['saldo'], index.total(month, 'pemasukan', 'Mama') - index.total(month, 'pengeluaran', 'Mama')))
+        checks.append(("member balance", ledger.get_member_summary('Mama')['balance'], index.member_balances['Mama']))
+        checks.append(("recent skips invalid nominal", [tx['nama'] for tx in summary['recent']], ['makan siang', 'belanja', 'jajan', 'arisan', 'bensin']))
+        checks.append(("recent transactions", [tx['nama'] for tx in ledger.get_recent_transactions(2)], ['arisan', 'bensin']))
+        checks.append(("old format row", ledger.get_recent_transactions(4)[0]['member'], 'Unknown'))
+
+        # Failed writes keep the rows for the next attempt
+        checks.append(("new rows wait for the mirror", mirror.pending_count(), 2))
+        sheets.fail = True
+        try:
+            mirror.flush_once()
+            failed = False
+        except RuntimeError:
+            failed = True
+        checks.append(("failed mirror raises", failed, True))
+        checks.append(("rows kept after failure", mirror.pending_count(), 2))
+
+        sheets.fail = False
+        checks.append(("mirror writes rows", mirror.flush(), 2))
+        checks.append(("mirrored rows in order", sheets.rows, new_rows))
+        checks.append(("nothing left to mirror", mirror.pending_count(), 0))
+
+        # A flusher that can't release its rows is refused up front, not on its first flush
+        class ClaimOnly(SheetsFlusher):
+            def _claim_batch(self):
+                return []
+        try:
+            ClaimOnly(sheets, batch_size=1, flush_interval=0, max_backoff=0, name='claim-only')
+            incomplete = 'created'
+        except TypeError:
+            incomplete = 'refused'
+        checks.append(("incomplete flusher refused", incomplete, 'refused'))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_sqlite_ledger()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for startup readiness tracking
+"""
+
+import threading
+
+from startup import StartupState
+
+def test_startup_state():
+    """Test readiness, failures and phase timings"""
+    state = StartupState()
+
+    print("[TEST] Testing Startup State...")
+    print("=" * 50)
+
+    checks = []
+
+    checks.append(("not ready at first", state.ready, False))
+    checks.append(("wait times out", state.wait_ready(0.01), False))
+
+    state.begin_attempt()
+    with state.phase('sheets_client'):
+        pass
+    state.mark_failed('no credentials')
+    snapshot = state.snapshot()
+    checks.append(("failed status", snapshot['status'], 'failed'))
+    checks.append(("failure reason", snapshot['error'], 'no credentials'))
+    checks.append(("phase recorded", 'sheets_client' in snapshot['phases'], True))
+
+    # A waiting request wakes up as soon as startup finishes
+    waiter_result = []
+    waiter = threading.Thread(target=lambda: waiter_result.append(state.wait_ready(5)))
+    waiter.start()
+    state.begin_attempt()
+    state.mark_ready()
+    waiter.join()
+    snapshot = state.snapshot()
+    checks.append(("waiter released", waiter_result, [True]))
+    checks.append(("ready status", snapshot['status'], 'ready'))
+    checks.append(("error cleared", snapshot['error'], None))
+    checks.append(("attempts counted", snapshot['attempts'], 2))
+    checks.append(("ready time recorded", snapshot['ready_after_seconds'] is not None, True))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_startup_state()
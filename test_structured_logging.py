@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for structured logging
+"""
+
+import json
+import logging
+import queue
+
+from structured_logging import (
+    DebugSampler, DroppingQueueHandler, JsonFormatter, RequestContextFilter,
+    mask_phone, request_id_var
+)
+
+def test_structured_logging():
+    """Test phone masking, JSON records, DEBUG sampling and the dropping queue"""
+    print("[TEST] Testing Structured Logging...")
+    print("=" * 50)
+
+    checks = []
+    checks.append(("phone masked", mask_phone('whatsapp:+6281234567890'), 'whatsapp:+62*******7890'))
+    checks.append(("empty number kept", mask_phone(''), ''))
+
+    token = request_id_var.set('SM123')
+    record = logging.makeLogRecord({'name': 'finance_bot.webhook', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': 'Received %s', 'args': ('message',), 'member': 'Budi'})
+    RequestContextFilter().filter(record)
+    request_id_var.reset(token)
+    entry = json.loads(JsonFormatter().format(record))
+    checks.append(("message formatted", entry['message'], 'Received message'))
+    checks.append(("request id stamped", entry['request_id'], 'SM123'))
+    checks.append(("extra fields kept", entry['member'], 'Budi'))
+    checks.append(("request id reset", request_id_var.get(), '-'))
+
+    debug = logging.makeLogRecord({'levelno': logging.DEBUG})
+    warning = logging.makeLogRecord({'levelno': logging.WARNING})
+    checks.append(("debug dropped at rate 0", DebugSampler(0).filter(debug), False))
+    checks.append(("warning always kept", DebugSampler(0).filter(warning), True))
+    checks.append(("debug kept at rate 1", DebugSampler(1).filter(debug), True))
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    for index in range(5):
+        handler.emit(logging.makeLogRecord({'msg': 'row %d', 'args': (index,)}))
+    queued = handler.queue.get_nowait()
+    checks.append(("full queue drops instead of blocking", (handler.queue.qsize(), handler.dropped), (1, 3)))
+    checks.append(("queued record pre-formatted", (queued.msg, queued.args), ('row 0', None)))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_structured_logging()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-family tenancy, run against the local Sheets stand-in
+"""
+
+import json
+import os
+import tempfile
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+import sheets_client
+from fake_services import FakeSheetsServer
+from google_sheets_manager import SHEET_HEADERS
+from tenants import Tenant, TenantManagerCache, TenantRegistry, sheets_manager_factory
+from whatsapp_bot import WhatsAppBot
+
+TENANTS = [
+    {'id': 'budi', 'sheet_id': 'sheet-budi', 'sheet_name': 'Budi', 'family_name': 'Keluarga Budi',
+     'members': {'whatsapp:+6281111111111': 'Papa Budi', 'whatsapp:+6283333333333': 'Om'}},
+    {'id': 'sari', 'sheet_id': 'sheet-sari', 'sheet_name': 'Sari', 'family_name': 'Keluarga Sari', 'bot_name': 'Sari Bot',
+     'whatsapp_number': 'whatsapp:+14155550000', 'members': {'whatsapp:+6282222222222': 'Mama Sari', 'whatsapp:+6283333333333': 'Om'}},
+]
+
+def raises(function) -> bool:
+    """Whether calling function raises ValueError"""
+    try:
+        function()
+        return False
+    except ValueError:
+        return True
+
+def test_tenants():
+    """Test tenant resolution, config checks, the LRU of managers and per-family sheets"""
+    print("[TEST] Testing Tenants...")
+    print("=" * 50)
+
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tenants.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(TENANTS, f)
+        registry = TenantRegistry.load(path)
+
+        sandbox = 'whatsapp:+14155238886'
+        resolved = lambda to_number, from_number: getattr(registry.resolve(to_number, from_number), 'tenant_id', None)
+        checks.append(("resolved by sender", resolved(sandbox, 'whatsapp:+6281111111111'), 'budi'))
+        checks.append(("resolved by reserved number", resolved('whatsapp:+14155550000', 'whatsapp:+6289999999999'), 'sari'))
+        checks.append(("shared member goes to first family", resolved(sandbox, 'whatsapp:+6283333333333'), 'budi'))
+        checks.append(("reserved number decides for shared member", resolved('whatsapp:+14155550000', 'whatsapp:+6283333333333'), 'sari'))
+        checks.append(("unknown sender", resolved(sandbox, 'whatsapp:+6289999999999'), None))
+        checks.append(("duplicate id rejected", raises(lambda: TenantRegistry([Tenant.from_config(TENANTS[0])] * 2)), True))
+        checks.append(("unsafe id rejected", raises(lambda: Tenant.from_config({'id': '../etc', 'sheet_id': 'x'})), True))
+
+        created = []
+        cache = TenantManagerCache(lambda tenant: created.append(tenant.tenant_id) or tenant.tenant_id, capacity=2)
+        for tenant_id in ['budi', 'sari', 'budi']:
+            cache.get(Tenant(tenant_id, 'sheet', {}))
+        cache.get(Tenant('joko', 'sheet', {}))
+        checks.append(("least recently used evicted", list(cache._managers), ['budi', 'joko']))
+        cache.get(Tenant('sari', 'sheet', {}))
+        checks.append(("evicted family recreated", created, ['budi', 'sari', 'joko', 'sari']))
+
+        server = FakeSheetsServer().start()
+        # The stand-in serves one spreadsheet, so each family gets its own tab in it
+        server.sheets.update({'Budi': [], 'Sari': []})
+        environment = {
+            'GOOGLE_SHEETS_API_ENDPOINT': server.url,
+            'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+            'TWILIO_AUTH_TOKEN': 'test',
+            'TWILIO_WHATSAPP_NUMBER': sandbox
+        }
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch.object(sheets_client, 'load_credentials', lambda *args: AnonymousCredentials()):
+            managers = TenantManagerCache(sheets_manager_factory(os.path.join(directory, 'credentials.json'), directory))
+            budi = managers.get(registry.tenants['budi'])
+            sari = managers.get(registry.tenants['sari'])
+            checks.append(("each family has its own sheet", (budi.sheet_id, sari.sheet_name), ('sheet-budi', 'Sari')))
+            checks.append(("headers checked once per family", os.path.exists(os.path.join(directory, 'sari', 'sheet_headers.json')), True))
+
+            sari.add_transaction({'tanggal': '2025-07-15 12:00:00', 'member': 'Mama Sari', 'nama': 'sayur', 'tipe': 'pengeluaran', 'nominal': '15000'})
+            checks.append(("rows go to the family's sheet", (len(server.sheets['Budi']), server.sheets['Sari'][1][2]), (1, 'sayur')))
+            checks.append(("family cache is separate", (len(budi.get_recent_transactions(5)), len(sari.get_recent_transactions(5))), (0, 1)))
+            checks.append(("header row", server.sheets['Budi'][0], SHEET_HEADERS))
+
+            bot = WhatsAppBot()
+            tenant = registry.tenants['sari']
+            family_bot = bot.for_family(tenant.family_name, tenant.members, tenant.bot_name, tenant.whatsapp_number)
+            checks.append(("bot speaks for the family", (family_bot.bot_name, family_bot.get_family_member('whatsapp:+6282222222222')), ('Sari Bot', 'Mama Sari')))
+            checks.append(("bot shares the Twilio client", (family_bot.client is bot.client, bot.family_name != family_bot.family_name), (True, True)))
+        server.stop()
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_tenants()
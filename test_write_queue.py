@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the durable write-behind queue
+"""
+
+import os
+import tempfile
+
+from write_queue import WriteBehindQueue
+
+class FlakySheets:
+    """Stands in for GoogleSheetsManager, failing appends while `fail` is set"""
+
+    def __init__(self):
+        self.rows = []
+        self.fail = False
+        self.attempts = 0
+
+    def append_rows(self, rows):
+        self.attempts += 1
+        if self.fail:
+            raise ConnectionError("Sheets unavailable")
+        self.rows.extend(rows)
+        return True
+
+def transaction(nama, nominal):
+    """Transaction dictionary as the webhook queues it"""
+    return {'tanggal': '2025-07-15 12:00:00', 'member': 'Mama', 'nama': nama, 'tipe': 'pengeluaran', 'nominal': nominal}
+
+def test_write_queue():
+    """Test that queued rows survive a restart and a failed append is retried once"""
+    print("[TEST] Testing Write-Behind Queue...")
+    print("=" * 50)
+
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'write_queue.db')
+        sheets = FlakySheets()
+
+        # Rows committed before a restart are flushed by the next process
+        queue = WriteBehindQueue(sheets, path=path, flush_interval=0)
+        checks.append(("rows queued", queue.enqueue_many([transaction('sayur', '50000'), transaction('bensin', '30000')]), True))
+        queue._conn.close()
+
+        reopened = WriteBehindQueue(sheets, path=path, flush_interval=0)
+        checks.append(("rows kept after reopening", reopened.pending_count(), 2))
+        checks.append(("reopened queue flushes them", reopened.flush(), 2))
+        checks.append(("rows written in order", [row[2] for row in sheets.rows], ['sayur', 'bensin']))
+
+        # A failed append hands the batch back, the next flush writes it once
+        reopened.enqueue(transaction('pulsa', '100000'))
+        sheets.fail = True
+        try:
+            reopened.flush()
+            failed = False
+        except RuntimeError:
+            failed = True
+        checks.append(("failed append raises", failed, True))
+        checks.append(("batch put back", reopened.pending_count(), 1))
+
+        sheets.fail = False
+        checks.append(("later flush succeeds", reopened.flush(), 1))
+        checks.append(("no duplicates", [row[2] for row in sheets.rows], ['sayur', 'bensin', 'pulsa']))
+        checks.append(("queue empty", (reopened.pending_count(), reopened.flush()), (0, 0)))
+
+    passed = 0
+    for name, got, expected in checks:
+        if got == expected:
+            passed += 1
+            print(f"[PASS] {name}")
+        else:
+            print(f"[FAIL] {name}: expected {expected}, got {got}")
+
+    print("=" * 50)
+    print(f"Results: {passed}/{len(checks)} checks passed")
+
+    assert passed == len(checks)
+
+if __name__ == "__main__":
+    test_write_queue()
@@ -1,8 +1,30 @@
+import copy
 import os
-from typing import Optional
+from typing import List, Optional, Union
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
-from family_config import FAMILY_CONFIG, get_family_member, get_bot_name, get_family_name
+from family_config import FAMILY_CONFIG, get_bot_name, get_family_name
+import metrics
+from structured_logging import get_logger, mask_phone
+
+TWILIO_API_URL = 'https://api.twilio.com'
+
+log = get_logger('whatsapp')
+
+TWIML_RENDER_SECONDS = metrics.histogram('finance_bot_twiml_render_seconds', 'Time to build a TwiML reply')
+
+class BaseUrlHttpClient(TwilioHttpClient):
+    """Twilio HTTP client that sends API requests to another server, e.g. a local stand-in"""
+    
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+    
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(TWILIO_API_URL):
+            url = self.base_url + url[len(TWILIO_API_URL):]
+        return super().request(method, url, *args, **kwargs)
 
 class WhatsAppBot:
     """Handle WhatsApp bot operations using Twilio"""
@@ -23,11 +45,17 @@ class WhatsAppBot:
         if not all([self.account_sid, self.auth_token, self.whatsapp_number]):
             raise ValueError("Missing required Twilio environment variables")
         
-        self.client = Client(self.account_sid, self.auth_token)
+        api_base_url = os.getenv('TWILIO_API_BASE_URL')
+        http_client = BaseUrlHttpClient(api_base_url) if api_base_url else None
+        self.client = Client(self.account_sid, self.auth_token, http_client=http_client)
     
     def send_message(self, to_number: str, message: str) -> bool:
         """
-        Send a WhatsApp message
+        Send a WhatsApp message right away, from the calling thread
+        
+        Webhook replies don't need it, they go back to Twilio as TwiML from
+        create_response. Proactive messages go through OutboundDispatcher,
+        which calls create_message from its worker threads.
         
         Args:
             to_number: Recipient's WhatsApp number (format: whatsapp:+1234567890)
@@ -37,17 +65,31 @@ class WhatsAppBot:
             True if message sent successfully, False otherwise
         """
         try:
-            message = self.client.messages.create(
-                body=message,
-                from_=self.whatsapp_number,
-                to=to_number
-            )
-            print(f"Message sent successfully. SID: {message.sid}")
+            self.create_message(to_number, message)
             return True
         except Exception as e:
-            print(f"Error sending message: {str(e)}")
+            log.error("Error sending message", extra={'to': mask_phone(to_number), 'error': str(e)})
             return False
     
+    def create_message(self, to_number: str, message: str) -> str:
+        """
+        Send a WhatsApp message, raising on failure so the caller can decide whether to retry
+        
+        Args:
+            to_number: Recipient's WhatsApp number (format: whatsapp:+1234567890)
+            message: Message text to send
+            
+        Returns:
+            Twilio message SID
+        """
+        created = self.client.messages.create(
+            body=message,
+            from_=self.whatsapp_number,
+            to=to_number
+        )
+        log.info("Message sent", extra={'sid': created.sid, 'to': mask_phone(to_number)})
+        return created.sid
+    
     def create_response(self, message: str) -> str:
         """
         Create a TwiML response for webhook
@@ -58,12 +100,27 @@ class WhatsAppBot:
         Returns:
             TwiML response as string
         """
-        response = MessagingResponse()
-        response.message(message)
-        return str(response)
+        with TWIML_RENDER_SECONDS.time():
+            response = MessagingResponse()
+            response.message(message)
+            return str(response)
     
-    def format_success_message(self, transaction: dict) -> str:
-        """Format success message for transaction"""
+    def format_success_message(self, transaction: Union[dict, List[dict]], skipped: int = 0) -> str:
+        """
+        Format success message for one or more transactions
+        
+        Args:
+            transaction: Transaction dictionary, or a list of them from one message
+            skipped: Number of lines in the message that could not be parsed
+            
+        Returns:
+            Confirmation message text
+        """
+        transactions = transaction if isinstance(transaction, list) else [transaction]
+        if len(transactions) > 1 or skipped:
+            return self._format_batch_success_message(transactions, skipped)
+        transaction = transactions[0]
+        
         member_name = transaction.get('member', 'Family Member')
         
         # Format date for display
@@ -76,6 +133,8 @@ class WhatsAppBot:
             except:
                 pass
         
+        category_display = f"\n• Kategori: {transaction['kategori']}" if transaction.get('kategori') else ""
+        
         return f"""[SUCCESS] *{self.bot_name}*
 
 Transaksi berhasil dicatat untuk {self.family_name}!
@@ -83,9 +142,52 @@ Transaksi berhasil dicatat untuk {self.family_name}!
 *Detail:*
 • Member: {member_name}
 • Nama: {transaction['nama']}
-• Tipe: {transaction['tipe']}
+• Tipe: {transaction['tipe']}{category_display}
 • Nominal: Rp {int(transaction['nominal']):,}{date_display}
 
+Data tersimpan di Google Sheets
+Ketik 'laporan' untuk ringkasan"""
+    
+    def _format_batch_success_message(self, transactions: List[dict], skipped: int) -> str:
+        """Format one combined confirmation for several transactions"""
+        lines = []
+        total_pemasukan = 0
+        total_pengeluaran = 0
+        
+        for i, tx in enumerate(transactions, 1):
+            nominal = int(tx['nominal'])
+            if tx.get('tipe') == 'pemasukan':
+                icon = "[IN]"
+                total_pemasukan += nominal
+            else:
+                icon = "[OUT]"
+                total_pengeluaran += nominal
+            
+            date_display = ""
+            if tx.get('tanggal'):
+                try:
+                    from datetime import datetime
+                    date_obj = datetime.strptime(tx['tanggal'], '%Y-%m-%d %H:%M:%S')
+                    date_display = f" {date_obj.strftime('%d/%m')}"
+                except ValueError:
+                    pass
+            
+            lines.append(f"{i}. {icon} {tx['nama']} - Rp {nominal:,}{date_display}")
+        
+        member_name = transactions[0].get('member', 'Family Member') if transactions else 'Family Member'
+        skipped_display = f"\n\n{skipped} baris tidak dikenali dan tidak dicatat" if skipped else ""
+        details = "\n".join(lines)
+        
+        return f"""[SUCCESS] *{self.bot_name}*
+
+{len(transactions)} transaksi berhasil dicatat untuk {self.family_name}!
+
+*Detail ({member_name}):*
+{details}
+
+• Total Pemasukan: Rp {total_pemasukan:,}
+• Total Pengeluaran: Rp {total_pengeluaran:,}{skipped_display}
+
 Data tersimpan di Google Sheets
 Ketik 'laporan' untuk ringkasan"""
     
@@ -140,6 +242,11 @@ Kirim pesan dengan format:
 • 3 hari lalu, 2 hari lagi
 • (kosong = hari ini)
 
+*Banyak Transaksi Sekaligus:*
+Tulis satu transaksi per baris:
+• makan siang pengeluaran 20ribu
+• bensin pengeluaran 50rb
+
 *Format Nominal:*
 • 20ribu, 20rb, 20k = 20,000
 • 5juta, 5jt, 5m = 5,000,000
@@ -149,28 +256,111 @@ Kirim pesan dengan format:
 • `help` - Tampilkan bantuan ini
 • `laporan` - Ringkasan keuangan
 • `saldo` - Cek saldo terkini
+• `analisis` - Tren pengeluaran dan perbandingan bulan lalu
+
+*Laporan Per Periode:*
+• `laporan juli`, `laporan minggu ini`, `laporan bulan lalu`
+• `laporan Mama` - Bulan ini untuk satu anggota
+• `pengeluaran 01/07-15/07`, `pemasukan kemarin`
 
 *Semua data tersimpan di Google Sheets untuk akses keluarga!*"""
     
     def get_family_member(self, phone_number: str) -> str:
         """Get family member name from phone number"""
-        return get_family_member(phone_number)
+        return self.family_members.get(phone_number, 'Family Member')
+    
+    def for_family(self, family_name: str, family_members: dict, bot_name: Optional[str] = None,
+                   whatsapp_number: Optional[str] = None) -> 'WhatsAppBot':
+        """
+        Copy of this bot speaking for another family, sharing the Twilio client
+        
+        Args:
+            family_name: Family name used in replies
+            family_members: WhatsApp number to display name of each family member
+            bot_name: Bot name used in replies, defaults to this bot's
+            whatsapp_number: Twilio number messages are sent from, defaults to this bot's
+            
+        Returns:
+            New WhatsAppBot, cheap enough to create per message
+        """
+        bot = copy.copy(self)
+        bot.family_name = family_name
+        bot.family_members = family_members
+        bot.bot_name = bot_name or self.bot_name
+        bot.whatsapp_number = whatsapp_number or self.whatsapp_number
+        return bot
     
-    def format_report_message(self, summary: dict) -> str:
-        """Format financial report message"""
+    def format_report_message(self, summary: dict, title: str = 'Ringkasan Bulan Ini') -> str:
+        """Format financial report message, titled for the period the summary covers"""
         return f"""[REPORT] *{self.bot_name}*
 *Laporan Keuangan {self.family_name}*
 
-*Ringkasan Bulan Ini:*
+*{title}:*
 • Total Pemasukan: Rp {summary.get('total_pemasukan', 0):,}
 • Total Pengeluaran: Rp {summary.get('total_pengeluaran', 0):,}
 • Saldo: Rp {summary.get('saldo', 0):,}
-
+{self._format_categories(summary.get('categories'))}
 *Transaksi Terakhir:*
 {self._format_recent_transactions(summary.get('recent', []))}
 
 Lihat detail lengkap di Google Sheets"""
     
+    def format_query_message(self, summary: dict, title: str, tipe: Optional[str] = None) -> str:
+        """Format the answer to a date-range or member query, only one type's totals if tipe is given"""
+        if not tipe:
+            return self.format_report_message(summary, title=title)
+        
+        total = summary.get('total_pemasukan' if tipe == 'pemasukan' else 'total_pengeluaran', 0)
+        return f"""[REPORT] *{self.bot_name}*
+*Laporan Keuangan {self.family_name}*
+
+*{title}:*
+• Total {tipe.capitalize()}: Rp {total:,}
+• Jumlah Transaksi: {summary.get('count', 0)}
+{self._format_categories(summary.get('categories'))}
+*Transaksi Terakhir:*
+{self._format_recent_transactions(summary.get('recent', []))}"""
+    
+    def format_analysis_message(self, analysis: dict) -> str:
+        """Format the spending analysis: month over month totals, expense trend, top spenders and category shares"""
+        lines = [f"[ANALYSIS] *{self.bot_name}*", f"*Analisis Keuangan {self.family_name}*", "", "*Bulan Ini vs Bulan Lalu:*"]
+        for key, label in (('pemasukan', 'Pemasukan'), ('pengeluaran', 'Pengeluaran'), ('saldo', 'Saldo')):
+            totals = analysis['month_over_month'][key]
+            lines.append(f"• {label}: Rp {totals['current']:,}{self._format_change(totals['change'])}")
+        
+        lines += ["", f"*Tren Pengeluaran (rata-rata {analysis['window']} bulan):*"]
+        for month in analysis['trend']:
+            lines.append(f"• {month['label']}: Rp {month['pengeluaran']:,} (rata-rata Rp {month['pengeluaran_rata_rata']:,})")
+        
+        if analysis['top_spenders']:
+            lines += ["", "*Pengeluaran Terbesar Bulan Ini:*"]
+            for i, spender in enumerate(analysis['top_spenders'], 1):
+                lines.append(f"{i}. {spender['member']}: Rp {spender['pengeluaran']:,} ({spender['share']}%)")
+        
+        if analysis['categories']:
+            lines += ["", "*Porsi Kategori Bulan Ini:*"]
+            for category in analysis['categories']:
+                lines.append(f"• {category['kategori']}: {category['share']}% (Rp {category['pengeluaran']:,}){self._format_change(category['change'])}")
+        
+        return "\n".join(lines)
+    
+    def _format_change(self, change: Optional[float]) -> str:
+        """' (+12.5%)' for a change from last month, empty if there was nothing last month"""
+        if change is None:
+            return ""
+        return f" ({change:+.1f}%)"
+    
+    def _format_categories(self, categories: Optional[dict]) -> str:
+        """Format category totals as a report section, largest first, empty if there are none"""
+        lines = []
+        for tipe, icon in (('pengeluaran', '[OUT]'), ('pemasukan', '[IN]')):
+            totals = (categories or {}).get(tipe, {})
+            for kategori, total in sorted(totals.items(), key=lambda item: (-item[1], item[0])):
+                lines.append(f"• {icon} {kategori}: Rp {total:,}")
+        if not lines:
+            return ""
+        return "\n*Per Kategori:*\n" + "\n".join(lines) + "\n"
+    
     def _format_recent_transactions(self, transactions: list) -> str:
         """Format recent transactions for display"""
         if not transactions:
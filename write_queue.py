@@ -0,0 +1,270 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from ledger_cache import transaction_to_row
+from structured_logging import get_logger
+
+log = get_logger('write_queue')
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter
+
+    Args:
+        attempt: Number of consecutive failures so far, starting at 1
+        base: Delay for the first retry in seconds
+        cap: Maximum delay in seconds
+
+    Returns:
+        Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class SheetsFlusher(ABC):
+    """Background worker that writes claimed rows to Google Sheets in batches, backing off on failures"""
+
+    def __init__(self, sheets_manager, batch_size: int, flush_interval: float, max_backoff: float, name: str):
+        """
+        Initialize flush worker
+
+        Args:
+            sheets_manager: GoogleSheetsManager used to append the rows
+            batch_size: Maximum rows written per append call
+            flush_interval: Seconds between flushes when there is nothing to write
+            max_backoff: Maximum seconds to wait between failed flushes
+            name: Worker thread name
+        """
+        self.sheets_manager = sheets_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.name = name
+
+        # Rows claimed by a worker that died are retried after this many seconds
+        self.claim_timeout = 300
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._worker_id = f"{os.getpid()}-{id(self)}"
+
+    @abstractmethod
+    def _claim_batch(self) -> List[Tuple[int, List[str]]]:
+        """Claim the oldest unwritten rows as (id, row) pairs so other workers skip them"""
+
+    @abstractmethod
+    def _release_batch(self, ids: List[int], written: bool):
+        """Mark claimed rows as written, or hand them back for a retry"""
+
+    def wakeup(self):
+        """Flush now instead of waiting for the next interval"""
+        self._wakeup.set()
+
+    def flush_once(self) -> int:
+        """
+        Write one batch of rows to Google Sheets
+
+        Returns:
+            Number of rows written
+
+        Raises:
+            RuntimeError: If the append call failed and the rows were put back
+        """
+        batch = self._claim_batch()
+        if not batch:
+            return 0
+
+        ids = [row_id for row_id, _ in batch]
+        rows = [row for _, row in batch]
+
+        try:
+            written = self.sheets_manager.append_rows(rows)
+        except Exception as e:
+            log.error("Error flushing rows to Google Sheets", extra={'error': str(e)})
+            written = False
+
+        self._release_batch(ids, written)
+        if not written:
+            raise RuntimeError(f"Failed to write {len(rows)} rows to Google Sheets")
+        return len(rows)
+
+    def flush(self) -> int:
+        """Write rows until none are left or a write fails"""
+        total = 0
+        while True:
+            written = self.flush_once()
+            if not written:
+                return total
+            total += written
+
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopping.is_set():
+            try:
+                written = self.flush()
+                self._failures = 0
+                if written:
+                    log.info("Wrote rows to Google Sheets", extra={'flusher': self.name, 'rows': written})
+                timeout = self.flush_interval
+            except Exception as e:
+                self._failures += 1
+                timeout = backoff_delay(self._failures, base=self.flush_interval, cap=self.max_backoff)
+                log.warning("Flush failed, retrying", extra={'flusher': self.name, 'error': str(e), 'retry_in': round(timeout, 1), 'attempt': self._failures})
+
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the background flush worker"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the worker and try one last flush"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[WARNING] Unwritten rows left for next start: {str(e)}")
+
+
+class WriteBehindQueue(SheetsFlusher):
+    """Durable local queue of ledger rows that a background worker flushes to Google Sheets"""
+
+    def __init__(self, sheets_manager, path: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_backoff: Optional[float] = None):
+        """
+        Initialize write-behind queue
+
+        Args:
+            sheets_manager: GoogleSheetsManager used to append the rows
+            path: SQLite database file holding the pending rows
+            batch_size: Maximum rows written per append call
+            flush_interval: Seconds between flushes when the queue is idle
+            max_backoff: Maximum seconds to wait between failed flushes
+        """
+        super().__init__(
+            sheets_manager,
+            batch_size=batch_size or int(os.getenv('WRITE_QUEUE_BATCH_SIZE', '100')),
+            flush_interval=flush_interval if flush_interval is not None else float(os.getenv('WRITE_QUEUE_FLUSH_INTERVAL', '1')),
+            max_backoff=max_backoff if max_backoff is not None else float(os.getenv('WRITE_QUEUE_MAX_BACKOFF', '60')),
+            name='write-behind-queue'
+        )
+        self.path = path or os.getenv('WRITE_QUEUE_PATH', os.path.join('data', 'write_queue.db'))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_rows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                row_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_at REAL
+            )
+        ''')
+
+    def enqueue(self, transaction: Dict[str, str]) -> bool:
+        """
+        Queue a transaction for writing to Google Sheets
+
+        Args:
+            transaction: Dictionary with 'nama', 'tipe', 'nominal', 'member', and optionally 'tanggal' keys
+
+        Returns:
+            True if the transaction was stored durably, False otherwise
+        """
+        return self.enqueue_many([transaction])
+
+    def enqueue_many(self, transactions: List[Dict[str, str]]) -> bool:
+        """Queue several transactions in one local commit"""
+        now = time.time()
+        # Timestamps are fixed now, not when the row finally reaches the sheet
+        records = [(json.dumps(transaction_to_row(transaction)), now) for transaction in transactions]
+
+        try:
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.executemany(
+                    'INSERT INTO pending_rows (row_json, created_at) VALUES (?, ?)', records
+                )
+                self._conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            self._rollback()
+            log.error("Error queueing transaction", extra={'error': str(e)})
+            return False
+
+        self.wakeup()
+        return True
+
+    def pending_count(self) -> int:
+        """Number of rows not yet written to Google Sheets"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pending_rows').fetchone()[0]
+
+    def _rollback(self):
+        """Roll back an open transaction, ignoring errors"""
+        try:
+            with self._lock:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+
+    def _claim_batch(self) -> List[Tuple[int, List[str]]]:
+        """Claim the oldest pending rows so other workers skip them"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('''
+                    UPDATE pending_rows SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+                    WHERE id IN (
+                        SELECT id FROM pending_rows
+                        WHERE claimed_by IS NULL OR claimed_at < ?
+                        ORDER BY id LIMIT ?
+                    )
+                ''', (self._worker_id, now, now - self.claim_timeout, self.batch_size))
+                batch = self._conn.execute(
+                    'SELECT id, row_json FROM pending_rows WHERE claimed_by = ? AND claimed_at = ? ORDER BY id',
+                    (self._worker_id, now)
+                ).fetchall()
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [(row_id, json.loads(row_json)) for row_id, row_json in batch]
+
+    def _release_batch(self, ids: List[int], written: bool):
+        """Delete written rows, or hand them back to the queue for a retry"""
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            if written:
+                self._conn.execute(f'DELETE FROM pending_rows WHERE id IN ({placeholders})', ids)
+            else:
+                self._conn.execute(
+                    f'UPDATE pending_rows SET claimed_by = NULL, claimed_at = NULL WHERE id IN ({placeholders})', ids
+                )